@@ -1,31 +1,40 @@
 import streamlit as st
 import pandas as pd
-import unicodedata
+import numpy as np
 import io
+from collections import deque
 from datetime import datetime
-from cryptography.fernet import Fernet
-import importlib.util
-import sys
-import re
 import openpyxl
 import os
+import bpa_loader
+from bpa_cache import content_key, results_cache
+from bpa_dat import B_EDITABLE_FIELDS, apply_b_modifications, near_positions, parse_dat
+from bpa_export import EXPORT_FORMATS, available_formats, export_tables, voltage_report_sheets
+from bpa_generate import CARD_KINDS, SHEET_COLUMNS, sheet_template, splice_cards, write_cards
+from bpa_history import CHANGE_INTRODUCED, CHANGE_RESOLVED, PFOHistory
+from bpa_jobs import STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, JobCancelled, JobQueue, default_runner
+from bpa_journal import EditJournal
+from bpa_logging import LOG_LEVELS, LogBuffer, get_file_writer
+from bpa_monitor import (
+    DEFAULT_MONITOR_SETTINGS, SHEET_OVERLOADS, SHEET_Q_BALANCE, SHEET_Q_LIMITS, run_monitors, unavailable_monitors
+)
+from bpa_planner import DEFAULT_PLAN_SETTINGS, apply_shunt_plan, plan_shunt_adjustments
+from bpa_profile import Profiler, recording, run as profile_run, stage
+from bpa_rules import RULE_MODES, apply_rules, editable_rules, normalize_rules, rules_template
+from bpa_session import SessionData, enforce_process_budget, process_summary
+from bpa_snapshot import SnapshotStore
+from bpa_pfo import (
+    DEFAULT_VOLTAGE_LEVELS, STATUS_ALERT, STATUS_HIGH, STATUS_LOW,
+    check_voltage_anomalies, compact_nodes, extract_pfo, normalize_voltage_levels, parse_pfo_data
+)
 
-# 解密并加载 BPA_models
+# 解密并加载 BPA_models（进程内缓存，重复运行脚本不会重新解密）
 def load_encrypted_module():
+    if not os.environ.get('BPA_MODEL_KEY'):
+        st.error("环境变量 BPA_MODEL_KEY 未设置，请在 Streamlit Cloud 的 Secrets 设置中配置密钥")
+        raise ValueError("环境变量 BPA_MODEL_KEY 未设置")
     try:
-        key = os.environ.get('BPA_MODEL_KEY')
-        if not key:
-            st.error("环境变量 BPA_MODEL_KEY 未设置，请在 Streamlit Cloud 的 Secrets 设置中配置密钥")
-            raise ValueError("环境变量 BPA_MODEL_KEY 未设置")
-        cipher = Fernet(key.encode('utf-8'))
-        with open('BPA_models.encrypted', 'rb') as f:
-            encrypted = f.read()
-        code = cipher.decrypt(encrypted).decode('utf-8')
-        spec = importlib.util.spec_from_loader('BPA_models', loader=None)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules['BPA_models'] = module
-        exec(code, module.__dict__)
-        return module
+        return bpa_loader.load_encrypted_module()
     except Exception as e:
         st.error(f"无法解密 BPA_models.encrypted: {e}")
         raise
@@ -38,320 +47,216 @@ except Exception as e:
     st.error(f"加载 BPA_models 失败: {e}")
     raise
 
-# PFO 解析函数
-class PowerFlowRecord:
-    def __init__(self, bus_name: str, rated_voltage: str, actual_voltage: str, dist: str, owner: str, unallocated_q: str = None):
-        self.bus_name = bus_name
-        self.rated_voltage = rated_voltage
-        self.actual_voltage = actual_voltage
-        self.dist = dist
-        self.owner = owner
-        self.unallocated_q = unallocated_q
-
-    def to_dict(self) -> dict:
-        return {
-            'BusName': self.bus_name,
-            'RatedVoltage': self.rated_voltage,
-            'ActualVoltage': self.actual_voltage,
-            'Dist': self.dist,
-            'Owner': self.owner,
-            'UnallocatedReactivePower': self.unallocated_q
-        }
+# 每个会话最多保留修改记录的文件数
+MAX_EDIT_JOURNALS = 5
+# 每个会话保留的上传记录条数
+MAX_UPLOAD_HISTORY = 200
 
-def read_pfo_file(file_content: bytes) -> list:
-    try:
-        for encoding in ['gbk', 'utf-8', 'latin1']:
-            try:
-                content = file_content.decode(encoding, errors='ignore')
-                lines = content.splitlines()
-                if lines:
-                    return lines
-            except UnicodeDecodeError:
-                continue
-        st.error("无法解码文件：尝试了 GBK、UTF-8 和 Latin1 编码均失败")
-        return []
-    except Exception as e:
-        st.error(f"无法读取文件: {e}")
-        return []
-
-def find_bus_sections(lines: list) -> list:
-    bus_endings = ['B', 'BQ', 'BE', 'BD', 'BA', 'BS', 'BM', '-PQ']
-    sections = []
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        if any(ending in line_stripped[-10:] for ending in bus_endings):
-            sections.append(i)
-    return sections
-
-def extract_actual_voltage(line: str) -> str:
-    if 'kV/' in line:
-        kv_index = line.index('kV/')
-        return line[kv_index - 7:kv_index].strip()
-    return ''
-
-def parse_pfo_data(lines: list) -> list:
-    records = []
-    bus_sections = find_bus_sections(lines)
-    if not bus_sections:
-        return records
-
-    for i in bus_sections:
-        line = lines[i]
-        line_bytes = line.encode('gbk', errors='ignore')
-        bus_name = line_bytes[0:8].decode('gbk', errors='ignore').strip()
-        rated_voltage = line_bytes[8:14].decode('gbk', errors='ignore').strip()
-        dist = line_bytes[36:38].decode('gbk', errors='ignore').strip()
-        owner = line_bytes[38:40].decode('gbk', errors='ignore').strip()
-        actual_voltage = extract_actual_voltage(line)
-        unallocated_q = None
-
-        for j in range(i, min(i + 10, len(lines))):
-            current_line = lines[j].strip()
-            if '未安排无功' in current_line:
-                try:
-                    match = re.search(r'([-]?\d+\.\d+|\d+\.\d+)\s*未安排无功', current_line)
-                    if match:
-                        unallocated_q = float(match.group(1))
-                        st.session_state.logs.append(f"[DEBUG] 找到 {bus_name} 的未安排无功: {unallocated_q}")
-                    else:
-                        st.session_state.logs.append(f"[DEBUG] 无法解析未安排无功行: {current_line}")
-                    break
-                except (ValueError, IndexError) as e:
-                    st.session_state.logs.append(f"[DEBUG] 解析 {bus_name} 未安排无功错误: {e}")
-                    break
-            if any(current_line.endswith(ending) or ending in current_line[-10:] for ending in ['B', 'BQ', 'BE', 'BD', 'BA', 'BS', 'BM', '-PQ']):
-                if j != i:
-                    break
+# 后台任务运行期间侧栏刷新进度的间隔 (s)
+JOB_POLL_SECONDS = 1.0
 
-        try:
-            rated_voltage_float = float(rated_voltage)
-            actual_voltage_float = float(actual_voltage) if actual_voltage else None
-        except (ValueError, TypeError):
-            st.session_state.logs.append(f"[DEBUG] {bus_name} 电压无效: 标称={rated_voltage}, 实际={actual_voltage}")
-            continue
-
-        if actual_voltage_float is not None:
-            record = PowerFlowRecord(bus_name, rated_voltage, actual_voltage, dist, owner, unallocated_q)
-            records.append(record)
-            st.session_state.logs.append(f"[DEBUG] 添加 {bus_name} 记录, 未安排无功={unallocated_q}")
-
-    return records
-
-def check_voltage_anomalies(records: list) -> tuple[pd.DataFrame, pd.DataFrame]:
-    all_nodes_df = pd.DataFrame([record.to_dict() for record in records])
-    if all_nodes_df.empty:
-        return all_nodes_df, all_nodes_df
-
-    all_nodes_df['RatedVoltage'] = pd.to_numeric(all_nodes_df['RatedVoltage'], errors='coerce')
-    all_nodes_df['ActualVoltage'] = pd.to_numeric(all_nodes_df['ActualVoltage'], errors='coerce')
-    all_nodes_df['UnallocatedReactivePower'] = pd.to_numeric(all_nodes_df['UnallocatedReactivePower'], errors='coerce')
-    all_nodes_df = all_nodes_df.dropna(subset=['RatedVoltage', 'ActualVoltage'])
-
-    def classify_voltage(row):
-        rated = row['RatedVoltage']
-        actual = row['ActualVoltage']
-        if abs(rated - 500.0) < 30:
-            min_v = 500.0
-            max_v = 500.0 * 1.10
-            alert_min_v = 500.0 * 1.052
-            if actual < min_v:
-                status = '低压'
-                deviation = (min_v - actual) / min_v * 100
-            elif actual > max_v:
-                status = '高压'
-                deviation = (actual - max_v) / max_v * 100
-            elif actual >= alert_min_v - 0.1 and actual <= max_v + 0.1:
-                status = '预警高压'
-                deviation = (actual - alert_min_v) / alert_min_v * 100
-            else:
-                status = '正常'
-                deviation = 0.0
-            return status, deviation
-        elif abs(rated - 230.0) < 25.0:
-            min_v = 220.0 * 0.95
-            max_v = 220.0 * 1.10
-            if actual < min_v:
-                status = '低压'
-                deviation = (min_v - actual) / min_v * 100
-            elif actual > max_v:
-                status = '高压'
-                deviation = (actual - max_v) / max_v * 100
-            else:
-                status = '正常'
-                deviation = 0.0
-            return status, deviation
-        return '排除', 0.0
-
-    all_nodes_df[['状态', '偏差 (%)']] = all_nodes_df.apply(classify_voltage, axis=1, result_type='expand')
-    all_nodes_df['偏差 (%)'] = all_nodes_df['偏差 (%)'].round(2)
-    anomalies_df = all_nodes_df[all_nodes_df['状态'].isin(['低压', '高压', '预警高压'])].copy()
-    return all_nodes_df, anomalies_df
-
-def _format_string(value, length):
-    def char_width(char):
-        ea_width = unicodedata.east_asian_width(char)
-        return 2 if ea_width in ('F', 'W', 'A') else 1
-
-    def string_width(string):
-        return sum(char_width(c) for c in string)
-
-    formatted_value = ''
-    current_width = 0
-    for char in str(value):
-        if string_width(formatted_value) >= length:
-            break
-        w = char_width(char)
-        if current_width + w > length:
-            break
-        formatted_value += char
-        current_width += w
-
-    while string_width(formatted_value) < length:
-        formatted_value += ' '
-    return formatted_value
+# 设置 BPA_PFO_WORKERS 时，大 PFO 文件分块后在多个进程中并行解析（0 为 CPU 核数），默认单进程
+PFO_PARSE_WORKERS = int(os.environ.get('BPA_PFO_WORKERS') or 1)
+
+# 潮流监视（支路过载、发电机无功到限、分区无功平衡）为试验功能：明细行格式尚未用实际 PFO 输出核对，
+# 设置 BPA_FLOW_MONITORS=1 时才提取支路 / 发电机并显示，默认只解析母线做电压监测
+FLOW_MONITORS = os.environ.get('BPA_FLOW_MONITORS') == '1'
+
+# 设置 BPA_SNAPSHOT_DIR 时，解析后的算例另存为磁盘快照，重新上传同一文件（含重启后）直接映射加载
+snapshot_store = SnapshotStore.from_env()
 
 class DATModifierApp:
     def __init__(self):
         if 'logs' not in st.session_state:
-            st.session_state.logs = []
+            st.session_state.logs = LogBuffer(writer=get_file_writer())
         if 'uploaded_files' not in st.session_state:
-            st.session_state.uploaded_files = []
-        if 'voltage_anomalies' not in st.session_state:
-            st.session_state.voltage_anomalies = None
-        if 'all_nodes' not in st.session_state:
-            st.session_state.all_nodes = None
+            st.session_state.uploaded_files = deque(maxlen=MAX_UPLOAD_HISTORY)
+        # 较大的会话数据（节点表、迭代记录、修改记录、调整方案、导出文件）按会话内存预算管理，超出时落盘
+        if 'data' not in st.session_state:
+            st.session_state.data = SessionData.from_env()
+        if 'voltage_levels' not in st.session_state:
+            st.session_state.voltage_levels = DEFAULT_VOLTAGE_LEVELS
+        if 'pfo_result_key' not in st.session_state:
+            st.session_state.pfo_result_key = None
+        if 'seen_uploads' not in st.session_state:
+            st.session_state.seen_uploads = deque(maxlen=MAX_UPLOAD_HISTORY)
+        if 'profiler' not in st.session_state:
+            st.session_state.profiler = Profiler()
+        # 执行修改 / 执行电压监测在后台线程中运行，本会话的任务按提交顺序逐个执行
+        if 'jobs' not in st.session_state:
+            st.session_state.jobs = JobQueue(default_runner())
         self.logs = st.session_state.logs
         self.uploaded_files = st.session_state.uploaded_files
+        self.data = st.session_state.data
+        self.jobs = st.session_state.jobs
         self.b_parameters = {
             "shunt_var": "num",
         }
 
     def log(self, msg, level="INFO"):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] [{level}] {msg}"
-        self.logs.append(log_message)
-        st.session_state.logs = self.logs
-        try:
-            with open("operation_log.txt", "a", encoding='utf-8') as log_file:
-                log_file.write(log_message + "\n")
-        except Exception as e:
-            print(f"无法写入日志文件: {e}")
+        self.logs.log(msg, level)
 
     def log_file_upload(self, file):
-        if file is not None:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            file_size = len(file.getvalue()) / 1024
-            log_message = f"[{timestamp}] [UPLOAD] 文件上传: {file.name}, 大小: {file_size:.2f} KB"
-            self.logs.append(log_message)
-            self.uploaded_files.append({
-                "name": file.name,
-                "size_kb": file_size,
-                "timestamp": timestamp
-            })
-            st.session_state.logs = self.logs
-            st.session_state.uploaded_files = self.uploaded_files
-            try:
-                with open("operation_log.txt", "a", encoding='utf-8') as log_file:
-                    log_file.write(log_message + "\n")
-            except Exception as e:
-                print(f"无法写入日志文件: {e}")
+        # 同一上传文件在每次重新运行脚本时只记录一次，返回是否为新上传
+        if file is None:
+            return False
+        file_id = getattr(file, 'file_id', None) or (file.name, file.size)
+        if file_id in st.session_state.seen_uploads:
+            return False
+        st.session_state.seen_uploads.append(file_id)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        file_size = len(file.getvalue()) / 1024
+        self.log(f"文件上传: {file.name}, 大小: {file_size:.2f} KB", level="UPLOAD")
+        self.uploaded_files.append({
+            "name": file.name,
+            "size_kb": file_size,
+            "timestamp": timestamp
+        })
+        return True
+
+    def read_upload(self, file) -> bytes:
+        with stage('upload_read', file=file.name) as record:
+            content = file.getvalue()
+            record['bytes'] = len(content)
+        return content
+
+    def submit_job(self, label, kind, func, *args):
+        # func(job, *args) 在后台线程中执行，不能调用 st.*；阶段耗时写入本会话的 Profiler
+        job = self.jobs.submit(label, kind, func, *args, profiler=st.session_state.profiler)
+        self.log(f"已加入后台任务: {label}")
+        st.info(f"已加入后台任务（前面还有 {len(self.jobs.active()) - 1} 个），进度与结果见侧栏“后台任务”。")
+        return job
+
+    def read_and_parse_dat(self, file_content, cache_key=None, job=None):
+        # 解析结果按内容哈希缓存，返回副本以免修改污染缓存。
+        # 在后台任务中（给出 job）报告解析进度，出错时抛出异常由任务记录
+        case = results_cache.get(cache_key) if cache_key else None
+        if case is not None:
+            self.log(f"命中缓存：复用已解析的文件。共 {len(case.lines)} 行，B卡 {len(case.table)} 张")
+            return case.copy()
+
+        if snapshot_store is not None and cache_key:
+            case = snapshot_store.load(cache_key, BCard)
+            if case is not None:
+                self.log(f"命中磁盘快照：直接加载已解析的文件。共 {len(case.lines)} 行，B卡 {len(case.table)} 张")
+                results_cache.put(cache_key, case)
+                return case.copy()
 
-    def read_and_parse_dat(self, file_content):
         self.log("读取文件内容")
+        if job is not None:
+            job.step("解析 DAT")
         try:
-            lines = file_content.decode('gbk', errors='ignore').splitlines()
+            with stage('read_and_parse_dat', bytes=len(file_content)) as record:
+                case = parse_dat(file_content, BCard, progress=job.progress if job is not None else None)
+                record.update(lines=len(case.lines), b_cards=len(case.table))
         except Exception as e:
+            if job is not None:
+                self.log(f"错误: 无法读取文件: {e}", level="ERROR")
+                raise
             st.error(f"无法读取文件: {e}")
             self.log(f"错误: 无法读取文件: {e}", level="ERROR")
-            return None, None
-
-        original_lines = []
-        categorized_objects = {'B': []}
-
-        for idx, line in enumerate(lines):
-            line_stripped = line.rstrip('\n')
-            if line_stripped.startswith("B "):
-                try:
-                    b_obj = BCard(line_stripped, idx)
-                    categorized_objects['B'].append(b_obj)
-                    original_lines.append(b_obj)
-                except Exception as e:
-                    self.log(f"错误: 解析 B卡失败 (行 {idx}): {e}", level="ERROR")
-            else:
-                original_lines.append(line_stripped)
+            return None
 
-        self.log("文件解析完成。")
-        return original_lines, categorized_objects
+        self.log(f"文件解析完成。共 {len(case.lines)} 行，B卡 {len(case.table)} 张")
+        if snapshot_store is not None and cache_key:
+            try:
+                snapshot_store.save(cache_key, case)
+                self.log("已保存解析快照", level="DEBUG")
+            except OSError as e:
+                self.log(f"警告: 无法保存解析快照: {e}", level="WARNING")
+        counts = ", ".join(f"{name} {count}" for name, count in case.type_counts().items() if name != 'B')
+        self.log(f"各类卡片数量: {counts}", level="DEBUG")
+        if cache_key:
+            results_cache.put(cache_key, case)
+        return case.copy()
 
-    def write_back_dat(self, original_lines):
-        output = io.StringIO()
-        for item in original_lines:
-            if hasattr(item, 'gen') and callable(item.gen):
-                output.write(item.gen() + '\n')
-            else:
-                output.write(item + '\n')
-        return output.getvalue().encode('gbk')
+    def write_back_dat(self, case, job=None):
+        self.log(f"写回文件：共 {len(case.lines)} 行，重新生成 {len(case.dirty)} 张 B卡")
+        if job is not None:
+            job.step("写回 DAT", len(case.dirty))
+        with stage('write_back_dat', lines=len(case.lines), edits=len(case.dirty)) as record:
+            data = case.to_bytes(progress=job.progress if job is not None else None)
+            record['bytes'] = len(data)
+        return data
 
-    def modify_b_cards(self, categorized_objects, dist_f, owner_f, vol_f, modifications):
-        b_list = categorized_objects.get('B', [])
-        filtered = []
+    def modify_b_cards(self, case, dist_f, owner_f, vol_f, modifications, near=None):
+        with stage('modify_b_cards', b_cards=len(case.table)) as record:
+            summary = apply_b_modifications(case, dist_f, owner_f, vol_f, modifications, log=self.log, near=near)
+            record.update(matched=summary['matched'], edits=sum(summary['changed'].values()))
+        return summary
 
-        user_vol = None
-        if vol_f:
-            try:
-                user_vol = float(vol_f)
-            except ValueError:
-                self.log(f"警告: B卡电压 '{vol_f}' 非法，忽略电压筛选", level="WARNING")
-                user_vol = None
-
-        dist_list = None
-        if dist_f:
-            dist_list = [item.strip() for item in re.split(r',|，', dist_f) if item.strip()]
-            if not dist_list:
-                self.log(f"警告: B卡分区 '{dist_f}' 格式非法，无有效值", level="WARNING")
-
-        owner_list = None
-        if owner_f:
-            owner_list = [item.strip() for item in re.split(r',|，', owner_f) if item.strip()]
-            if not owner_list:
-                self.log(f"警告: B卡所有者 '{owner_f}' 格式非法，无有效值", level="WARNING")
-
-        for b_obj in b_list:
-            if dist_list and b_obj.dist.strip() not in dist_list:
-                continue
-            if owner_list and b_obj.owner.strip() not in owner_list:
-                continue
-            if user_vol is not None:
-                b_vol = getattr(b_obj, "vol_rank", "0")
-                try:
-                    b_vol_f = float(b_vol)
-                    if abs(b_vol_f - user_vol) >= 0.1:
-                        continue
-                except ValueError:
-                    continue
-            filtered.append(b_obj)
+    def edit_journal(self, dat_key):
+        # 修改记录按原始文件内容哈希区分，同一文件重新上传后继续沿用
+        journals = self.data.setdefault('edit_journals', dict)
+        journal = journals.get(dat_key)
+        if journal is None:
+            journal = journals[dat_key] = EditJournal(dat_key)
+            while len(journals) > MAX_EDIT_JOURNALS:
+                journals.pop(next(iter(journals)))
+        return journal
 
-        self.log(f"B卡符合条件: {len(filtered)}")
+    def read_dat_version(self, file_content, dat_key, journal, version=None, job=None):
+        # 由缓存 / 快照中的原始算例重放修改记录得到指定版本（默认当前版本）
+        case = self.read_and_parse_dat(file_content, cache_key=dat_key, job=job)
+        version = journal.version if version is None else version
+        if case is not None and version:
+            with stage('journal_replay', version=version):
+                journal.apply(case, version)
+        return case
 
-        for b_obj in filtered:
-            bus_name = getattr(b_obj, 'bus_name', 'NoBusName?')
-            for param, mod in modifications.items():
-                if not mod['apply']:
-                    continue
-                old_val = getattr(b_obj, param, "0")
-                try:
-                    old_val_num = float(old_val)
-                    if mod['method'] == "set":
-                        new_num = float(mod['value'])
-                        setattr(b_obj, param, f"{new_num:.2f}")
-                        self.log(f"B卡 [BusName={bus_name}]: {param} 设为 {new_num}")
-                    else:
-                        coeff = float(mod['value'])
-                        new_num = old_val_num * coeff
-                        setattr(b_obj, param, f"{new_num:.2f}")
-                        self.log(f"B卡 [BusName={bus_name}]: {param} 由 {old_val_num}×{coeff}={new_num}")
-                except ValueError:
-                    self.log(f"错误: 无法将 B卡 [BusName={bus_name}] 的 {param}='{old_val}' 转为浮点数", level="ERROR")
+    def run_dat_edit(self, file_content, dat_key, label, edit, accumulate, output_key=None, job=None):
+        # edit(case) 修改算例并返回附带结果（如规则执行报告），返回 (写回的文件内容, 附带结果)。
+        # accumulate 时在当前版本上修改并记为新版本，否则在原始文件上修改（按 output_key 缓存结果）
+        if not accumulate:
+            cached = results_cache.get(output_key) if output_key else None
+            if cached is not None:
+                self.log("命中缓存：相同文件与修改条件，直接复用修改结果")
+                return cached
+            case = self.read_and_parse_dat(file_content, cache_key=dat_key, job=job)
+            if case is None:
+                return None
+            if job is not None:
+                job.step("修改 B卡")
+            extra = edit(case)
+            result = (self.write_back_dat(case, job), extra)
+            return results_cache.put(output_key, result) if output_key else result
+
+        # 先在会话锁外解析（结果进入共享缓存）；重放、修改与记录版本时持有会话锁，与界面上的撤销 / 重做
+        # 及其他任务互斥，写回在锁外进行
+        if job is not None:
+            self.read_and_parse_dat(file_content, cache_key=dat_key, job=job)
+        with self.data.locked():
+            journal = self.edit_journal(dat_key)
+            case = self.read_dat_version(file_content, dat_key, journal, job=job)
+            if case is None:
+                return None
+            if job is not None:
+                job.step("修改 B卡")
+            with journal.record(case, label) as recorded:
+                extra = edit(case)
+                if job is not None:
+                    # 提交版本前最后检查一次取消请求，已取消的任务不留下版本
+                    job.check()
+            token = journal.token()
+        if recorded['version'] is None:
+            self.log("本次修改没有改变任何卡片，未新增版本", level="WARNING")
+        else:
+            self.log(f"已记录修改版本 {recorded['version']}: {label}（修改 {recorded['cards']} 张卡）")
+        try:
+            data = results_cache.get_or_create(content_key('dat-version', *token),
+                                               lambda: self.write_back_dat(case, job))
+        except JobCancelled:
+            # 写回时被取消：撤回刚记录的版本（其后已有其他修改时保留）
+            with self.data.locked():
+                if self.edit_journal(dat_key).rollback(recorded):
+                    self.log(f"任务已取消，撤回修改版本: {label}", level="WARNING")
+            raise
+        return data, extra
+
+    def dat_edit_job(self, job, file_content, dat_key, label, edit, accumulate, output_key, file_name):
+        data, _ = self.run_dat_edit(file_content, dat_key, label, edit, accumulate, output_key, job=job)
+        self.log(f"修改完成，可在侧栏下载: {file_name}")
+        return {'data': data, 'file_name': file_name}
 
     def create_b_shunt_var_tab(self):
         st.markdown("""
@@ -359,13 +264,16 @@ class DATModifierApp:
         - 上传 PSD-BPA 格式的 `.dat` 文件以修改 B 卡的并联无功 (shunt_var)。
         - 在“筛选条件”中输入分区、所有者和电压等级（可选），用英文逗号 (,) 或中文逗号 (，) 分隔多个值。
         - 在“修改字段”中设置 shunt_var 的新值或乘系数。
-        - 点击“执行修改”生成修改后的文件，点击“下载”保存。
+        - 点击“执行修改”后修改在后台执行，期间可继续操作或换一个文件再次执行（按提交顺序排队）；完成后在侧栏“后台任务”中下载。
+        - 需要多组筛选 / 修改时，在“规则表批量修改”中逐行填写规则，一次解析、一次写回完成全部修改。
+        - 勾选“在当前版本上继续修改”时，每次修改都在上一次结果上进行并记为一个版本，可在“修改历史”中撤销 / 重做或导出任一版本。
         """)
         st.subheader("文件选择 (B卡 - shunt_var)")
         b_input_file = st.file_uploader("上传输入.dat文件", type=["dat"], key="b_input")
-        if b_input_file:
-            self.log_file_upload(b_input_file)
+        self.log_file_upload(b_input_file)
         b_output_filename = st.text_input("输出.dat文件名", value="modified_b_shunt_var.dat", key="b_output_filename")
+        accumulate = st.checkbox("在当前版本上继续修改（记录修改历史，可撤销 / 重做）", value=False, key="b_accumulate",
+                                 help="默认不勾选：每次修改都从原始文件开始，且不记录修改历史")
 
         st.subheader("筛选条件")
         col1, col2, col3 = st.columns(3)
@@ -375,6 +283,15 @@ class DATModifierApp:
             b_owner = st.text_input("所有者(owner, 用逗号分隔, 如 苏,锡)", value="苏,锡", key="b_owner")
         with col3:
             b_vol = st.text_input("电压(vol_rank)", value="", key="b_vol_rank")
+        with st.expander("拓扑筛选（按电气距离）"):
+            st.markdown("只修改与中心母线经线路 / 变压器相连、距离不超过指定跳数的 B卡（如电压异常母线附近的无功装置），与上述条件取交集。留空则不启用。")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                b_near = st.text_input("中心母线(用逗号分隔)", value="", key="b_near_buses")
+            with col2:
+                b_near_kv = st.text_input("中心母线电压(可留空)", value="", key="b_near_kv")
+            with col3:
+                b_hops = st.number_input("跳数", min_value=0, max_value=20, value=2, step=1, key="b_near_hops")
 
         st.subheader("修改 shunt_var")
         modifications = {}
@@ -405,20 +322,321 @@ class DATModifierApp:
                 st.warning("请指定输出文件名。")
                 return
 
-            self.log("开始处理 B卡 shunt_var...")
-            original_lines, categorized = self.read_and_parse_dat(b_input_file.read())
-            if original_lines is None or categorized is None:
+            file_content = self.read_upload(b_input_file)
+            dat_key = content_key('dat', file_content)
+            output_key = content_key('dat-output', dat_key, b_dist, b_owner, b_vol, sorted(modifications.items()),
+                                     b_near, b_near_kv, b_hops if b_near else None)
+            changes = ", ".join(f"{p} {'设值' if m['method'] == 'set' else '乘'} {m['value']}"
+                                for p, m in modifications.items() if m['apply'])
+            label = f"{changes or '无修改'}（dist={b_dist}, owner={b_owner}, vol={b_vol or '全部'}"
+            label += f", 距 {b_near} {int(b_hops)} 跳内）" if b_near else "）"
+
+            def edit(case):
+                self.log("开始处理 B卡 shunt_var...")
+                near = near_positions(case, b_near, b_near_kv, int(b_hops), log=self.log) if b_near else None
+                return self.modify_b_cards(case, b_dist, b_owner, b_vol, modifications, near=near)
+
+            self.submit_job(f"{b_input_file.name}: {label}", 'dat', self.dat_edit_job, file_content, dat_key, label,
+                            edit, accumulate, output_key, b_output_filename)
+
+        self.show_rule_table(b_input_file, b_output_filename, accumulate)
+        self.show_shunt_planner(b_input_file, b_output_filename, accumulate)
+        self.show_edit_journal(b_input_file, b_output_filename)
+
+    def show_rule_table(self, b_input_file, b_output_filename, accumulate=False):
+        # 多条“筛选 → 修改”规则按顺序编译后一次作用在 B卡上，文件只解析、写回各一次
+        st.subheader("规则表批量修改")
+        st.markdown("每行一条规则：dist / owner（逗号分隔，可留空）、vol_rank（可留空）筛选 B卡，对 param 字段设值 (set) 或乘系数 (mul)。"
+                    "order 为执行顺序（小的先执行，留空排在最后），未勾选 enabled 的规则不执行。")
+        rules_file = st.file_uploader("导入规则表 (CSV/Excel，可选)", type=["csv", "xlsx"], key="b_rules_file")
+        if rules_file is not None:
+            try:
+                if rules_file.name.lower().endswith('.xlsx'):
+                    imported = pd.read_excel(io.BytesIO(rules_file.getvalue()), dtype=str)
+                else:
+                    imported = pd.read_csv(io.BytesIO(rules_file.getvalue()), dtype=str, encoding='utf-8-sig')
+                initial = editable_rules(imported)
+            except Exception as e:
+                st.error(f"无法读取规则表: {e}")
+                initial = rules_template()
+        else:
+            initial = rules_template()
+        rules_df = st.data_editor(
+            initial,
+            num_rows="dynamic",
+            use_container_width=True,
+            key=f"b_rules_editor_{getattr(rules_file, 'file_id', None) or 'default'}",
+            column_config={
+                "order": st.column_config.NumberColumn("order", step=1),
+                "enabled": st.column_config.CheckboxColumn("enabled", default=True),
+                "param": st.column_config.SelectboxColumn("param", options=list(B_EDITABLE_FIELDS), default="shunt_var"),
+                "method": st.column_config.SelectboxColumn("method", options=["set", "mul"], default="mul"),
+                "dist": st.column_config.TextColumn("dist"),
+                "owner": st.column_config.TextColumn("owner"),
+                "vol_rank": st.column_config.TextColumn("vol_rank"),
+                "value": st.column_config.TextColumn("value"),
+            }
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            mode = st.radio("规则叠加方式", list(RULE_MODES), format_func=RULE_MODES.get, horizontal=True, key="b_rules_mode",
+                            help="依次叠加：命中的规则按顺序依次作用；首条命中：每张卡只由顺序最靠前的命中规则修改")
+        with col2:
+            st.download_button(
+                label="下载当前规则表 (CSV)",
+                data=rules_df.to_csv(index=False).encode('utf-8-sig'),
+                file_name="b_rules.csv",
+                mime="text/csv",
+                key="b_rules_download"
+            )
+
+        if st.button("按规则表执行", key="b_rules_execute", type="primary"):
+            if not b_input_file:
+                st.warning("请选择输入的 .dat 文件。")
+                return
+            try:
+                rules = normalize_rules(rules_df)
+            except ValueError as e:
+                st.error(str(e))
+                self.log(f"错误: {e}", level="ERROR")
+                return
+            if not rules:
+                st.warning("规则表为空。")
                 return
-            self.modify_b_cards(categorized, b_dist, b_owner, b_vol, modifications)
-            output_data = self.write_back_dat(original_lines)
+
+            self.log(f"开始按规则表修改 B卡：{len(rules)} 条规则")
+            file_content = self.read_upload(b_input_file)
+            dat_key = content_key('dat', file_content)
+            output_key = content_key('dat-rules', dat_key, mode, rules)
+
+            def edit(case):
+                with stage('apply_rules', rules=len(rules), b_cards=len(case.table)) as record:
+                    report = apply_rules(case, rules, mode, log=self.log)
+                    record.update(matched=int(report['matched'].sum()), edits=len(case.dirty))
+                return report
+
+            result = self.run_dat_edit(file_content, dat_key, f"规则表 {len(rules)} 条（{RULE_MODES[mode]}）", edit,
+                                       accumulate, output_key)
+            if result is None:
+                return
+            output_data, report = result
+            st.dataframe(report, use_container_width=True, hide_index=True)
+            st.download_button(
+                label="下载按规则表修改后的文件",
+                data=output_data,
+                file_name=b_output_filename or "modified_b_rules.dat",
+                mime="application/octet-stream",
+                key="b_rules_download_dat"
+            )
+
+    def show_shunt_planner(self, b_input_file, b_output_filename, accumulate=False):
+        # 按最近一次电压监测结果，将异常 / 未安排无功母线与 DAT 中同名同电压的 B卡逐卡关联，生成 shunt_var 调整方案
+        st.subheader("按电压监测结果生成调整方案")
+        all_nodes_df = self.data.get('all_nodes')
+        if all_nodes_df is None:
+            st.info("请先在“电压监测 / Voltage Monitoring”标签执行电压监测，再按监测结果生成调整方案。")
+            return
+        st.markdown("低压节点增加 shunt_var，高压 / 预警高压节点减少 shunt_var，调整量按电压偏差计算；"
+                    "未安排无功按其符号补到 shunt_var。只修改与异常母线同名、同电压等级的 B卡。")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            min_step = st.number_input("最小调整量 (MVar)", min_value=0.0, value=DEFAULT_PLAN_SETTINGS['min_step'], key="plan_min_step")
+        with col2:
+            per_percent = st.number_input("每 1% 偏差调整量 (MVar)", min_value=0.0, value=DEFAULT_PLAN_SETTINGS['per_percent'], key="plan_per_percent")
+        with col3:
+            max_step = st.number_input("单卡最大调整量 (MVar)", min_value=0.0, value=DEFAULT_PLAN_SETTINGS['max_step'], key="plan_max_step")
+        include_alert = st.checkbox("包含预警高压节点", value=DEFAULT_PLAN_SETTINGS['include_alert'], key="plan_include_alert")
+        include_unallocated = st.checkbox("包含未安排无功节点", value=DEFAULT_PLAN_SETTINGS['include_unallocated'], key="plan_include_unallocated")
+
+        if st.button("生成调整方案", key="plan_generate"):
+            if not b_input_file:
+                st.warning("请选择输入的 .dat 文件。")
+                return
+            file_content = self.read_upload(b_input_file)
+            dat_key = content_key('dat', file_content)
+            # 继续修改时按当前版本的 shunt_var 计算方案
+            journal = self.edit_journal(dat_key) if accumulate else None
+            if journal is not None:
+                case = self.read_dat_version(file_content, dat_key, journal)
+            else:
+                case = self.read_and_parse_dat(file_content, cache_key=dat_key)
+            if case is None:
+                return
+            settings = {'min_step': min_step, 'per_percent': per_percent, 'max_step': max_step,
+                        'include_alert': include_alert, 'include_unallocated': include_unallocated}
+            plan = plan_shunt_adjustments(case, all_nodes_df, settings)
+            plan.insert(0, '采用', True)
+            self.data.set('shunt_plan', {'dat_key': dat_key, 'plan': plan,
+                                         'version': journal.token() if journal is not None else None})
+            self.log(f"生成调整方案：关联 B卡 {len(plan)} 张")
+
+        shunt_plan = self.data.get('shunt_plan')
+        if shunt_plan is None:
+            return
+        plan = shunt_plan['plan']
+        if plan.empty:
+            st.info("监测结果中的异常母线在 DAT 文件中没有匹配的 B卡（按母线名与电压等级匹配）。")
+            return
+        st.write(f"共关联 **{len(plan)}** 张 B卡，可取消勾选不需要修改的卡片或直接编辑新值")
+        edited = st.data_editor(
+            plan.drop(columns=['position', 'row']),
+            use_container_width=True,
+            hide_index=True,
+            key="plan_editor",
+            disabled=[c for c in plan.columns if c not in ('采用', 'shunt_var_new')],
+        )
+        if st.button("按方案生成 DAT", key="plan_apply", type="primary"):
+            if not b_input_file or content_key('dat', b_input_file.getvalue()) != shunt_plan['dat_key']:
+                st.warning("当前上传的 .dat 文件与生成方案时不同，请重新生成调整方案。")
+                return
+            selected = plan.assign(shunt_var_new=pd.to_numeric(edited['shunt_var_new'], errors='coerce').to_numpy())
+            selected = selected[edited['采用'].to_numpy(dtype=bool) & selected['shunt_var_new'].notnull().to_numpy()]
+            selected = selected.assign(delta=(selected['shunt_var_new'] - selected['shunt_var_old']).round(2))
+            dat_key = shunt_plan['dat_key']
+            if accumulate and shunt_plan['version'] != self.edit_journal(dat_key).token():
+                st.warning("生成方案后修改历史已变化（或切换了是否继续修改），请重新生成调整方案。")
+                return
+            result = self.run_dat_edit(b_input_file.getvalue(), dat_key, f"调整方案 {len(selected)} 张 B卡",
+                                       lambda case: apply_shunt_plan(case, selected, log=self.log), accumulate)
+            if result is None:
+                return
+            st.download_button(
+                label="下载按方案修改后的文件",
+                data=result[0],
+                file_name=b_output_filename or "planned_b_shunt_var.dat",
+                mime="application/octet-stream",
+                key="plan_download"
+            )
+
+    def show_edit_journal(self, b_input_file, b_output_filename):
+        # 当前文件的修改版本：撤销 / 重做只移动版本号，导出时由原始算例重放差量生成
+        st.subheader("修改历史（撤销 / 重做）")
+        if not b_input_file:
+            st.info("上传 .dat 文件并执行修改后，可在此撤销 / 重做或导出任一版本。")
+            return
+        file_content = b_input_file.getvalue()
+        dat_key = content_key('dat', file_content)
+        journal = self.data.setdefault('edit_journals', dict).get(dat_key)
+        if journal is None or not len(journal):
+            st.info("当前文件还没有修改记录。勾选“在当前版本上继续修改”后执行的修改会逐版本记录在这里。")
+            return
+        st.write(f"当前为第 **{journal.version}** 版，共 {len(journal)} 个版本；修改记录占用 {journal.nbytes / 1024:.1f} KB")
+        st.dataframe(journal.summary(), use_container_width=True, hide_index=True)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("撤销", key="journal_undo", disabled=not journal.can_undo):
+                with self.data.locked():
+                    journal.undo()
+                self.log(f"撤销修改，回到第 {journal.version} 版")
+                st.rerun()
+        with col2:
+            if st.button("重做", key="journal_redo", disabled=not journal.can_redo):
+                with self.data.locked():
+                    journal.redo()
+                self.log(f"重做修改，前进到第 {journal.version} 版")
+                st.rerun()
+        with col3:
+            if st.button("清空修改历史", key="journal_clear"):
+                with self.data.locked():
+                    journal.clear()
+                self.log("已清空当前文件的修改历史")
+                st.rerun()
+
+        versions = list(range(len(journal) + 1))
+        labels = ['原始文件'] + [entry['label'] for entry in journal.versions]
+        version = st.selectbox("选择版本", versions, index=journal.version,
+                               format_func=lambda v: f"第 {v} 版: {labels[v]}",
+                               key=f"journal_version_{len(journal)}_{journal.version}")
+        if version:
+            with st.expander(f"第 {version} 版修改明细"):
+                st.dataframe(journal.changes(version, results_cache.get(dat_key)), use_container_width=True, hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("切换到该版本", key="journal_goto", disabled=version == journal.version):
+                with self.data.locked():
+                    journal.goto(version)
+                self.log(f"切换到第 {version} 版")
+                st.rerun()
+        with col2:
+            export = st.button("导出该版本", key="journal_export")
+        if export:
+            output_key = content_key('dat-version', *journal.token(version))
+            output_data = results_cache.get(output_key)
+            if output_data is None:
+                case = self.read_dat_version(file_content, dat_key, journal, version)
+                if case is None:
+                    return
+                output_data = results_cache.put(output_key, self.write_back_dat(case))
+            stem, ext = os.path.splitext(b_output_filename or "modified_b_shunt_var.dat")
             st.download_button(
-                label="下载修改后的文件",
+                label=f"下载第 {version} 版文件",
                 data=output_data,
-                file_name=b_output_filename,
+                file_name=f"{stem}_v{version}{ext or '.dat'}",
                 mime="application/octet-stream",
-                key="b_download"
+                key="journal_download"
+            )
+            self.log(f"导出第 {version} 版: {stem}_v{version}{ext or '.dat'}")
+
+    def create_card_generation_tab(self):
+        st.markdown("""
+        **使用说明**:
+        - 上传参数表（CSV 或 Excel，第一行为列名），每行生成一组卡片：
+          - **L**：线路卡，必填 bus1、kv1、bus2、kv2、r、x（标幺值）。
+          - **T2**：双绕组变压器 T 卡，必填 bus1、kv1、bus2、kv2、x，分接头 tap1/tap2 留空时取两侧基准电压。
+          - **T3**：三绕组变压器，生成中性点 B 卡及高/中/低压侧到中性点的三张 T 卡，必填 mid_bus、mid_kv、bus_h/m/l、kv_h/m/l、x_h/m/l。
+        - 参数表分块读取并逐块写出；存在错误的行不生成卡片，并列出行号与原因。
+        - 可选上传 `.dat` 文件，生成的卡片插入到 `(END)` 之前，并校验支路两端母线是否存在于算例中。
+        """)
+        kind = st.radio("卡片类型", CARD_KINDS, horizontal=True, key="gen_kind")
+        st.download_button(
+            label=f"下载 {kind} 参数表模板",
+            data=sheet_template(kind),
+            file_name=f"{kind}_template.csv",
+            mime="text/csv",
+            key="gen_template"
+        )
+        st.caption("列: " + ", ".join(SHEET_COLUMNS[kind]))
+        sheet_file = st.file_uploader("上传参数表", type=["csv", "xlsx"], key="gen_sheet")
+        self.log_file_upload(sheet_file)
+        base_file = st.file_uploader("上传要插入卡片的.dat文件（可选）", type=["dat"], key="gen_base")
+        self.log_file_upload(base_file)
+        output_filename = st.text_input("输出.dat文件名", value=f"generated_{kind}.dat", key="gen_output_filename")
+
+        if st.button("生成卡片", key="gen_execute", type="primary"):
+            if not sheet_file:
+                st.warning("请上传参数表。")
+                return
+            self.log(f"开始生成 {kind} 卡: {sheet_file.name}")
+            out = io.BytesIO()
+            try:
+                if base_file:
+                    file_content = self.read_upload(base_file)
+                    case = self.read_and_parse_dat(file_content, cache_key=content_key('dat', file_content))
+                    if case is None:
+                        return
+                    summary = splice_cards(case, io.BytesIO(sheet_file.getvalue()), kind, out, name=sheet_file.name)
+                else:
+                    summary = write_cards(io.BytesIO(sheet_file.getvalue()), kind, out, name=sheet_file.name)
+            except Exception as e:
+                st.error(f"无法生成卡片: {e}")
+                self.log(f"错误: 无法生成 {kind} 卡: {e}", level="ERROR")
+                return
+
+            errors = summary['errors']
+            self.log(f"{kind} 卡生成完成：共 {summary['cards']} 张，错误 {len(errors)} 行")
+            if errors:
+                st.warning(f"{len(errors)} 行参数有误，未生成卡片")
+                st.dataframe(pd.DataFrame(errors, columns=['行号', '原因']).sort_values('行号'),
+                             use_container_width=True, hide_index=True)
+                self.log(f"{kind} 参数表错误（前 20 条）: " + "; ".join(f"第 {r} 行 {m}" for r, m in errors[:20]), level="WARNING")
+            st.success(f"共生成 {summary['cards']} 张卡片")
+            st.download_button(
+                label="下载生成的文件",
+                data=out.getvalue(),
+                file_name=output_filename or f"generated_{kind}.dat",
+                mime="application/octet-stream",
+                key="gen_download"
             )
-            self.log(f"修改完成，准备下载: {b_output_filename}")
 
     def create_voltage_monitoring_tab(self):
         st.markdown("""
@@ -432,24 +650,53 @@ class DATModifierApp:
             - 高于 550 kV 为异常高压
           - 220 kV 节点（标称 230 kV）：正常范围 209–242 kV
           - 低于 220 kV 的节点不监测
+          - 以上为默认阈值，可在“电压等级阈值设置”中调整或新增电压等级（如 1000 kV、110 kV、35 kV）
         - 未安排无功：检查哪些节点存在未安排无功（MVar），并列出其值。
-        - 查看异常、预警节点和未安排无功列表及分区/所有者分布，下载异常报告或完整节点数据为 Excel 文件。
+        - 潮流监视（试验功能，设置 BPA_FLOW_MONITORS=1 时启用）：同一次读取中一并提取支路潮流与发电机出力，
+          列出过载支路、无功出力到限的发电机以及各分区的无功平衡。
+        - 点击“执行电压监测”后解析在后台执行，可连续提交多个文件；完成后在侧栏“后台任务”中点击“载入结果”查看。
+        - 查看异常、预警节点和未安排无功列表及分区/所有者分布，按需导出异常报告（单个多工作表工作簿）或完整节点数据，
+          支持 Excel、CSV 以及 Parquet / Feather（需安装 pyarrow）。
         """)
-        try:
-            import openpyxl
-        except ImportError:
-            st.error("缺少 openpyxl 库，无法生成 Excel 文件。请安装：`pip install openpyxl`")
-            return
-
         st.subheader("文件选择 (电压监测)")
         pfo_input_file = st.file_uploader("上传输入.pfo文件", type=["pfo"], key="pfo_input")
-        if pfo_input_file:
-            self.log_file_upload(pfo_input_file)
-            st.session_state.voltage_anomalies = None
-            st.session_state.all_nodes = None
+        if self.log_file_upload(pfo_input_file):
+            self.data.set('voltage_anomalies', None)
+            self.data.set('all_nodes', None)
+            self.data.set('pfo_monitors', None)
+            st.session_state.pfo_result_key = None
         output_filename_anomalies = st.text_input("异常报告输出文件名", value="voltage_anomalies.xlsx", key="pfo_output_filename_anomalies")
         output_filename_all = st.text_input("完整节点数据输出文件名", value="all_nodes.xlsx", key="pfo_output_filename_all")
 
+        with st.expander("电压等级阈值设置"):
+            st.markdown("每行一个电压等级：标称电压 ± 带宽内的节点按该行的下限、上限和预警下限（可留空）分类，未落入任何等级的节点不监测。")
+            levels_input = st.data_editor(
+                DEFAULT_VOLTAGE_LEVELS,
+                num_rows="dynamic",
+                use_container_width=True,
+                key="pfo_voltage_levels",
+                column_config={
+                    "label": "等级名称",
+                    "nominal": "标称电压 (kV)",
+                    "band": "带宽 (kV)",
+                    "min": "下限 (kV)",
+                    "max": "上限 (kV)",
+                    "alert_min": "预警下限 (kV)",
+                }
+            )
+        # 未开启潮流监视时 settings 为 None，后台任务只解析母线
+        settings = None
+        if FLOW_MONITORS:
+            with st.expander("潮流监视设置（试验）"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    overload_percent = st.number_input("支路过载负载率 (%)", min_value=0.0, step=5.0,
+                                                       value=DEFAULT_MONITOR_SETTINGS['overload_percent'], key="pfo_overload_percent")
+                with col2:
+                    q_limit_tolerance = st.number_input("发电机无功到限容差 (MVar)", min_value=0.0, step=0.5,
+                                                        value=DEFAULT_MONITOR_SETTINGS['q_limit_tolerance'], key="pfo_q_tolerance")
+            settings = {'overload_percent': overload_percent, 'q_limit_tolerance': q_limit_tolerance}
+
         if st.button("执行电压监测", key="pfo_execute", type="primary"):
             if not pfo_input_file:
                 st.warning("请选择输入的 .pfo 文件。")
@@ -458,32 +705,14 @@ class DATModifierApp:
                 st.warning("请指定所有输出文件名。")
                 return
 
-            self.log("开始处理 PFO 文件进行电压监测...")
-            lines = read_pfo_file(pfo_input_file.read())
-            if not lines:
-                self.log("错误: 无法解析 PFO 文件", level="ERROR")
-                return
+            file_content = self.read_upload(pfo_input_file)
+            levels = normalize_voltage_levels(levels_input)
+            self.submit_job(f"电压监测: {pfo_input_file.name}", 'pfo', self.voltage_check_job, file_content, levels,
+                            settings, pfo_input_file.name)
 
-            records = parse_pfo_data(lines)
-            if not records:
-                st.warning("未找到有效的母线数据。")
-                self.log("警告: 未找到有效的母线数据", level="WARNING")
-                return
-
-            all_nodes_df, anomalies_df = check_voltage_anomalies(records)
-            if all_nodes_df.empty:
-                st.success("未检测到任何节点数据。")
-                self.log("电压监测完成：未检测到节点数据")
-                st.session_state.voltage_anomalies = None
-                st.session_state.all_nodes = None
-                return
-
-            st.session_state.voltage_anomalies = anomalies_df
-            st.session_state.all_nodes = all_nodes_df
-
-        if st.session_state.voltage_anomalies is not None or st.session_state.all_nodes is not None:
-            anomalies_df = st.session_state.voltage_anomalies
-            all_nodes_df = st.session_state.all_nodes
+        anomalies_df = self.data.get('voltage_anomalies')
+        all_nodes_df = self.data.get('all_nodes')
+        if anomalies_df is not None or all_nodes_df is not None:
 
             st.subheader("未安排无功节点")
             unallocated_df = all_nodes_df[all_nodes_df['UnallocatedReactivePower'].notnull()]
@@ -494,73 +723,358 @@ class DATModifierApp:
             else:
                 st.info("未检测到存在未安排无功的节点")
 
-            st.subheader("500 kV 节点电压状态")
             if anomalies_df is not None:
-                df_500kv = anomalies_df[abs(anomalies_df['RatedVoltage'] - 500.0) < 30]
-                df_500kv_abnormal = df_500kv[df_500kv['状态'].isin(['低压', '高压'])]
-                if not df_500kv_abnormal.empty:
-                    st.write(f"检测到 **{len(df_500kv_abnormal)}** 个 500 kV 节点异常（低压或高压）")
-                    st.dataframe(df_500kv_abnormal[['BusName', 'RatedVoltage', 'ActualVoltage', '状态', '偏差 (%)', 'Dist', 'Owner', 'UnallocatedReactivePower']],
-                                 use_container_width=True)
-                else:
-                    st.info("未检测到 500 kV 节点电压异常")
+                show_cols = ['BusName', 'RatedVoltage', 'ActualVoltage', '状态', '偏差 (%)', 'Dist', 'Owner', 'UnallocatedReactivePower']
+                for level in st.session_state.voltage_levels.itertuples():
+                    df_level = anomalies_df[anomalies_df['电压等级'] == level.label]
+                    has_alert = not pd.isna(level.alert_min)
+                    st.subheader(f"{level.label} 节点电压状态" if has_alert else f"{level.label} 节点电压异常")
+                    df_abnormal = df_level[df_level['状态'].isin([STATUS_LOW, STATUS_HIGH])]
+                    if not df_abnormal.empty:
+                        st.write(f"检测到 **{len(df_abnormal)}** 个 {level.label} 节点异常（低压或高压）")
+                        st.dataframe(df_abnormal[show_cols], use_container_width=True)
+                    else:
+                        st.info(f"未检测到 {level.label} 节点电压异常")
 
-                df_500kv_alert = df_500kv[df_500kv['状态'] == '预警高压']
-                if not df_500kv_alert.empty:
-                    st.write(f"检测到 **{len(df_500kv_alert)}** 个 500 kV 节点预警高压（526–550 kV）")
-                    st.dataframe(df_500kv_alert[['BusName', 'RatedVoltage', 'ActualVoltage', '状态', '偏差 (%)', 'Dist', 'Owner', 'UnallocatedReactivePower']],
-                                 use_container_width=True)
-                else:
-                    st.info("未检测到 500 kV 节点预警高压")
-
-                st.subheader("220 kV 节点电压异常")
-                df_220kv = anomalies_df[abs(anomalies_df['RatedVoltage'] - 230.0) < 25.0]
-                if not df_220kv.empty:
-                    st.write(f"检测到 **{len(df_220kv)}** 个 220 kV 节点异常")
-                    st.dataframe(df_220kv[['BusName', 'RatedVoltage', 'ActualVoltage', '状态', '偏差 (%)', 'Dist', 'Owner', 'UnallocatedReactivePower']],
-                                 use_container_width=True)
-                else:
-                    st.info("未检测到 220 kV 节点电压异常")
+                    if has_alert:
+                        df_alert = df_level[df_level['状态'] == STATUS_ALERT]
+                        if not df_alert.empty:
+                            st.write(f"检测到 **{len(df_alert)}** 个 {level.label} 节点预警高压（{level.alert_min:.0f}–{level.max:.0f} kV）")
+                            st.dataframe(df_alert[show_cols], use_container_width=True)
+                        else:
+                            st.info(f"未检测到 {level.label} 节点预警高压")
 
                 st.subheader("异常及预警分布")
                 col1, col2 = st.columns(2)
                 with col1:
-                    dist_summary = anomalies_df.groupby('Dist').size().reset_index(name='数量')
+                    dist_summary = anomalies_df.groupby('Dist', observed=True).size().reset_index(name='数量')
                     st.write("按分区 (Dist) 分布")
                     st.dataframe(dist_summary, use_container_width=True)
                 with col2:
-                    owner_summary = anomalies_df.groupby('Owner').size().reset_index(name='数量')
+                    owner_summary = anomalies_df.groupby('Owner', observed=True).size().reset_index(name='数量')
                     st.write("按所有者 (Owner) 分布")
                     st.dataframe(owner_summary, use_container_width=True)
 
-                output_buffer = io.BytesIO()
-                anomalies_df.to_excel(output_buffer, index=False)
-                output_buffer.seek(0)
-                if not output_filename_anomalies.endswith('.xlsx'):
-                    output_filename_anomalies += '.xlsx'
-                st.download_button(
-                    label="下载异常报告",
-                    data=output_buffer,
-                    file_name=output_filename_anomalies,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="pfo_download_anomalies"
-                )
-                self.log(f"电压监测完成，异常报告准备下载: {output_filename_anomalies}")
-
-            if all_nodes_df is not None:
-                output_buffer_all = io.BytesIO()
-                all_nodes_df.to_excel(output_buffer_all, index=False)
-                output_buffer_all.seek(0)
-                if not output_filename_all.endswith('.xlsx'):
-                    output_filename_all += '.xlsx'
+            self.show_flow_monitors(self.data.get('pfo_monitors'))
+            self.show_pfo_export(all_nodes_df, anomalies_df, output_filename_anomalies, output_filename_all)
+
+        self.show_iteration_history()
+
+    def voltage_check_job(self, job, file_content, levels, settings, name):
+        # 后台解析 PFO 并分类，结果在侧栏“载入结果”后才写入会话（不打断正在查看的监测结果）。
+        # 开启潮流监视（settings 不为 None）时母线、支路与发电机一次提取，电压监测与潮流监视共用同一次读取；
+        # 否则只解析母线
+        self.log("开始处理 PFO 文件进行电压监测...")
+        pfo_key = content_key('pfo-tables' if settings is not None else 'pfo-buses', file_content)
+        job.step("解析 PFO")
+        try:
+            if settings is not None:
+                tables = results_cache.get_or_create(pfo_key, lambda: profile_run(
+                    'extract_pfo', extract_pfo, file_content, workers=PFO_PARSE_WORKERS, progress=job.progress,
+                    counts={'bytes': len(file_content), 'buses': lambda t: len(t['buses']['BusName']),
+                            'branches': lambda t: len(t['branches']['FromBus']),
+                            'generators': lambda t: len(t['generators']['BusName'])}))
+                columns = tables['buses']
+            else:
+                columns = results_cache.get_or_create(pfo_key, lambda: profile_run(
+                    'parse_pfo_data', parse_pfo_data, file_content, workers=PFO_PARSE_WORKERS, progress=job.progress,
+                    counts={'bytes': len(file_content), 'buses': lambda c: len(c['BusName'])}))
+        except Exception as e:
+            self.log(f"错误: 无法解析 PFO 文件: {e}", level="ERROR")
+            raise
+
+        bus_count = len(columns['BusName'])
+        if not bus_count:
+            self.log("警告: 未找到有效的母线数据", level="WARNING")
+            raise ValueError("未找到有效的母线数据")
+        unallocated_count = int((~np.isnan(columns['UnallocatedReactivePower'])).sum())
+        self.log(f"PFO 解析完成：母线 {bus_count} 条，其中存在未安排无功 {unallocated_count} 条"
+                 + (f"；支路 {len(tables['branches']['FromBus'])} 条，发电机 {len(tables['generators']['BusName'])} 台"
+                    if settings is not None else ""))
+
+        job.step("电压分类")
+        result_key = content_key('pfo-check', pfo_key, levels.to_csv(index=False))
+        # 节点表以分类型 / float32 压缩后缓存，会话中保存的也是压缩后的表
+        all_nodes_df, anomalies_df = results_cache.get_or_create(
+            result_key, lambda: tuple(compact_nodes(df) for df in profile_run(
+                'check_voltage_anomalies', check_voltage_anomalies, columns, levels,
+                counts={'buses': lambda r: len(r[0]), 'anomalies': lambda r: len(r[1])}))
+        )
+        result = {'name': name, 'levels': levels, 'result_key': result_key,
+                  'all_nodes': all_nodes_df, 'anomalies': anomalies_df, 'monitors': None}
+        if settings is None:
+            self.log(f"电压监测完成: {name}，异常及预警节点 {len(anomalies_df)} 个，可在侧栏载入结果")
+            return result
+
+        job.step("潮流监视")
+        monitor_key = content_key('pfo-monitor', pfo_key, sorted(settings.items()))
+        monitors = results_cache.get_or_create(monitor_key, lambda: profile_run(
+            'run_monitors', run_monitors, tables, settings,
+            counts={'branches': len(tables['branches']['FromBus']), 'sheets': len}))
+        unavailable = unavailable_monitors(tables)
+        for sheet, reason in unavailable.items():
+            self.log(f"警告: {sheet}监视不可用：{reason}", level="WARNING")
+
+        def count(sheet, unit):
+            return f"{len(monitors[sheet])} {unit}" if sheet in monitors else "不可用"
+
+        self.log(f"电压监测完成: {name}，异常及预警节点 {len(anomalies_df)} 个，过载支路 {count(SHEET_OVERLOADS, '条')}，"
+                 f"无功到限发电机 {count(SHEET_Q_LIMITS, '台')}，可在侧栏载入结果")
+        result['monitors'] = {'key': monitor_key, 'settings': settings, 'sheets': monitors, 'unavailable': unavailable}
+        return result
+
+    def load_voltage_result(self, result):
+        st.session_state.voltage_levels = result['levels']
+        all_nodes_df = result['all_nodes']
+        if all_nodes_df.empty:
+            self.log("电压监测完成：未检测到节点数据")
+            self.data.set('voltage_anomalies', None)
+            self.data.set('all_nodes', None)
+            return False
+
+        self.data.set('voltage_anomalies', result['anomalies'])
+        self.data.set('all_nodes', all_nodes_df)
+        self.data.set('pfo_monitors', result['monitors'])
+        st.session_state.pfo_result_key = result['result_key']
+        history = self.data.setdefault('pfo_history', PFOHistory)
+        if history.add(result['name'], all_nodes_df, key=result['result_key']):
+            self.log(f"已记录第 {len(history)} 轮潮流结果: {result['name']}")
+            self.data.set('pfo_history', history)
+        return True
+
+    def show_flow_monitors(self, monitors):
+        # 支路过载、发电机无功到限与分区无功平衡，设置见“潮流监视设置”（按执行监测时的取值计算）；
+        # PFO 中没有识别到相应明细行的监视项显示为不可用
+        if monitors is None:
+            return
+        settings, sheets, unavailable = monitors['settings'], monitors['sheets'], monitors['unavailable']
+        st.subheader("潮流监视")
+        overloads = sheets.get(SHEET_OVERLOADS)
+        if overloads is None:
+            st.warning(f"支路过载监视不可用：{unavailable[SHEET_OVERLOADS]}")
+        elif not overloads.empty:
+            top = overloads.head(500)
+            st.write(f"检测到 **{len(overloads)}** 条支路负载率不低于 {settings['overload_percent']:g}%"
+                     + (f"（按负载率显示前 {len(top)} 条）" if len(top) < len(overloads) else ""))
+            st.dataframe(top, use_container_width=True, hide_index=True)
+        else:
+            st.info(f"未检测到负载率不低于 {settings['overload_percent']:g}% 的支路")
+        q_limits = sheets.get(SHEET_Q_LIMITS)
+        if q_limits is None:
+            st.warning(f"发电机无功到限监视不可用：{unavailable[SHEET_Q_LIMITS]}")
+        elif not q_limits.empty:
+            st.write(f"检测到 **{len(q_limits)}** 台发电机无功出力到达上 / 下限（容差 {settings['q_limit_tolerance']:g} MVar）")
+            st.dataframe(q_limits, use_container_width=True, hide_index=True)
+        else:
+            st.info("未检测到无功出力到限的发电机")
+        if SHEET_Q_BALANCE not in sheets:
+            st.warning(f"分区无功平衡不可用：{unavailable[SHEET_Q_BALANCE]}")
+            return
+        st.write("分区无功平衡 (MVar)：差额 = 发电 + 并联 − 负荷 − 外送，为区内支路无功损耗与充电功率等的净值；"
+                 "未识别到发电机或支路行时，发电无功 / 外送无功及差额留空")
+        st.dataframe(sheets[SHEET_Q_BALANCE], use_container_width=True, hide_index=True)
+
+    def show_pfo_export(self, all_nodes_df, anomalies_df, filename_report, filename_all):
+        # 导出文件仅在点击“生成导出文件”后生成，结果按 (监测结果, 格式, 内容) 缓存
+        st.subheader("导出")
+        contents = {
+            'report': f"异常报告（异常 / 预警高压 / 未安排无功 / 分区 / 所有者{' / 潮流监视' if FLOW_MONITORS else ''}，多工作表）",
+            'all': "完整节点数据",
+            'report_all': "异常报告 + 完整节点数据（单个文件）",
+        }
+        formats = available_formats()
+        col1, col2 = st.columns(2)
+        with col1:
+            content = st.radio("导出内容", list(contents), format_func=contents.get, key="pfo_export_content")
+        with col2:
+            fmt = st.selectbox("导出格式", formats, format_func=lambda f: EXPORT_FORMATS[f]['label'], key="pfo_export_format")
+            if fmt != 'xlsx' and content != 'all':
+                st.caption("多个表以 zip 打包，每个表一个文件")
+
+        monitors = self.data.get('pfo_monitors')
+        export_key = content_key('pfo-export', st.session_state.pfo_result_key, monitors and monitors['key'], fmt, content)
+        if st.button("生成导出文件", key="pfo_export_build"):
+            if content == 'all':
+                sheets = {'全部节点': all_nodes_df}
+            else:
+                sheets = voltage_report_sheets(all_nodes_df, anomalies_df, include_all=(content == 'report_all'))
+                if monitors is not None:
+                    sheets.update(monitors['sheets'])
+            try:
+                data, ext, mime = results_cache.get_or_create(export_key, lambda: export_tables(sheets, fmt))
+            except Exception as e:
+                st.error(f"导出失败: {e}")
+                self.log(f"错误: 导出失败: {e}", level="ERROR")
+                return
+            stem = os.path.splitext(filename_all if content == 'all' else filename_report)[0] or 'voltage_report'
+            self.data.set('pfo_export', {'key': export_key, 'data': data, 'name': stem + ext, 'mime': mime})
+            self.log(f"导出文件已生成: {stem + ext}（{len(data) / 1024:.0f} KB）")
+
+        export = self.data.get('pfo_export')
+        if export is not None and export['key'] == export_key:
+            st.download_button(
+                label=f"下载 {export['name']}",
+                data=export['data'],
+                file_name=export['name'],
+                mime=export['mime'],
+                key="pfo_download_export"
+            )
+
+    def show_iteration_history(self):
+        # 多轮迭代对比：每次执行电压监测的结果按轮次记录，任选两轮按母线对比电压与异常变化
+        history = self.data.setdefault('pfo_history', PFOHistory)
+        if len(history) < 2:
+            return
+        st.subheader("迭代对比")
+        st.dataframe(history.summary(), use_container_width=True, hide_index=True)
+
+        options = list(range(len(history)))
+        labels = history.labels()
+        col1, col2 = st.columns(2)
+        with col1:
+            before = st.selectbox("对比轮次（前）", options, index=len(history) - 2,
+                                  format_func=lambda i: f"第 {i + 1} 轮: {labels[i]}", key="pfo_history_before")
+        with col2:
+            after = st.selectbox("对比轮次（后）", options, index=len(history) - 1,
+                                 format_func=lambda i: f"第 {i + 1} 轮: {labels[i]}", key="pfo_history_after")
+        if before == after:
+            st.info("请选择两个不同的轮次进行对比")
+            return
+
+        diff_df = history.diff(before, after)
+        resolved = diff_df[diff_df['变化'] == CHANGE_RESOLVED]
+        introduced = diff_df[diff_df['变化'] == CHANGE_INTRODUCED]
+        common = diff_df['电压变化 (kV)'].notnull()
+        unallocated_delta = diff_df['未安排无功变化'].sum()
+        st.write(f"共同母线 **{int(common.sum())}** 条，异常已消除 **{len(resolved)}** 条，新增异常 **{len(introduced)}** 条，"
+                 f"未安排无功合计变化 **{unallocated_delta:.2f}** MVar")
+
+        show_cols = ['BusName', 'RatedVoltage', 'ActualVoltage_前', 'ActualVoltage_后', '电压变化 (kV)',
+                     '状态_前', '状态_后', 'Dist', 'Owner', '未安排无功变化']
+        if not resolved.empty:
+            st.write("异常已消除的节点")
+            st.dataframe(resolved[show_cols], use_container_width=True, hide_index=True)
+        if not introduced.empty:
+            st.write("新增异常的节点")
+            st.dataframe(introduced[show_cols], use_container_width=True, hide_index=True)
+        changed = diff_df[common & (diff_df['电压变化 (kV)'] != 0)]
+        top = changed.loc[changed['电压变化 (kV)'].abs().nlargest(500).index]
+        st.write(f"电压变化的节点（共 {len(changed)} 条，按变化幅度显示前 {len(top)} 条）")
+        st.dataframe(top[show_cols + ['变化']], use_container_width=True, hide_index=True)
+        # 所选母线在全部轮次中的电压走势，可选项为上表中变化最大的母线
+        trend_options = top['BusName'].drop_duplicates().tolist()
+        if trend_options:
+            picked = st.multiselect("各轮次电压走势", trend_options, default=trend_options[:5], key="pfo_history_trend")
+            if picked:
+                st.line_chart(history.trend(picked), x_label="轮次", y_label="实际电压 (kV)")
+
+        st.download_button(
+            label="下载对比结果 (CSV)",
+            data=diff_df.to_csv(index=False).encode('utf-8-sig'),
+            file_name=f"pfo_diff_{before + 1}_{after + 1}.csv",
+            mime="text/csv",
+            key="pfo_history_download"
+        )
+        if st.button("清空迭代记录", key="pfo_history_clear"):
+            history.clear()
+            self.log("已清空迭代记录")
+            st.rerun()
+
+    def show_jobs_panel(self):
+        # 侧栏任务列表：有排队 / 运行中的任务时按 JOB_POLL_SECONDS 只刷新该片段，不重新运行整个脚本
+        if not len(self.jobs):
+            return
+        polling = bool(self.jobs.active())
+        with st.sidebar:
+            st.fragment(self.render_jobs, run_every=JOB_POLL_SECONDS if polling else None)(polling)
+
+    def render_jobs(self, polling):
+        jobs = self.jobs
+        if polling and not jobs.active():
+            # 全部任务已结束：整体重新运行一次，停止轮询并刷新各标签页
+            st.rerun()
+        st.subheader("后台任务")
+        for job in list(jobs.jobs):
+            with st.container(border=True):
+                st.markdown(f"**{job.label}**")
+                if job.status == STATUS_QUEUED:
+                    st.caption(job.status)
+                elif not job.is_finished:
+                    count = f"（{job.done:,} / {job.total:,}）" if job.total else ""
+                    st.progress(job.fraction or 0.0, text=f"{job.phase}{count}")
+                else:
+                    st.caption(f"{job.status}，用时 {job.seconds:.1f} s")
+                if not job.is_finished:
+                    if st.button("取消", key=f"job_cancel_{job.id}", disabled=job.cancel_requested):
+                        job.cancel()
+                        self.log(f"取消后台任务: {job.label}")
+                        st.rerun(scope="fragment")
+                    continue
+                if job.status == STATUS_FAILED:
+                    st.error(job.error)
+                elif job.status == STATUS_DONE and job.kind == 'dat':
+                    st.download_button(
+                        label=f"下载 {job.result['file_name']}",
+                        data=job.result['data'],
+                        file_name=job.result['file_name'],
+                        mime="application/octet-stream",
+                        key=f"job_download_{job.id}"
+                    )
+                elif job.status == STATUS_DONE and job.kind == 'pfo':
+                    if job.result['all_nodes'].empty:
+                        st.caption("未检测到任何节点数据")
+                    elif st.button("载入结果", key=f"job_load_{job.id}", type="primary"):
+                        self.load_voltage_result(job.result)
+                        st.rerun()
+                if st.button("移除", key=f"job_remove_{job.id}"):
+                    jobs.remove(job.id)
+                    st.rerun(scope="fragment")
+        if len(jobs.active()) < len(jobs):
+            if st.button("清除已结束的任务", key="jobs_clear"):
+                jobs.clear_finished()
+                st.rerun()
+
+    def show_profile_panel(self):
+        profiler = st.session_state.profiler
+        with st.expander("性能分析"):
+            st.markdown("各处理阶段（上传读取、解析、筛选修改、写回、PFO 解析、电压分类、导出等）的耗时、内存峰值与处理数量。"
+                        "命中缓存的阶段不会重新执行，也不会产生记录。")
+            profiler.trace_memory = st.checkbox("统计内存峰值（tracemalloc，会使处理变慢）", value=profiler.trace_memory,
+                                                key="profile_trace_memory")
+            if not len(profiler):
+                st.info("暂无记录")
+                return
+            st.write("按阶段汇总")
+            st.dataframe(profiler.summary(), use_container_width=True, hide_index=True)
+            st.write(f"明细（最近 {len(profiler)} 条）")
+            st.dataframe(profiler.to_frame().iloc[::-1], use_container_width=True, hide_index=True)
+            col1, col2 = st.columns(2)
+            with col1:
                 st.download_button(
-                    label="下载完整节点数据",
-                    data=output_buffer_all,
-                    file_name=output_filename_all,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="pfo_download_all"
+                    label="导出性能记录 (JSON)",
+                    data=profiler.to_json().encode('utf-8'),
+                    file_name=f"bpa_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json",
+                    key="profile_download"
                 )
-                self.log(f"电压监测完成，完整节点数据准备下载: {output_filename_all}")
+            with col2:
+                if st.button("清空性能记录", key="profile_clear"):
+                    profiler.clear()
+                    st.rerun()
+
+    def show_memory_panel(self):
+        # 本会话各项数据的内存 / 落盘情况，以及进程内全部会话的占用（不含会话内容）
+        with st.expander("内存占用"):
+            data = self.data
+            budget = f"{data.max_bytes / 1024 / 1024:g} MB" if data.max_bytes else "不限"
+            st.markdown(f"本会话内存占用 **{data.nbytes / 1024 / 1024:.1f} MB**（预算 {budget}），"
+                        f"已落盘 {data.spilled_bytes / 1024 / 1024:.1f} MB；超出预算时最久未使用的数据写入磁盘，下次使用时自动加载。"
+                        f"共享解析缓存 {results_cache.nbytes / 1024 / 1024:.1f} MB。")
+            st.dataframe(data.entries(), use_container_width=True, hide_index=True)
+            sessions_df = process_summary()
+            st.write(f"本进程共 {len(sessions_df)} 个会话，合计 {sessions_df['memory_mb'].sum():.1f} MB，"
+                     f"落盘 {sessions_df['spilled_mb'].sum():.1f} MB")
+            st.dataframe(sessions_df, use_container_width=True, hide_index=True)
 
     def create_about_tab(self):
         st.markdown("""
@@ -569,6 +1083,7 @@ class DATModifierApp:
         - **电压异常监测**：分析 `.pfo` 文件，检测 500 kV 和 220 kV 节点的电压异常（低压、高压、预警高压）及未安排无功。
         - **并联无功调整**：修改 `.dat` 文件中的 B 卡并联无功 (shunt_var)，支持按分区、所有者和电压等级筛选。
         - **数据导出**：生成电压异常和完整节点数据的 Excel 报告，包含未安排无功信息。
+        - **L/T卡生成**：由参数表批量生成线路 (L)、双绕组 (T2) 和三绕组 (T3) 变压器卡片，可直接插入已有 `.dat` 文件。
 
         ### 使用方法
         1. **确认有功收敛**：
@@ -581,10 +1096,11 @@ class DATModifierApp:
         3. **调整 shunt_var**：
            - 在“B卡并联无功修改 / B Card Shunt Reactive Power Modification”标签上传 `.dat` 文件。
            - 输入筛选条件（dist、owner、vol_rank），设置 shunt_var 修改（设值或乘系数）。
+           - 或使用“按电压监测结果生成调整方案”，按上述方向逐卡计算异常母线对应 B卡的 shunt_var 调整量，一步生成修改后的 `.dat` 文件。
            - 下载修改后的 `.dat` 文件。
         4. **验证与迭代**：
            - 使用修改后的 `.dat` 文件运行 BPA 潮流计算，生成新的 `.pfo` 文件。
-           - 重复电压监测，检查异常和未安排无功是否减少，必要时迭代调整。
+           - 重复电压监测，检查异常和未安排无功是否减少，必要时迭代调整；同一会话内各轮结果会自动记录，可在“迭代对比”中逐母线查看电压变化及异常消除/新增情况。
         5. **分布分析**：
            - 查看异常及未安排无功的 Dist 和 Owner 分布，优化调整策略。
 
@@ -627,21 +1143,37 @@ class DATModifierApp:
                - 查看“异常及预警分布”中的Dist和Owner统计，确定问题集中的区域，优化后续调整。
         """)
 
+        if snapshot_store is not None:
+            st.caption(f"已启用解析快照（BPA_SNAPSHOT_DIR={snapshot_store.directory}）：上传的 .dat 文件解析结果会保存在服务器磁盘上，用于再次上传时快速加载。")
+
         tabs = st.tabs([
             "B卡并联无功修改 / B Card Shunt Reactive Power Modification",
             "电压监测 / Voltage Monitoring",
+            "L/T卡生成 / L & T Card Generation",
             "关于 / About"
         ])
-        with tabs[0]:
-            self.create_b_shunt_var_tab()
-        with tabs[1]:
-            self.create_voltage_monitoring_tab()
-        with tabs[2]:
-            self.create_about_tab()
+        # 本次脚本运行中各处理阶段的耗时 / 内存写入会话的 Profiler；运行结束后按会话与进程内存预算淘汰。
+        # active() 只标记运行中、不持有会话锁，修改记录等共享状态在各自读改写处另取会话锁
+        with self.data.active(), recording(st.session_state.profiler):
+            with tabs[0]:
+                self.create_b_shunt_var_tab()
+            with tabs[1]:
+                self.create_voltage_monitoring_tab()
+            with tabs[2]:
+                self.create_card_generation_tab()
+            with tabs[3]:
+                self.create_about_tab()
+        enforce_process_budget()
+
+        self.show_jobs_panel()
+        self.show_profile_panel()
+        self.show_memory_panel()
 
         with st.expander("查看日志"):
-            st.markdown("**日志说明**: 显示所有操作记录，包括文件上传、修改和监测结果。")
-            st.text_area("操作日志 (可滚动查看，不可编辑)", value="\n".join(st.session_state.logs), height=200, key="log_output_main")
+            st.markdown(f"**日志说明**: 显示最近 {self.logs.records.maxlen} 条操作记录，包括文件上传、修改和监测结果。")
+            levels = [level for level in LOG_LEVELS if level != "UPLOAD"]
+            self.logs.level = st.selectbox("日志级别", levels, index=levels.index(self.logs.level) if self.logs.level in levels else 1, key="log_level")
+            st.text_area("操作日志 (可滚动查看，不可编辑)", value=self.logs.text(), height=200, key="log_output_main")
 
 if __name__ == "__main__":
     app = DATModifierApp()
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import sys
+
+import bpa_loader
+from bpa_dat import apply_b_modifications, parse_dat
+from bpa_export import export_tables
+from bpa_monitor import run_monitors
+from bpa_pfo import check_voltage_anomalies, columns_equal, extract_pfo, parse_pfo_data
+from bpa_profile import Profiler, compare, load_records
+from bpa_synth import synth_dat, synth_pfo
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+_BENCH_MODIFICATIONS = {'shunt_var': {'apply': True, 'method': 'mul', 'value': '1.2'}}
+
+
+def _bench_chunk_bytes(content: bytes, workers: int) -> int:
+    return len(content) // (max(workers or os.cpu_count() or 1, 1) * 4) + 1
+
+
+def bench_size(size: int, card_cls=None, excel_limit: int = 200000, seed: int = 0, trace_memory: bool = True,
+               pfo_workers: int = 1, flow_monitors: bool = False) -> list:
+    # 与界面 / 批处理使用同一套阶段记录（bpa_profile），库内部的子阶段（split_lines、decode、export 等）一并记录
+    timer = Profiler(trace_memory=trace_memory, max_records=10000, labels={'size': size})
+    dat = timer.run('synth_dat', synth_dat, size, seed, counts={'items': len})
+    case = timer.run('read_and_parse_dat', parse_dat, dat, card_cls, counts={'items': lambda c: len(c.table)})
+    summary = timer.run('modify_b_cards', apply_b_modifications, case, 'C1,D1', '苏,锡', '37',
+                        _BENCH_MODIFICATIONS, counts={'items': lambda s: s['changed'].get('shunt_var', 0)})
+    if card_cls is not None:
+        timer.run('write_back_dat', case.to_bytes, counts={'items': lambda _: len(case.dirty)})
+    del dat, case, summary
+
+    pfo = timer.run('synth_pfo', synth_pfo, size, seed, counts={'items': len})
+    columns = timer.run('parse_pfo_data', parse_pfo_data, pfo, counts={'items': lambda c: len(c['BusName'])})
+    if pfo_workers != 1:
+        # 分块并行解析，同时核对与单进程解析的结果逐列一致；基准算例通常小于 MIN_CHUNK_BYTES，
+        # 按每个进程约 4 块显式指定块大小，保证确实切分
+        timer.run('parse_pfo_parallel', parse_pfo_data, pfo, workers=pfo_workers,
+                  chunk_bytes=_bench_chunk_bytes(pfo, pfo_workers),
+                  counts={'items': lambda c: len(c['BusName']), 'equal': lambda c: columns_equal(columns, c)})
+    if flow_monitors:
+        # 试验功能：母线、支路、发电机一次提取，与仅解析母线的 parse_pfo_data 对比额外开销
+        tables = timer.run('extract_pfo', extract_pfo, pfo, workers=pfo_workers,
+                           counts={'items': lambda t: len(t['branches']['FromBus']) + len(t['generators']['BusName'])})
+        timer.run('run_monitors', run_monitors, tables, counts={'items': lambda m: sum(len(df) for df in m.values())})
+        del tables
+    del pfo
+    all_nodes_df, anomalies_df = timer.run('check_voltage_anomalies', check_voltage_anomalies, columns,
+                                           counts={'items': lambda r: len(r[1])})
+    timer.run('export_anomalies_xlsx', export_tables, {'anomalies': anomalies_df}, 'xlsx', counts={'items': len(anomalies_df)})
+    if len(all_nodes_df) <= excel_limit:
+        timer.run('export_all_nodes_xlsx', export_tables, {'all_nodes': all_nodes_df}, 'xlsx',
+                  counts={'items': len(all_nodes_df)})
+    return timer.records
+
+
+def _load_card_cls(model_path: str):
+    if not os.environ.get('BPA_MODEL_KEY') or not os.path.exists(model_path):
+        return None
+    return bpa_loader.load_encrypted_module(model_path).BCard
+
+
+def format_results(results: list) -> str:
+    header = f"{'size':>8}  {'stage':<26}{'seconds':>10}{'peak MB':>10}{'items':>10}"
+    rows = [header, '-' * len(header)]
+    for r in results:
+        items = '' if r.get('items') is None else r['items']
+        peak = '' if r['peak_mb'] is None else f"{r['peak_mb']:.2f}"
+        rows.append(f"{r['size']:>8}  {r['stage']:<26}{r['seconds']:>10.4f}{peak:>10}{items:>10}")
+    return "\n".join(rows)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="BPA 无功优化各阶段性能基准")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="母线规模，逗号分隔，如 1000,10000,100000,500000")
+    parser.add_argument('--model', default=bpa_loader.DEFAULT_MODEL_PATH,
+                        help="BPA_models.encrypted 路径；未设置 BPA_MODEL_KEY 时跳过 write_back_dat")
+    parser.add_argument('--excel-limit', type=int, default=200000, help="超过该节点数时跳过完整节点 Excel 导出")
+    parser.add_argument('--no-memory', action='store_true', help="不统计内存峰值（避免 tracemalloc 带来的额外开销）")
+    parser.add_argument('--json', help="将结果另存为 JSON 文件")
+    parser.add_argument('--compare', help="与之前保存的结果（--json 输出或 CLI --profile 记录）按阶段对比耗时")
+    parser.add_argument('--write-samples', help="将生成的 DAT/PFO 样例写入该目录")
+    parser.add_argument('--pfo-workers', type=int, default=1,
+                        help="另测分块并行解析 PFO 的耗时并核对结果一致（进程数，0 为 CPU 核数）")
+    parser.add_argument('--flow-monitors', action='store_true', help="另测试验性的支路 / 发电机提取与潮流监视")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    card_cls = _load_card_cls(args.model)
+    if card_cls is None:
+        print("未加载 BCard（缺少 BPA_MODEL_KEY 或模型文件），跳过 write_back_dat 阶段", file=sys.stderr)
+
+    if args.write_samples:
+        os.makedirs(args.write_samples, exist_ok=True)
+        for size in sizes:
+            with open(os.path.join(args.write_samples, f"synth_{size}.dat"), 'wb') as f:
+                f.write(synth_dat(size))
+            with open(os.path.join(args.write_samples, f"synth_{size}.pfo"), 'wb') as f:
+                f.write(synth_pfo(size))
+
+    results = []
+    for size in sizes:
+        results.extend(bench_size(size, card_cls, args.excel_limit, trace_memory=not args.no_memory,
+                                  pfo_workers=args.pfo_workers, flow_monitors=args.flow_monitors))
+        print(format_results([r for r in results if r['size'] == size]))
+        print()
+    mismatched = [r['size'] for r in results if r['stage'] == 'parse_pfo_parallel' and not r['equal']]
+    if mismatched:
+        print(f"分块并行解析结果与单进程解析不一致: size {mismatched}", file=sys.stderr)
+        return 1
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        baseline = load_records(args.compare)
+        by = ['size'] if all('size' in r for r in baseline) else []
+        print(compare(baseline, results, by=by).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
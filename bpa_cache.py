@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_ITEMS = 64
+DEFAULT_MAX_BYTES = int(os.environ.get('BPA_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+
+def content_key(*parts) -> str:
+    # 按内容生成缓存键：bytes 直接参与哈希，其余参数取 repr
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(b'b')
+            h.update(len(part).to_bytes(8, 'little'))
+            h.update(part)
+        else:
+            text = repr(part).encode('utf-8')
+            h.update(b'r')
+            h.update(len(text).to_bytes(8, 'little'))
+            h.update(text)
+    return h.hexdigest()
+
+
+def estimate_size(obj) -> int:
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(sys.getsizeof(v) for v in obj.ravel())
+        return obj.nbytes
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, dict):
+        return sum(estimate_size(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_size(v) for v in obj)
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+class LRUCache:
+    # 线程安全的 LRU 缓存，按条目数与估算字节数双重限额淘汰最久未使用的条目
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key][0]
+
+    def put(self, key, value, size: int = None):
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._data[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def get_or_create(self, key, factory, size: int = None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+        value = factory()
+        if value is None:
+            return value
+        return self.put(key, value, size)
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_items or self._bytes > self.max_bytes):
+            _, (_, size) = self._data.popitem(last=False)
+            self._bytes -= size
+
+
+# 进程级共享缓存：已解析的算例、监测结果与导出文件，键中包含上传内容的哈希
+results_cache = LRUCache()
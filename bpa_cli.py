@@ -0,0 +1,431 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import bpa_loader
+from bpa_cache import content_key
+from bpa_dat import parse_dat
+from bpa_export import EXPORT_FORMATS, export_path, voltage_report_sheets
+from bpa_generate import CARD_KINDS, DEFAULT_CHUNK_SIZE, splice_cards, write_cards
+from bpa_logging import format_log
+from bpa_monitor import DEFAULT_MONITOR_SETTINGS, SHEET_OVERLOADS, SHEET_Q_LIMITS, run_monitors, unavailable_monitors
+from bpa_profile import Profiler, jsonl_hook, recording, stage
+from bpa_rules import MODE_SEQUENTIAL, RULE_MODES, apply_rules, normalize_rules
+from bpa_snapshot import SnapshotStore
+from bpa_pfo import (
+    DEFAULT_VOLTAGE_LEVELS, STATUS_ALERT, STATUS_HIGH, STATUS_LOW,
+    check_voltage_anomalies, columns_equal, extract_pfo, normalize_voltage_levels, parse_pfo_data, tables_equal
+)
+
+_DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), bpa_loader.DEFAULT_MODEL_PATH)
+
+# 工作进程内加载的 BCard
+_card_cls = None
+
+
+def collect_inputs(patterns: list, suffix: str) -> list:
+    # 目录取其中所有指定后缀的文件，其余参数按通配符或文件路径处理
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.extend(os.path.join(pattern, name) for name in os.listdir(pattern)
+                         if name.lower().endswith(suffix))
+        elif glob.has_magic(pattern):
+            paths.extend(glob.glob(pattern, recursive=True))
+        elif os.path.isfile(pattern):
+            paths.append(pattern)
+        else:
+            raise FileNotFoundError(f"找不到输入文件: {pattern}")
+    return sorted({os.path.abspath(p) for p in paths if os.path.isfile(p)})
+
+
+def read_table(path: str) -> pd.DataFrame:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xls'):
+        return pd.read_excel(path, dtype=str)
+    if ext == '.json':
+        return pd.read_json(path, dtype=False)
+    try:
+        return pd.read_csv(path, dtype=str, encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        return pd.read_csv(path, dtype=str, encoding='gbk')
+
+
+def load_rules(path: str) -> list:
+    return normalize_rules(read_table(path))
+
+
+def _output_paths(paths: list, out_dir: str, suffix: str = '') -> list:
+    # 输出文件名取输入文件名，不同目录下重名时加上上级目录名区分
+    names = [os.path.basename(p) for p in paths]
+    outputs = []
+    for path, name in zip(paths, names):
+        if names.count(name) > 1:
+            name = f"{os.path.basename(os.path.dirname(path))}_{name}"
+        stem, ext = os.path.splitext(name)
+        outputs.append(os.path.join(out_dir, f"{stem}{suffix}{ext}" if suffix else name))
+    return outputs
+
+
+def _init_dat_worker(model_path: str):
+    global _card_cls
+    _card_cls = bpa_loader.load_encrypted_module(model_path).BCard
+
+
+def _read_file(path: str) -> bytes:
+    with stage('upload_read', file=path) as record:
+        with open(path, 'rb') as f:
+            content = f.read()
+        record['bytes'] = len(content)
+    return content
+
+
+def _worker_profiler(path: str, profile) -> Profiler:
+    # profile: None 不记录，否则为是否统计内存峰值；记录随结果返回主进程汇总
+    return Profiler(trace_memory=bool(profile), labels={'file': path}) if profile is not None else None
+
+
+def _load_case(content: bytes, card_cls, snapshot_dir: str = None):
+    # 指定快照目录时先按内容哈希查找快照，未命中再解析并保存
+    store = SnapshotStore(snapshot_dir) if snapshot_dir else None
+    key = content_key('dat', content) if store is not None else None
+    case = store.load(key, card_cls) if store is not None else None
+    if case is None:
+        with stage('read_and_parse_dat', bytes=len(content)) as record:
+            case = parse_dat(content, card_cls)
+            record.update(lines=len(case.lines), b_cards=len(case.table))
+        if store is not None:
+            store.save(key, case)
+    return case
+
+
+def process_dat(path: str, output_path: str, rules: list, profile=None, snapshot_dir: str = None,
+                mode: str = MODE_SEQUENTIAL) -> dict:
+    messages = []
+    start = time.perf_counter()
+    result = {'file': path, 'output': output_path, 'rules': [], 'messages': messages, 'error': None}
+    profiler = _worker_profiler(path, profile)
+    try:
+        with recording(profiler):
+            case = _load_case(_read_file(path), _card_cls, snapshot_dir)
+            result['b_cards'] = len(case.table)
+
+            def log(msg, level="INFO"):
+                messages.append(format_log(msg, level))
+
+            with stage('apply_rules', rules=len(rules), b_cards=len(case.table)) as record:
+                report = apply_rules(case, rules, mode, log=log)
+                record.update(matched=int(report['matched'].sum()), edits=len(case.dirty))
+            result['rules'] = report.to_dict('records')
+            result['edited_cards'] = len(case.dirty)
+            with stage('write_back_dat', lines=len(case.lines), edits=len(case.dirty)) as record:
+                data = case.to_bytes()
+                record['bytes'] = len(data)
+            with open(output_path, 'wb') as f:
+                f.write(data)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    result['profile'] = profiler.records if profiler is not None else []
+    return result
+
+
+def process_pfo(path: str, output_path: str, levels: pd.DataFrame, fmt: str = 'csv', profile=None,
+                parse_workers: int = 1, verify: bool = False, monitor_path: str = None, monitor_settings: dict = None) -> dict:
+    # monitor_settings 不为 None 时开启潮流监视（试验功能）：母线、支路与发电机一次提取，电压监测与潮流监视
+    # （过载支路、发电机无功到限、分区无功平衡）共用；xlsx 时潮流监视作为报告中的工作表，
+    # 其余格式另写到 monitor_path（多表打包为 zip）。未开启时只解析母线
+    start = time.perf_counter()
+    result = {'file': path, 'output': output_path, 'error': None, 'anomalies': None}
+    profiler = _worker_profiler(path, profile)
+    try:
+        with recording(profiler):
+            content = _read_file(path)
+            if monitor_settings is not None:
+                with stage('extract_pfo', bytes=len(content), workers=parse_workers) as record:
+                    tables = extract_pfo(content, workers=parse_workers)
+                    record.update(buses=len(tables['buses']['BusName']), branches=len(tables['branches']['FromBus']),
+                                  generators=len(tables['generators']['BusName']))
+                if verify:
+                    # 与单进程逐行解析的结果逐表逐列比对，用于确认分块并行解析没有改变结果
+                    with stage('verify_parse', bytes=len(content)):
+                        if not tables_equal(tables, extract_pfo(content)):
+                            raise ValueError("分块并行解析结果与单进程解析不一致")
+                columns = tables['buses']
+            else:
+                with stage('parse_pfo_data', bytes=len(content), workers=parse_workers) as record:
+                    columns = parse_pfo_data(content, workers=parse_workers)
+                    record['buses'] = len(columns['BusName'])
+                if verify:
+                    with stage('verify_parse', bytes=len(content)):
+                        if not columns_equal(columns, parse_pfo_data(content)):
+                            raise ValueError("分块并行解析结果与单进程解析不一致")
+            with stage('check_voltage_anomalies', buses=len(columns['BusName'])) as record:
+                all_nodes_df, anomalies_df = check_voltage_anomalies(columns, levels)
+                record['anomalies'] = len(anomalies_df)
+            monitors, unavailable = {}, {}
+            if monitor_settings is not None:
+                with stage('run_monitors', branches=len(tables['branches']['FromBus'])) as record:
+                    monitors = run_monitors(tables, monitor_settings)
+                    record['sheets'] = len(monitors)
+                # PFO 中没有识别到相应明细行的监视项记为不可用：结果为 None，报告中留空，而不是 0
+                unavailable = unavailable_monitors(tables)
+            if fmt == 'xlsx':
+                sheets = voltage_report_sheets(all_nodes_df, anomalies_df)
+                sheets.update(monitors)
+                result['output'] = export_path(output_path, sheets, fmt)
+            else:
+                result['output'] = export_path(output_path, anomalies_df, fmt)
+                if monitor_path and monitors:
+                    result['monitor_output'] = export_path(monitor_path, monitors, fmt)
+        status = all_nodes_df['状态'] if not all_nodes_df.empty else pd.Series(dtype=str)
+        unallocated = all_nodes_df['UnallocatedReactivePower'] if not all_nodes_df.empty else pd.Series(dtype=float)
+        result.update({
+            'buses': len(all_nodes_df),
+            'low': int((status == STATUS_LOW).sum()),
+            'high': int((status == STATUS_HIGH).sum()),
+            'alert': int((status == STATUS_ALERT).sum()),
+            'unallocated_buses': int(unallocated.notnull().sum()),
+            'unallocated_total': float(unallocated.sum()),
+        })
+        if monitor_settings is not None:
+            result.update({
+                'branches': len(tables['branches']['FromBus']),
+                'generators': len(tables['generators']['BusName']),
+                'overloads': len(monitors[SHEET_OVERLOADS]) if SHEET_OVERLOADS in monitors else None,
+                'q_limits': len(monitors[SHEET_Q_LIMITS]) if SHEET_Q_LIMITS in monitors else None,
+                'unavailable': '；'.join(f"{sheet}: {reason}" for sheet, reason in unavailable.items()),
+            })
+        result['anomalies'] = anomalies_df
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    result['profile'] = profiler.records if profiler is not None else []
+    return result
+
+
+def run_jobs(func, jobs: list, workers: int, initializer=None, initargs=()) -> list:
+    # workers 为 1 时在当前进程内顺序执行，否则分发到进程池，结果按输入顺序返回
+    if workers <= 1 or len(jobs) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        futures = [pool.submit(func, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def _profile_option(args):
+    # 未指定 --profile 时为 None（不记录），否则为是否统计内存峰值
+    return bool(args.profile_memory) if args.profile else None
+
+
+def _write_profile(args, results: list):
+    # 各文件的阶段记录追加写入 JSON Lines，便于汇总多次运行后用 bpa_bench --compare 对比
+    if not args.profile:
+        return
+    write = jsonl_hook(args.profile)
+    count = 0
+    for result in results:
+        for record in result.get('profile', []):
+            write({'command': args.command, **record})
+            count += 1
+    print(f"性能记录: {args.profile}（{count} 条）")
+
+
+def _write_report(rows: list, out_dir: str, name: str) -> str:
+    path = os.path.join(out_dir, name)
+    pd.DataFrame(rows).to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def run_dat(args) -> int:
+    paths = collect_inputs(args.inputs, '.dat')
+    rules = load_rules(args.rules)
+    _init_dat_worker(args.model)
+    os.makedirs(args.out_dir, exist_ok=True)
+    outputs = _output_paths(paths, args.out_dir)
+    for path, output in zip(paths, outputs):
+        if os.path.abspath(output) == path:
+            raise ValueError(f"输出文件会覆盖输入文件: {path}，请指定其他输出目录")
+
+    print(f"处理 {len(paths)} 个 DAT 文件，{len(rules)} 条规则，{args.workers} 个进程")
+    profile = _profile_option(args)
+    jobs = [(p, o, rules, profile, args.snapshot_dir, args.mode) for p, o in zip(paths, outputs)]
+    results = run_jobs(process_dat, jobs, args.workers,
+                       _init_dat_worker, (args.model,))
+    _write_profile(args, results)
+
+    rows = []
+    for result in results:
+        if args.verbose:
+            print("\n".join(result['messages']))
+        if result['error']:
+            print(f"[ERROR] {result['file']}: {result['error']}")
+            rows.append({'File': result['file'], 'Error': result['error']})
+            continue
+        print(f"[OK] {result['file']} -> {result['output']}: 修改 B卡 {result['edited_cards']} 张，耗时 {result['seconds']:.2f}s")
+        for rule in result['rules']:
+            rows.append({
+                'File': result['file'], 'Output': result['output'], 'Rule': rule['rule'], 'Order': rule['order'],
+                'Dist': rule['dist'], 'Owner': rule['owner'], 'VolRank': rule['vol_rank'],
+                'Param': rule['param'], 'Method': rule['method'], 'Value': rule['value'],
+                'Matched': rule['matched'], 'Changed': rule['changed'], 'Invalid': rule['invalid'],
+                'RuleError': rule['error'], 'EditedCards': result['edited_cards'], 'Seconds': round(result['seconds'], 3),
+            })
+    print(f"汇总报告: {_write_report(rows, args.out_dir, 'dat_batch_report.csv')}")
+    return 1 if any(r['error'] for r in results) else 0
+
+
+def _count(value) -> str:
+    return '不可用' if value is None else str(value)
+
+
+def run_pfo(args) -> int:
+    paths = collect_inputs(args.inputs, '.pfo')
+    levels = normalize_voltage_levels(read_table(args.levels)) if args.levels else DEFAULT_VOLTAGE_LEVELS
+    os.makedirs(args.out_dir, exist_ok=True)
+    outputs = [os.path.splitext(o)[0] for o in _output_paths(paths, args.out_dir, '_anomalies')]
+    monitor_outputs = [os.path.splitext(o)[0] for o in _output_paths(paths, args.out_dir, '_monitors')]
+    monitor_settings = None
+    if args.flow_monitors:
+        monitor_settings = {'overload_percent': args.overload, 'q_limit_tolerance': args.q_tolerance}
+
+    print(f"处理 {len(paths)} 个 PFO 文件，{args.workers} 个进程")
+    profile = _profile_option(args)
+    jobs = [(p, o, levels, args.format, profile, args.parse_workers, args.verify_parse, m, monitor_settings)
+            for p, o, m in zip(paths, outputs, monitor_outputs)]
+    results = run_jobs(process_pfo, jobs, args.workers)
+    _write_profile(args, results)
+
+    rows, anomalies = [], []
+    for result in results:
+        if result['error']:
+            print(f"[ERROR] {result['file']}: {result['error']}")
+            rows.append({'File': result['file'], 'Error': result['error']})
+            continue
+        flow = (f"过载支路 {_count(result['overloads'])}，无功到限发电机 {_count(result['q_limits'])}，"
+                if args.flow_monitors else "")
+        print(f"[OK] {result['file']}: 母线 {result['buses']}，低压 {result['low']}，高压 {result['high']}，"
+              f"预警高压 {result['alert']}，未安排无功 {result['unallocated_buses']}，{flow}耗时 {result['seconds']:.2f}s")
+        row = {
+            'File': result['file'], 'Buses': result['buses'], '低压': result['low'], '高压': result['high'],
+            '预警高压': result['alert'], '未安排无功节点': result['unallocated_buses'],
+            '未安排无功合计': result['unallocated_total'],
+        }
+        if args.flow_monitors:
+            if result['unavailable']:
+                print(f"[WARN] {result['file']}: 潮流监视不可用 - {result['unavailable']}")
+            row.update({'Branches': result['branches'], 'Generators': result['generators'],
+                        '过载支路': result['overloads'], '无功到限发电机': result['q_limits'],
+                        '不可用监视': result['unavailable']})
+        rows.append({**row, 'Seconds': round(result['seconds'], 3)})
+        if not result['anomalies'].empty:
+            anomalies.append(result['anomalies'].assign(File=result['file']))
+    print(f"汇总报告: {_write_report(rows, args.out_dir, 'pfo_batch_report.csv')}")
+    if anomalies:
+        combined = pd.concat(anomalies, ignore_index=True)
+        combined = combined[['File'] + [c for c in combined.columns if c != 'File']]
+        path = export_path(os.path.join(args.out_dir, 'pfo_batch_anomalies'), combined, args.format)
+        print(f"异常汇总: {path}")
+    return 1 if any(r['error'] for r in results) else 0
+
+
+def run_gen(args) -> int:
+    # 由参数表生成 L / T2 / T3 卡，流式写入输出文件；指定 --dat 时插入到该算例的 (END) 之前
+    out_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    profiler = _worker_profiler(args.sheet, _profile_option(args))
+    with recording(profiler), open(args.output, 'wb') as out:
+        if args.dat:
+            if os.path.abspath(args.dat) == os.path.abspath(args.output):
+                raise ValueError(f"输出文件会覆盖输入文件: {args.dat}，请指定其他输出文件")
+            case = _load_case(_read_file(args.dat), None, args.snapshot_dir)
+            with stage('generate_cards', kind=args.kind) as record:
+                summary = splice_cards(case, args.sheet, args.kind, out, check_buses=not args.no_bus_check,
+                                       chunksize=args.chunk_size)
+                record.update(cards=summary['cards'], errors=len(summary['errors']))
+        else:
+            with stage('generate_cards', kind=args.kind) as record:
+                summary = write_cards(args.sheet, args.kind, out, chunksize=args.chunk_size)
+                record.update(cards=summary['cards'], errors=len(summary['errors']))
+    _write_profile(args, [{'profile': profiler.records if profiler is not None else []}])
+    errors = summary['errors']
+    print(f"[OK] {args.sheet} -> {args.output}: 生成 {args.kind} 卡 {summary['cards']} 张，"
+          f"错误 {len(errors)} 行，耗时 {time.perf_counter() - start:.2f}s")
+    if errors:
+        rows = [{'Row': row, 'Error': message} for row, message in sorted(errors)]
+        print(f"错误明细: {_write_report(rows, out_dir, 'gen_errors.csv')}")
+    return 1 if errors else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="BPA 潮流无功优化批处理工具")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    dat = sub.add_parser('dat', help="按规则批量修改 DAT 文件中的 B卡")
+    dat.add_argument('inputs', nargs='+', help=".dat 文件、目录或通配符")
+    dat.add_argument('--rules', required=True,
+                     help="规则文件 (CSV/Excel/JSON)，列: dist, owner, vol_rank, param（目前仅 shunt_var）, method, value，可选 order, enabled")
+    dat.add_argument('--model', default=_DEFAULT_MODEL_PATH, help="BPA_models.encrypted 路径，密钥取自 BPA_MODEL_KEY")
+    dat.add_argument('--verbose', action='store_true', help="输出每个文件的详细日志")
+    dat.add_argument('--mode', default=MODE_SEQUENTIAL, choices=list(RULE_MODES),
+                     help="sequential: 命中的规则按顺序依次作用；first: 每张卡只由顺序最靠前的命中规则修改")
+    dat.set_defaults(func=run_dat)
+
+    pfo = sub.add_parser('pfo', help="批量进行电压监测")
+    pfo.add_argument('inputs', nargs='+', help=".pfo 文件、目录或通配符")
+    pfo.add_argument('--levels', help="电压等级阈值表 (CSV/Excel/JSON)，列: label, nominal, band, min, max, alert_min")
+    pfo.add_argument('--format', default='csv', choices=list(EXPORT_FORMATS),
+                     help="异常结果的输出格式；xlsx 时每个文件输出多工作表报告，parquet / feather 需安装 pyarrow")
+    pfo.add_argument('--parse-workers', type=int, default=1,
+                     help="单个文件分块并行解析的进程数（0 为 CPU 核数），适合少量超大文件，通常与 -j 1 搭配")
+    pfo.add_argument('--verify-parse', action='store_true', help="另以单进程解析一遍并逐列比对结果")
+    pfo.add_argument('--flow-monitors', action='store_true',
+                     help="（试验）同时提取支路 / 发电机并做潮流监视；明细行格式尚未用实际 PFO 输出核对")
+    pfo.add_argument('--overload', type=float, default=DEFAULT_MONITOR_SETTINGS['overload_percent'],
+                     help="支路负载率不低于该值 (%%) 时记为过载，需 --flow-monitors")
+    pfo.add_argument('--q-tolerance', type=float, default=DEFAULT_MONITOR_SETTINGS['q_limit_tolerance'],
+                     help="发电机无功距上 / 下限不超过该值 (MVar) 时记为到限，需 --flow-monitors")
+    pfo.set_defaults(func=run_pfo)
+
+    for p in (dat, pfo):
+        p.add_argument('-o', '--out-dir', required=True, help="输出目录")
+        p.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help="并行进程数")
+
+    gen = sub.add_parser('gen', help="由参数表批量生成 L / T2 / T3 卡")
+    gen.add_argument('sheet', help="参数表 (CSV/Excel)，列见界面中的模板")
+    gen.add_argument('--kind', required=True, choices=CARD_KINDS, help="卡片类型")
+    gen.add_argument('-o', '--output', required=True, help="输出 .dat 文件")
+    gen.add_argument('--dat', help="插入卡片的已有 .dat 文件（插入到 (END) 之前）")
+    gen.add_argument('--no-bus-check', action='store_true', help="插入已有算例时不校验两端母线是否存在")
+    gen.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每次读取的参数表行数")
+    gen.set_defaults(func=run_gen)
+
+    for p in (dat, gen):
+        p.add_argument('--snapshot-dir', default=os.environ.get('BPA_SNAPSHOT_DIR'),
+                       help="解析快照目录（默认取 BPA_SNAPSHOT_DIR）：同一算例再次处理时直接映射加载")
+
+    for p in (dat, pfo, gen):
+        p.add_argument('--profile', help="将各阶段耗时 / 数量追加写入该 JSON Lines 文件")
+        p.add_argument('--profile-memory', action='store_true', help="性能记录中统计内存峰值（tracemalloc，会变慢）")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,648 @@
+import re
+
+import numpy as np
+
+from bpa_format import format_number
+from bpa_profile import stage
+
+# 卡片固定列定义（GBK 字节偏移，左闭右开）
+CARD_WIDTH = 80
+B_CARD_WIDTH = CARD_WIDTH
+B_TEXT_FIELDS = {
+    'owner': (3, 6),
+    'bus_name': (6, 14),
+    'dist': (18, 20),
+}
+# 数值字段：(起, 止, 隐含小数位)
+B_NUMERIC_FIELDS = {
+    'vol_rank': (14, 18, 0),
+    'load_p': (20, 25, 0),
+    'load_q': (25, 30, 0),
+    'shunt_p': (30, 34, 0),
+    'shunt_var': (34, 38, 0),
+    'p_max': (38, 42, 0),
+    'p_gen': (42, 47, 0),
+    'q_max': (47, 52, 0),
+    'q_min': (52, 57, 0),
+    'v_max': (57, 61, 3),
+    'v_min': (61, 65, 3),
+}
+# B卡允许批量修改的字段。BCard 按两位小数写回字段，且分区 / 所有者 / 电压索引在副本间共享，
+# 因此电压 (vol_rank) 等筛选键和带隐含小数位的字段（v_max / v_min）不在其列
+B_EDITABLE_FIELDS = ['shunt_var']
+# 支路类卡片（L / T / E / R 等）的公共字段
+BRANCH_TEXT_FIELDS = {
+    'owner': (3, 6),
+    'bus1': (6, 14),
+    'meter': (18, 19),
+    'bus2': (19, 27),
+    'circuit': (31, 32),
+    'section': (32, 33),
+}
+BRANCH_NUMERIC_FIELDS = {
+    'kv1': (14, 18, 0),
+    'kv2': (27, 31, 0),
+    'rating': (33, 37, 0),
+    'num_circuits': (37, 38, 0),
+    'r': (38, 44, 5),
+    'x': (44, 50, 5),
+    'g': (50, 56, 5),
+    'b': (56, 62, 5),
+}
+L_TEXT_FIELDS = {**BRANCH_TEXT_FIELDS, 'desc': (66, 74)}
+L_NUMERIC_FIELDS = {**BRANCH_NUMERIC_FIELDS, 'miles': (62, 66, 1)}
+T_NUMERIC_FIELDS = {**BRANCH_NUMERIC_FIELDS, 'tap1': (62, 67, 2), 'tap2': (67, 72, 2)}
+E_NUMERIC_FIELDS = {**BRANCH_NUMERIC_FIELDS, 'g2': (62, 68, 5), 'b2': (68, 74, 5)}
+CONTINUATION_NUMERIC_FIELDS = {
+    'vol_rank': (14, 18, 0),
+    'load_p': (20, 25, 0),
+    'load_q': (25, 30, 0),
+    'shunt_p': (30, 34, 0),
+    'shunt_var': (34, 38, 0),
+    'p_gen': (42, 47, 0),
+    'q_gen': (47, 52, 0),
+}
+NODE_TEXT_FIELDS = {'owner': (3, 6), 'bus_name': (6, 14)}
+NODE_NUMERIC_FIELDS = {'vol_rank': (14, 18, 0)}
+BUS_CARD_CODES = ['B ', 'BC', 'BE', 'BF', 'BG', 'BJ', 'BK', 'BL', 'BQ', 'BS', 'BT', 'BV', 'BX']
+
+# 报告进度的间隔：归类的行数 / 写回时生成的卡数
+PROGRESS_LINES = 100000
+PROGRESS_CARDS = 5000
+
+# 卡片类型注册表：类型名 -> {'prefixes', 'text', 'numeric', 'width'}；
+# 行首两字节优先匹配，其次匹配首字节，均不匹配的行归为 other
+CARD_TYPES = {}
+_PREFIX_TYPES = {}
+OTHER_CARD_TYPE = 'other'
+
+
+def register_card_type(name: str, prefixes: list, text_fields: dict = None, numeric_fields: dict = None,
+                       width: int = CARD_WIDTH):
+    CARD_TYPES[name] = {
+        'prefixes': list(prefixes),
+        'text': dict(text_fields or {}),
+        'numeric': dict(numeric_fields or {}),
+        'width': width,
+    }
+    for prefix in prefixes:
+        _PREFIX_TYPES[prefix] = name
+
+
+for _code in BUS_CARD_CODES:
+    register_card_type(_code.strip(), [_code.encode('ascii')], B_TEXT_FIELDS, B_NUMERIC_FIELDS)
+register_card_type('BD', [b'BD'], NODE_TEXT_FIELDS, NODE_NUMERIC_FIELDS)
+register_card_type('BM', [b'BM'], NODE_TEXT_FIELDS, NODE_NUMERIC_FIELDS)
+register_card_type('+', [b'+'], NODE_TEXT_FIELDS, CONTINUATION_NUMERIC_FIELDS)
+register_card_type('X', [b'X'], NODE_TEXT_FIELDS, NODE_NUMERIC_FIELDS)
+register_card_type('L', [b'L ', b'L+'], L_TEXT_FIELDS, L_NUMERIC_FIELDS)
+register_card_type('LD', [b'LD'], BRANCH_TEXT_FIELDS, {'kv1': (14, 18, 0), 'kv2': (27, 31, 0)})
+register_card_type('LM', [b'LM'], BRANCH_TEXT_FIELDS, {'kv1': (14, 18, 0), 'kv2': (27, 31, 0)})
+register_card_type('T', [b'T '], BRANCH_TEXT_FIELDS, T_NUMERIC_FIELDS)
+register_card_type('TP', [b'TP'], BRANCH_TEXT_FIELDS, T_NUMERIC_FIELDS)
+register_card_type('E', [b'E'], BRANCH_TEXT_FIELDS, E_NUMERIC_FIELDS)
+register_card_type('R', [b'R'], BRANCH_TEXT_FIELDS, {'kv1': (14, 18, 0), 'kv2': (27, 31, 0)})
+register_card_type('comment', [b'.'])
+register_card_type('control', [b'/', b'('])
+register_card_type(OTHER_CARD_TYPE, [])
+
+
+def card_type_of(line: bytes) -> str:
+    return _PREFIX_TYPES.get(line[:2]) or _PREFIX_TYPES.get(line[:1]) or OTHER_CARD_TYPE
+
+
+def classify_lines(lines: list, progress=None) -> dict:
+    # 一遍扫描按行首前缀归类，返回 {类型名: 行号列表}；progress(已归类行数, 总行数) 每 PROGRESS_LINES 行调用一次
+    memo = {}
+    rows = {}
+    total = len(lines)
+    for idx, raw in enumerate(lines):
+        if progress is not None and not idx % PROGRESS_LINES:
+            progress(idx, total)
+        key = raw[:2]
+        bucket = memo.get(key)
+        if bucket is None:
+            bucket = memo[key] = rows.setdefault(card_type_of(key), [])
+        bucket.append(idx)
+    return rows
+
+
+class LineStore:
+    # 只读的行序列：所有行在一块连续缓冲区中（如内存映射的快照文件），offsets[i]:offsets[i + 1] 为第 i 行（含换行符）；
+    # 按需切出单行，连续多行直接整段切片，无需逐行拆分
+    def __init__(self, buffer, offsets: np.ndarray):
+        self.buffer = memoryview(buffer).cast('B')
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        return bytes(self.buffer[self.offsets[idx]:self.offsets[idx + 1]])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.offsets[-1]) + self.offsets.nbytes
+
+    def join(self, start: int = 0, stop: int = None) -> bytes:
+        stop = len(self) if stop is None else stop
+        return bytes(self.buffer[self.offsets[start]:self.offsets[stop]])
+
+
+def join_lines(lines, start: int = 0, stop: int = None) -> bytes:
+    if isinstance(lines, LineStore):
+        return lines.join(start, stop)
+    return b''.join(lines[start:stop])
+
+
+def line_offsets(lines) -> np.ndarray:
+    if isinstance(lines, LineStore):
+        return lines.offsets
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)), out=offsets[1:])
+    return offsets
+
+
+def _fixed_width_matrix(lines: list, width: int) -> np.ndarray:
+    buf = b''.join(line.rstrip(b'\r\n')[:width].ljust(width) for line in lines)
+    return np.frombuffer(buf, dtype=np.uint8).reshape(-1, width)
+
+
+def _slice_column(matrix: np.ndarray, start: int, stop: int) -> np.ndarray:
+    return np.ascontiguousarray(matrix[:, start:stop]).view(f'S{stop - start}').ravel()
+
+
+def _to_float(text: bytes) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def _parse_numeric(raw: np.ndarray, decimals: int) -> np.ndarray:
+    # 空白字段按 BPA 约定视为 0，无法解析的字段记为 NaN
+    text = np.char.strip(raw)
+    values = np.zeros(len(text))
+    filled = text != b''
+    if not filled.any():
+        return values
+    try:
+        parsed = text[filled].astype(np.float64)
+    except ValueError:
+        parsed = np.array([_to_float(v) for v in text[filled]], dtype=np.float64)
+    if decimals:
+        implied = np.char.find(text[filled], b'.') < 0
+        parsed = np.where(implied, parsed / 10 ** decimals, parsed)
+    values[filled] = parsed
+    return values
+
+
+def _union_positions(groups) -> np.ndarray:
+    groups = list(groups)
+    if not groups:
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(np.concatenate(groups))
+
+
+def _intersect_positions(selections: list, size: int) -> np.ndarray:
+    # 条件间取交集，从最小的集合开始求交
+    if not selections:
+        return np.arange(size)
+    selections = sorted(selections, key=len)
+    result = selections[0]
+    for other in selections[1:]:
+        result = np.intersect1d(result, other, assume_unique=True)
+    return result
+
+
+def _group_positions(values: np.ndarray, positions: np.ndarray = None) -> dict:
+    if positions is None:
+        positions = np.arange(len(values))
+    if not len(positions):
+        return {}
+    keys, inverse = np.unique(values[positions], return_inverse=True)
+    order = positions[np.argsort(inverse, kind='stable')]
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+    return dict(zip(keys.tolist(), np.split(order, bounds)))
+
+
+class CardTable:
+    # 单一卡片类型的列式视图：rows 为对应的 DAT 行号，字段在首次访问时才从定长字节中解码；
+    # 字节矩阵、解码结果与分组索引在副本间共享，被修改的字段由各副本单独持有
+    def __init__(self, card_type: str, lines: list, rows):
+        self.card_type = card_type
+        self.lines = lines
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.columns = {}
+        self.edited = {}
+        self._shared = {'matrix': None, 'decoded': {}, 'indexes': {}}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def spec(self) -> dict:
+        return CARD_TYPES[self.card_type]
+
+    @property
+    def fields(self) -> list:
+        return list(self.spec['text']) + list(self.spec['numeric'])
+
+    @property
+    def matrix(self) -> np.ndarray:
+        matrix = self._shared['matrix']
+        if matrix is None:
+            width = self.spec['width']
+            if len(self.rows):
+                matrix = _fixed_width_matrix([self.lines[idx] for idx in self.rows], width)
+            else:
+                matrix = np.zeros((0, width), dtype=np.uint8)
+            self._shared['matrix'] = matrix
+        return matrix
+
+    @property
+    def nbytes(self) -> int:
+        shared = self._shared
+        total = self.rows.nbytes + sum(col.nbytes for col in self.columns.values())
+        total += sum(col.nbytes for col in shared['decoded'].values())
+        if shared['matrix'] is not None:
+            total += shared['matrix'].nbytes
+        return total
+
+    def _decode(self, name: str) -> np.ndarray:
+        spec = self.spec
+        if name in spec['text']:
+            start, stop = spec['text'][name]
+            keys, inverse = np.unique(_slice_column(self.matrix, start, stop), return_inverse=True)
+            return np.char.strip(np.char.decode(keys, 'gbk', errors='ignore'))[inverse]
+        if name in spec['numeric']:
+            start, stop, decimals = spec['numeric'][name]
+            return _parse_numeric(_slice_column(self.matrix, start, stop), decimals)
+        raise KeyError(f"{self.card_type}卡没有字段 {name}")
+
+    def column(self, name: str) -> np.ndarray:
+        column = self.columns.get(name)
+        if column is not None:
+            return column
+        return self.base_column(name)
+
+    def base_column(self, name: str) -> np.ndarray:
+        # 解析得到的原值，不含本表上的修改
+        decoded = self._shared['decoded']
+        column = decoded.get(name)
+        if column is None:
+            with stage('decode', card_type=self.card_type, field=name, rows=len(self.rows)):
+                column = decoded[name] = self._decode(name)
+        return column
+
+    def __getattr__(self, name):
+        spec = CARD_TYPES.get(self.__dict__.get('card_type'))
+        if spec is not None and (name in spec['text'] or name in spec['numeric']):
+            return self.column(name)
+        raise AttributeError(name)
+
+    def copy(self) -> 'CardTable':
+        table = self.__class__.__new__(self.__class__)
+        table.card_type = self.card_type
+        table.lines = self.lines
+        table.rows = self.rows
+        table.columns = {name: col.copy() for name, col in self.columns.items()}
+        table.edited = {field: mask.copy() for field, mask in self.edited.items()}
+        table._shared = self._shared
+        return table
+
+    def index(self, field: str) -> dict:
+        # 字段值 -> 表内位置；未修改过的字段索引只建一次并在副本间共享
+        if field in self.columns:
+            return self._build_index(field)
+        indexes = self._shared['indexes']
+        groups = indexes.get(field)
+        if groups is None:
+            groups = indexes[field] = self._build_index(field)
+        return groups
+
+    def _build_index(self, field: str) -> dict:
+        values = self.column(field)
+        if values.dtype.kind == 'f':
+            return _group_positions(values, np.flatnonzero(~np.isnan(values)))
+        return _group_positions(values)
+
+    def select(self, tol: float = 0.1, **criteria) -> np.ndarray:
+        # 按字段筛选，值可为单值或列表；同一字段内取并集，字段间取交集，数值字段按容差匹配
+        selections = []
+        for field, wanted in criteria.items():
+            if wanted is None:
+                continue
+            if isinstance(wanted, str) or np.isscalar(wanted):
+                wanted = [wanted]
+            groups = self.index(field)
+            if field in self.spec['numeric']:
+                wanted = [float(w) for w in wanted]
+                parts = (s for v, s in groups.items() if any(abs(v - w) < tol for w in wanted))
+            else:
+                parts = (groups[w] for w in wanted if w in groups)
+            selections.append(_union_positions(parts))
+        return _intersect_positions(selections, len(self))
+
+    def _writable(self, field: str) -> np.ndarray:
+        if field not in self.spec['numeric']:
+            raise KeyError(f"{self.card_type}卡不支持修改字段 {field}")
+        column = self.columns.get(field)
+        if column is None:
+            column = self.columns[field] = self.column(field).copy()
+        return column
+
+    def _digits(self, field: str) -> int:
+        # 新值保留的小数位：至少 2 位，隐含小数位更多的字段（如 R / X）按字段精度
+        return max(2, self.spec['numeric'][field][2])
+
+    def _mark(self, field: str, targets: np.ndarray):
+        mask = self.edited.setdefault(field, np.zeros(len(self.rows), dtype=bool))
+        mask[targets] = True
+
+    def update(self, positions: np.ndarray, field: str, method: str, value: float) -> tuple:
+        # 对选中的行一次性设值或乘系数，返回 (修改数, 原值无效数)
+        return self.update_many(field, [(positions, method, value)])[0]
+
+    def update_many(self, field: str, ops: list, first_match: bool = False) -> list:
+        # 同一字段的多条 (位置, 方式, 值) 按顺序作用在同一份可写列上，最后统一标记修改；
+        # first_match 时每行只由第一条命中它的操作修改。返回每条操作的 (修改数, 原值无效数)
+        column = self._writable(field)
+        digits = self._digits(field)
+        touched = np.zeros(len(column), dtype=bool)
+        results = []
+        for positions, method, value in ops:
+            positions = np.asarray(positions, dtype=np.int64)
+            ok = ~np.isnan(column[positions])
+            targets = positions[ok]
+            if first_match:
+                targets = targets[~touched[targets]]
+            if method == "set":
+                column[targets] = round(value, digits)
+            else:
+                column[targets] = np.round(column[targets] * value, digits)
+            touched[targets] = True
+            results.append((len(targets), int((~ok).sum())))
+        self._mark(field, np.flatnonzero(touched))
+        return results
+
+    def assign(self, positions: np.ndarray, field: str, values: np.ndarray) -> int:
+        # 按行写入各自的新值（如调整方案逐卡计算的结果），返回修改数
+        column = self._writable(field)
+        positions = np.asarray(positions, dtype=np.int64)
+        column[positions] = np.round(np.asarray(values, dtype=np.float64), self._digits(field))
+        self._mark(field, positions)
+        return len(positions)
+
+    def put(self, positions: np.ndarray, field: str, values: np.ndarray):
+        # 原样写入已取整的值（如修改记录中保存的新值），不再取整
+        column = self._writable(field)
+        positions = np.asarray(positions, dtype=np.int64)
+        column[positions] = values
+        self._mark(field, positions)
+
+    def dirty_positions(self) -> np.ndarray:
+        if not self.edited:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.logical_or.reduce(list(self.edited.values())))
+
+    def patch_line(self, pos: int) -> bytes:
+        # 没有专用生成类的卡片：把修改过的数值字段按定长列写回原始行，其余字节保持不变
+        idx = int(self.rows[pos])
+        raw = self.lines[idx]
+        line = raw.rstrip(b'\r\n')
+        buf = bytearray(line)
+        numeric = self.spec['numeric']
+        for field, mask in self.edited.items():
+            if mask[pos]:
+                start, stop, decimals = numeric[field]
+                if len(buf) < stop:
+                    buf.extend(b' ' * (stop - len(buf)))
+                buf[start:stop] = format_number(self.columns[field][pos], stop - start, decimals)
+        return bytes(buf) + raw[len(line):]
+
+
+class BCardTable(CardTable):
+    # B卡（“B ” 开头）：写回时由加密模型中的 BCard 生成整张卡片
+    def __init__(self, lines: list, rows):
+        super().__init__('B', lines, rows)
+
+    def _writable(self, field: str) -> np.ndarray:
+        if field not in B_EDITABLE_FIELDS:
+            raise KeyError(f"B卡不支持修改字段 {field}（可修改: {', '.join(B_EDITABLE_FIELDS)}）")
+        return super()._writable(field)
+
+
+class BCardIndex:
+    # B卡多键索引：分区(dist) / 所有者(owner) / 电压等级(vol_rank) -> 表内位置
+    def __init__(self, table: BCardTable):
+        self.size = len(table)
+        self.by_dist = table.index('dist')
+        self.by_owner = table.index('owner')
+        self.by_vol = table.index('vol_rank')
+
+    @staticmethod
+    def _union(groups) -> np.ndarray:
+        return _union_positions(groups)
+
+    def query(self, dist_list=None, owner_list=None, vol=None, tol=0.1) -> np.ndarray:
+        # 各条件内取并集、条件间取交集，从最小的集合开始求交
+        selections = []
+        if dist_list:
+            selections.append(self._union(self.by_dist[d] for d in dist_list if d in self.by_dist))
+        if owner_list:
+            selections.append(self._union(self.by_owner[o] for o in owner_list if o in self.by_owner))
+        if vol is not None:
+            selections.append(self._union(s for v, s in self.by_vol.items() if abs(v - vol) < tol))
+        return _intersect_positions(selections, self.size)
+
+
+class DATCase:
+    # 已解析的 DAT 算例：保留原始 GBK 字节行，每行按卡片类型归入各自的列式表并按需解码；
+    # 写回时只重新生成被修改的卡片，B卡由 BCard 生成，其余类型按定长列修补
+    def __init__(self, lines: list, cards: dict, card_cls):
+        self.lines = lines
+        self.cards = cards
+        self.table = cards['B']
+        self.card_cls = card_cls
+        self.index = BCardIndex(self.table)
+        # 由原始行派生、在副本间共享的只读结构（如网络拓扑）
+        self._derived = {}
+
+    @property
+    def nbytes(self) -> int:
+        if isinstance(self.lines, LineStore):
+            lines = self.lines.nbytes
+        else:
+            lines = sum(len(line) for line in self.lines) + 8 * len(self.lines)
+        return lines + sum(t.nbytes for t in self.cards.values())
+
+    def type_counts(self) -> dict:
+        return {name: len(table) for name, table in self.cards.items() if len(table)}
+
+    def copy(self) -> 'DATCase':
+        # 原始行、字节矩阵与索引只读共享，各类型表复制一份供修改
+        case = DATCase.__new__(DATCase)
+        case.lines = self.lines
+        case.cards = {name: table.copy() for name, table in self.cards.items()}
+        case.table = case.cards['B']
+        case.card_cls = self.card_cls
+        case.index = self.index
+        case._derived = self._derived
+        return case
+
+    @property
+    def topology(self):
+        # 首次访问时由支路卡建立 CSR 拓扑索引
+        topology = self._derived.get('topology')
+        if topology is None:
+            from bpa_topology import Topology
+            topology = self._derived['topology'] = Topology.from_case(self)
+        return topology
+
+    @property
+    def dirty(self) -> np.ndarray:
+        parts = [table.rows[table.dirty_positions()] for table in self.cards.values() if table.edited]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def _gen_card(self, pos: int) -> bytes:
+        idx = int(self.table.rows[pos])
+        raw = self.lines[idx]
+        line = raw.rstrip(b'\r\n')
+        card = self.card_cls(line.decode('gbk', errors='ignore'), idx)
+        for field, mask in self.table.edited.items():
+            if mask[pos]:
+                setattr(card, field, f"{self.table.columns[field][pos]:.2f}")
+        return card.gen().encode('gbk') + raw[len(line):]
+
+    def to_bytes(self, progress=None) -> bytes:
+        # progress(已生成卡数, 修改卡总数) 每 PROGRESS_CARDS 张卡调用一次
+        patches = []
+        for table in self.cards.values():
+            generate = self._gen_card if table is self.table else table.patch_line
+            patches.extend((int(table.rows[pos]), generate, pos) for pos in table.dirty_positions())
+        if not patches:
+            return join_lines(self.lines)
+        patches.sort(key=lambda patch: patch[0])
+        chunks = []
+        start = 0
+        for count, (idx, generate, pos) in enumerate(patches):
+            if progress is not None and not count % PROGRESS_CARDS:
+                progress(count, len(patches))
+            chunks.append(join_lines(self.lines, start, idx))
+            chunks.append(generate(pos))
+            start = idx + 1
+        chunks.append(join_lines(self.lines, start))
+        return b''.join(chunks)
+
+
+def parse_dat(file_content: bytes, card_cls, progress=None) -> DATCase:
+    with stage('split_lines', bytes=len(file_content)) as record:
+        lines = file_content.splitlines(keepends=True)
+        record['lines'] = len(lines)
+    with stage('classify_lines', lines=len(lines)) as record:
+        cards = {name: BCardTable(lines, rows) if name == 'B' else CardTable(name, lines, rows)
+                 for name, rows in classify_lines(lines, progress).items()}
+        cards.setdefault('B', BCardTable(lines, []))
+        record['cards'] = sum(len(table) for table in cards.values())
+    return DATCase(lines, cards, card_cls)
+
+
+def near_positions(case: DATCase, names_f, kv_f, hops: int, log=None) -> np.ndarray:
+    # 中心母线 N 跳以内（经 L / T 等支路连接）的 B卡表位置
+    log = log or _silent_log
+    names = split_filter(names_f or '')
+    if not names:
+        return None
+    kv = None
+    if kv_f:
+        try:
+            kv = float(kv_f)
+        except ValueError:
+            log(f"警告: 中心母线电压 '{kv_f}' 非法，忽略电压条件", level="WARNING")
+    topology = case.topology
+    sources = topology.bus_ids(names, kv)
+    if not len(sources):
+        log(f"警告: 拓扑中找不到中心母线 {', '.join(names)}", level="WARNING")
+        return np.zeros(0, dtype=np.int64)
+    buses, _ = topology.within_hops(sources, hops)
+    positions = topology.card_positions(buses, 'B')
+    log(f"拓扑筛选: 中心母线 {len(sources)} 条，{hops} 跳以内母线 {len(buses)} 条，其中 B卡 {len(positions)} 张")
+    return positions
+
+
+def split_filter(text: str) -> list:
+    # 以英文或中文逗号分隔的筛选值
+    return [item.strip() for item in re.split(r',|，', text) if item.strip()]
+
+
+def _silent_log(msg, level="INFO"):
+    pass
+
+
+def apply_b_modifications(case: DATCase, dist_f, owner_f, vol_f, modifications: dict, log=None, near=None) -> dict:
+    # 按分区/所有者/电压筛选 B卡并批量修改，返回 {'matched': 命中数, 'changed': {字段: 修改数}}；
+    # near 为可选的 B卡表位置（如拓扑邻域查询结果），与上述条件取交集
+    log = log or _silent_log
+    summary = {'matched': 0, 'changed': {}}
+
+    user_vol = None
+    if vol_f:
+        try:
+            user_vol = float(vol_f)
+        except ValueError:
+            log(f"警告: B卡电压 '{vol_f}' 非法，忽略电压筛选", level="WARNING")
+            user_vol = None
+
+    dist_list = None
+    if dist_f:
+        dist_list = split_filter(dist_f)
+        if not dist_list:
+            log(f"警告: B卡分区 '{dist_f}' 格式非法，无有效值", level="WARNING")
+
+    owner_list = None
+    if owner_f:
+        owner_list = split_filter(owner_f)
+        if not owner_list:
+            log(f"警告: B卡所有者 '{owner_f}' 格式非法，无有效值", level="WARNING")
+
+    positions = case.index.query(dist_list, owner_list, user_vol)
+    if near is not None:
+        positions = np.intersect1d(positions, np.asarray(near, dtype=np.int64))
+    log(f"B卡符合条件: {len(positions)}")
+    summary['matched'] = len(positions)
+
+    for param, mod in modifications.items():
+        if not mod['apply']:
+            continue
+        try:
+            value = float(mod['value'])
+        except (TypeError, ValueError):
+            log(f"错误: {param} 的修改值 '{mod['value']}' 无法转为浮点数", level="ERROR")
+            continue
+        before = case.table.column(param)[positions]
+        changed, invalid = case.table.update(positions, param, mod['method'], value)
+        summary['changed'][param] = changed
+        if changed:
+            # 只列取值确实变化的卡片（命中但原值无效、或新值与原值相同的不算）
+            after = case.table.column(param)[positions]
+            moved = positions[(after != before) & ~np.isnan(before)]
+            sample = ", ".join(case.table.bus_name[moved[:20]])
+            log(f"B卡 {param} 修改涉及母线（前 20 个）: {sample}", level="DEBUG")
+        if mod['method'] == "set":
+            log(f"B卡 {param} 设为 {value}: 共修改 {changed} 张")
+        else:
+            log(f"B卡 {param} 乘系数 {value}: 共修改 {changed} 张")
+        if invalid:
+            log(f"错误: {invalid} 张 B卡的 {param} 原值无法转为浮点数，已跳过", level="ERROR")
+    return summary
@@ -0,0 +1,266 @@
+import io
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from bpa_pfo import STATUS_ALERT, STATUS_HIGH, STATUS_LOW, widen_floats
+from bpa_profile import stage
+
+# 导出层：xlsx 按列渲染单元格 XML 后分块流式写入 zip，不经过 DataFrame.to_excel / openpyxl 的逐单元格对象；
+# 另支持 CSV 与列式二进制格式（Parquet / Feather，需安装 pyarrow）。
+# 多个表导出为 xlsx 时写入同一工作簿的多个工作表，其余格式打包为 zip
+EXPORT_FORMATS = {
+    'xlsx': {'label': 'Excel (xlsx)', 'ext': '.xlsx',
+             'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'csv': {'label': 'CSV', 'ext': '.csv', 'mime': 'text/csv'},
+    'parquet': {'label': 'Parquet', 'ext': '.parquet', 'mime': 'application/octet-stream'},
+    'feather': {'label': 'Feather', 'ext': '.feather', 'mime': 'application/octet-stream'},
+}
+ZIP_MIME = 'application/zip'
+_SHEET_NAME_INVALID = re.compile(r'[\[\]:*?/\\]')
+_SHEET_NAME_MAX = 31
+
+# 电压监测报告的工作表
+SHEET_ANOMALIES = '异常节点'
+SHEET_ALERTS = '预警高压'
+SHEET_UNALLOCATED = '未安排无功'
+SHEET_DIST = '分区分布'
+SHEET_OWNER = '所有者分布'
+SHEET_ALL_NODES = '全部节点'
+
+
+def _has_module(name: str) -> bool:
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def available_formats() -> list:
+    formats = ['xlsx', 'csv']
+    if _has_module('pyarrow'):
+        formats += ['parquet', 'feather']
+    return formats
+
+
+def sheet_name(name: str, used: set) -> str:
+    # Excel 工作表名最长 31 个字符且不能含 []:*?/\，重名时追加序号
+    base = _SHEET_NAME_INVALID.sub('_', str(name)).strip("'") or 'Sheet'
+    base = base[:_SHEET_NAME_MAX]
+    candidate, number = base, 2
+    while candidate.lower() in used:
+        suffix = f" ({number})"
+        candidate = base[:_SHEET_NAME_MAX - len(suffix)] + suffix
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+# XML 1.0 不允许的控制字符（制表 / 换行 / 回车除外）
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_XLSX_STATIC = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '{sheets}</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{sheets}</sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{sheets}'
+        '<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # 样式 0 为默认，样式 1 为表头加粗
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+_EMPTY_CELL = '<c/>'
+# 每次拼接写出的行数，限制单次生成的 XML 字符串大小
+XLSX_CHUNK_ROWS = 50000
+
+
+def _xml_text(value) -> str:
+    return _XML_INVALID.sub('', str(value)).translate(_XML_ESCAPE)
+
+
+def _string_cell(value, style: str = '') -> str:
+    text = _xml_text(value)
+    space = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<c t="inlineStr"{style}><is><t{space}>{text}</t></is></c>'
+
+
+def _render_column(series: pd.Series) -> np.ndarray:
+    # 整列一次渲染为单元格 XML：相同取值只渲染一次（母线名、分区、电压等级等重复值很多）；
+    # 单元格不带坐标，按顺序定位，缺失值写为空单元格占位
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    kind = series.dtype.kind
+    if kind in 'iu':
+        codes, uniques = pd.factorize(series.to_numpy())
+        cells = [f'<c><v>{v}</v></c>' for v in uniques.tolist()]
+    elif series.dtype == np.float32:
+        # 会话中压缩存储的 float32 列按其最短十进制表示写出（248.8 而不是 248.8000030517578）
+        codes, uniques = pd.factorize(series.to_numpy())
+        cells = [f'<c><v>{v}</v></c>' if v not in ('inf', '-inf') else _EMPTY_CELL
+                 for v in np.asarray(uniques).astype(str).tolist()]
+    elif kind == 'f':
+        codes, uniques = pd.factorize(series.to_numpy(dtype=np.float64))
+        cells = [f'<c><v>{v!r}</v></c>' if np.isfinite(v) else _EMPTY_CELL for v in uniques.tolist()]
+    elif kind == 'b':
+        codes, uniques = pd.factorize(series.to_numpy())
+        cells = [f'<c t="b"><v>{int(v)}</v></c>' for v in uniques.tolist()]
+    else:
+        codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+        cells = [_string_cell(v) for v in np.asarray(uniques, dtype=object).tolist()]
+    lookup = np.array(cells + [_EMPTY_CELL], dtype=object)
+    return lookup[codes]
+
+
+def _sheet_chunks(df: pd.DataFrame):
+    header = ''.join(_string_cell(c, ' s="1"') for c in df.columns)
+    yield _SHEET_HEAD + f'<row>{header}</row>'
+    columns = [_render_column(df[col]) for col in df.columns]
+    for start in range(0, len(df), XLSX_CHUNK_ROWS):
+        rows = np.full(min(XLSX_CHUNK_ROWS, len(df) - start), '<row>', dtype=object)
+        for cells in columns:
+            rows += cells[start:start + len(rows)]
+        rows += '</row>'
+        yield ''.join(rows.tolist())
+    yield _SHEET_TAIL
+
+
+def write_xlsx(sheets: dict, out):
+    # sheets: {工作表名: DataFrame}，按插入顺序写入同一个工作簿；字符串以内联形式写出，无需共享字符串表
+    used = set()
+    names = [sheet_name(name, used) for name in sheets]
+    count = range(1, len(names) + 1)
+    parts = {
+        '[Content_Types].xml': ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>' for i in count),
+        'xl/workbook.xml': ''.join(
+            f'<sheet name="{_xml_text(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in zip(count, names)),
+        'xl/_rels/workbook.xml.rels': ''.join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>' for i in count),
+    }
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for part, template in _XLSX_STATIC.items():
+            archive.writestr(part, template.replace('{sheets}', parts.get(part, '')))
+        for i, df in zip(count, sheets.values()):
+            with archive.open(f'xl/worksheets/sheet{i}.xml', 'w', force_zip64=True) as f:
+                for chunk in _sheet_chunks(df):
+                    f.write(chunk.encode('utf-8'))
+
+
+def _columnar(df: pd.DataFrame) -> pd.DataFrame:
+    # 列式格式要求列名为字符串、索引为默认索引；float32 列还原为 float64，与 CSV / xlsx 的取值一致
+    df = widen_floats(df).reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def write_table(df: pd.DataFrame, fmt: str, out):
+    if fmt == 'xlsx':
+        write_xlsx({'Sheet1': df}, out)
+    elif fmt == 'csv':
+        out.write(df.to_csv(index=False).encode('utf-8-sig'))
+    elif fmt == 'parquet':
+        _columnar(df).to_parquet(out, index=False)
+    elif fmt == 'feather':
+        _columnar(df).to_feather(out)
+    else:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+def export_tables(sheets: dict, fmt: str) -> tuple:
+    # 返回 (文件内容, 扩展名, MIME)；单表直接输出，多表时 xlsx 为多工作表工作簿，其余格式打包为 zip
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    with stage('export', format=fmt, tables=len(sheets), rows=sum(len(df) for df in sheets.values())) as record:
+        data, ext, mime = _export_tables(sheets, fmt)
+        record['bytes'] = len(data)
+    return data, ext, mime
+
+
+def _export_tables(sheets: dict, fmt: str) -> tuple:
+    spec = EXPORT_FORMATS[fmt]
+    buffer = io.BytesIO()
+    if fmt == 'xlsx':
+        write_xlsx(sheets, buffer)
+        return buffer.getvalue(), spec['ext'], spec['mime']
+    if len(sheets) == 1:
+        write_table(next(iter(sheets.values())), fmt, buffer)
+        return buffer.getvalue(), spec['ext'], spec['mime']
+    used = set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, df in sheets.items():
+            member = io.BytesIO()
+            write_table(df, fmt, member)
+            archive.writestr(sheet_name(name, used) + spec['ext'], member.getvalue())
+    return buffer.getvalue(), '.zip', ZIP_MIME
+
+
+def export_path(path: str, df_or_sheets, fmt: str = None) -> str:
+    # 按文件扩展名（或指定格式）写出到磁盘，返回实际写出的路径
+    sheets = df_or_sheets if isinstance(df_or_sheets, dict) else {'Sheet1': df_or_sheets}
+    # 路径已带该格式的扩展名时替换为实际扩展名（多表非 xlsx 为 .zip），否则直接追加
+    stem, ext = os.path.splitext(path)
+    if fmt is None:
+        fmt = ext.lstrip('.').lower() or 'csv'
+    if fmt in EXPORT_FORMATS and ext.lower() != EXPORT_FORMATS[fmt]['ext']:
+        stem = path
+    data, ext, _ = export_tables(sheets, fmt)
+    path = stem + ext
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def voltage_report_sheets(all_nodes_df: pd.DataFrame, anomalies_df: pd.DataFrame, include_all: bool = False) -> dict:
+    # 电压监测报告：异常、预警高压、未安排无功、分区 / 所有者分布，可选附带全部节点
+    anomalies_df = anomalies_df if anomalies_df is not None else all_nodes_df.iloc[0:0]
+    status = anomalies_df['状态']
+    sheets = {
+        SHEET_ANOMALIES: anomalies_df[status.isin([STATUS_LOW, STATUS_HIGH])],
+        SHEET_ALERTS: anomalies_df[status == STATUS_ALERT],
+        SHEET_UNALLOCATED: all_nodes_df[all_nodes_df['UnallocatedReactivePower'].notnull()],
+        SHEET_DIST: anomalies_df.groupby(['Dist', '状态'], observed=True).size().unstack(fill_value=0).reset_index(),
+        SHEET_OWNER: anomalies_df.groupby(['Owner', '状态'], observed=True).size().unstack(fill_value=0).reset_index(),
+    }
+    if include_all:
+        sheets[SHEET_ALL_NODES] = all_nodes_df
+    return sheets
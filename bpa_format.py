@@ -0,0 +1,50 @@
+import numpy as np
+
+# BPA 定长列格式化：文本按 GBK 字节宽度截断补齐，数值右对齐
+
+
+def format_bytes(value, width: int) -> bytes:
+    # 按 GBK 字节长度截断并补空格，截断处落在双字节字符中间时舍去该字符
+    raw = str(value).encode('gbk', errors='replace')
+    if len(raw) > width:
+        raw = raw[:width].decode('gbk', errors='ignore').encode('gbk')
+    return raw.ljust(width)
+
+
+def format_number(value: float, width: int, implied: int = 0) -> bytes:
+    # 定长数值字段：取能放进字段宽度的最多小数位，尽量带小数点，右对齐；
+    # 字段有隐含小数位且带小数点会损失精度时（如 R / X 的 F6.5），改写为不带小数点的隐含小数形式；放不下时填 *
+    for decimals in (3, 2, 1, 0):
+        text = f"{value:.{decimals}f}"
+        if decimals == 0 and len(text) < width:
+            text += '.'
+        if len(text) <= width:
+            break
+    else:
+        text = None
+    if implied and (text is None or round(float(text), implied) != round(value, implied)):
+        scaled = f"{round(value * 10 ** implied):d}"
+        if len(scaled) <= width:
+            return scaled.encode('ascii').rjust(width)
+    if text is None:
+        return b'*' * width
+    return text.encode('ascii').rjust(width)
+
+
+def format_column_bytes(values, width: int) -> list:
+    memo = {}
+    out = []
+    for value in values:
+        formatted = memo.get(value)
+        if formatted is None:
+            formatted = memo[value] = format_bytes(value, width)
+        out.append(formatted)
+    return out
+
+
+def format_number_column(values, width: int, implied: int = 0) -> list:
+    # 按列格式化数值，相同取值只格式化一次（电压、容量等列重复值很多）
+    values = np.asarray(values, dtype=np.float64)
+    keys, inverse = np.unique(values, return_inverse=True)
+    formatted = [format_number(v, width, implied) for v in keys.tolist()]
+    return [formatted[i] for i in inverse.tolist()]
@@ -0,0 +1,287 @@
+import codecs
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from bpa_dat import CARD_TYPES, CARD_WIDTH, card_type_of
+from bpa_format import format_column_bytes, format_number_column
+
+# 由参数表批量生成支路 / 变压器卡：L 为线路，T2 为双绕组变压器（一张 T 卡），
+# T3 为三绕组变压器（中性点 B 卡 + 高 / 中 / 低三张 T 卡）。字段列位置取自 bpa_dat 的卡片注册表
+CARD_KINDS = ['L', 'T2', 'T3']
+SHEET_COLUMNS = {
+    'L': ['owner', 'bus1', 'kv1', 'bus2', 'kv2', 'circuit', 'section', 'rating', 'num_circuits',
+          'r', 'x', 'g', 'b', 'miles', 'desc'],
+    'T2': ['owner', 'bus1', 'kv1', 'bus2', 'kv2', 'circuit', 'rating', 'r', 'x', 'g', 'b', 'tap1', 'tap2'],
+    'T3': ['owner', 'dist', 'mid_bus', 'mid_kv', 'bus_h', 'kv_h', 'bus_m', 'kv_m', 'bus_l', 'kv_l',
+           'rating_h', 'rating_m', 'rating_l', 'r_h', 'x_h', 'r_m', 'x_m', 'r_l', 'x_l', 'tap_h', 'tap_m', 'tap_l'],
+}
+REQUIRED_COLUMNS = {
+    'L': ['bus1', 'kv1', 'bus2', 'kv2', 'r', 'x'],
+    'T2': ['bus1', 'kv1', 'bus2', 'kv2', 'x'],
+    'T3': ['mid_bus', 'mid_kv', 'bus_h', 'kv_h', 'bus_m', 'kv_m', 'bus_l', 'kv_l', 'x_h', 'x_m', 'x_l'],
+}
+_TEXT_COLUMNS = {'owner', 'dist', 'circuit', 'section', 'desc', 'bus1', 'bus2', 'mid_bus', 'bus_h', 'bus_m', 'bus_l'}
+DEFAULT_CHUNK_SIZE = 20000
+
+
+def iter_sheet_chunks(source, chunksize: int = DEFAULT_CHUNK_SIZE, name: str = None):
+    # 分块读取参数表（CSV / Excel），每块为全部按字符串读入的 DataFrame，内存不随表长增长
+    name = name or (source if isinstance(source, str) else getattr(source, 'name', ''))
+    ext = os.path.splitext(str(name))[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        yield from _iter_excel_chunks(source, chunksize)
+        return
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    yield from pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize,
+                           encoding=_sniff_encoding(source))
+
+
+def _sniff_encoding(source) -> str:
+    # 按表头附近的内容判断 UTF-8 / GBK，避免读到中途才发现编码不对
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            sample = f.read(65536)
+    else:
+        sample = source.read(65536)
+        source.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+
+def _iter_excel_chunks(source, chunksize: int):
+    import openpyxl
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h).strip() if h is not None else f"column_{i}" for i, h in enumerate(header)]
+        block = []
+        for row in rows:
+            block.append(['' if v is None else str(v) for v in row])
+            if len(block) >= chunksize:
+                yield pd.DataFrame(block, columns=header)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=header)
+    finally:
+        workbook.close()
+
+
+def _normalize_chunk(chunk: pd.DataFrame, kind: str) -> pd.DataFrame:
+    chunk = chunk.rename(columns=lambda c: str(c).strip().lower())
+    missing = [c for c in REQUIRED_COLUMNS[kind] if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"{kind} 参数表缺少列: {', '.join(missing)}")
+    frame = chunk.reindex(columns=SHEET_COLUMNS[kind]).fillna('')
+    for col in frame.columns:
+        frame[col] = frame[col].astype(str).str.strip()
+    return frame
+
+
+def _numeric(frame: pd.DataFrame, col: str) -> np.ndarray:
+    return pd.to_numeric(frame[col].replace('', np.nan), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _chunk_values(frame: pd.DataFrame, kind: str) -> dict:
+    # 每列只转换一次：文本列为 object 数组，数值列为 float64（空值为 NaN）
+    return {col: frame[col].to_numpy(dtype=object) if col in _TEXT_COLUMNS else _numeric(frame, col)
+            for col in SHEET_COLUMNS[kind]}
+
+
+def _validate(frame: pd.DataFrame, values: dict, kind: str, first_row: int, known_buses: set = None) -> tuple:
+    # 向量化校验：必填项、数值格式、母线名长度（GBK 不超过 8 字节），可选校验母线是否存在于算例中
+    errors = []
+    bad = np.zeros(len(frame), dtype=bool)
+    row_numbers = np.arange(first_row, first_row + len(frame))
+
+    def flag(mask, message):
+        nonlocal bad
+        mask = np.asarray(mask, dtype=bool)
+        if mask.any():
+            errors.extend((int(r), message) for r in row_numbers[mask])
+            bad |= mask
+
+    for col in SHEET_COLUMNS[kind]:
+        filled = (frame[col] != '').to_numpy()
+        if col in REQUIRED_COLUMNS[kind]:
+            flag(~filled, f"缺少 {col}")
+        if col not in _TEXT_COLUMNS:
+            flag(filled & np.isnan(values[col]), f"{col} 不是数值")
+        elif col.startswith(('bus', 'mid_bus')):
+            too_long = np.fromiter((len(v.encode('gbk', errors='replace')) > 8 for v in values[col]),
+                                   dtype=bool, count=len(frame))
+            flag(too_long, f"{col} 超过 8 个字节")
+
+    if known_buses is not None:
+        ends = [('bus1', 'kv1'), ('bus2', 'kv2')] if kind != 'T3' else [('bus_h', 'kv_h'), ('bus_m', 'kv_m'), ('bus_l', 'kv_l')]
+        for name_col, kv_col in ends:
+            kv = np.round(values[kv_col], 1)
+            exists = np.fromiter(((n, k) in known_buses for n, k in zip(values[name_col], kv.tolist())),
+                                 dtype=bool, count=len(frame))
+            flag(~exists, f"{name_col} 在算例中不存在")
+    return bad, errors
+
+
+def _place(matrix: np.ndarray, start: int, stop: int, formatted: list, mask: np.ndarray = None):
+    block = np.frombuffer(b''.join(formatted), dtype=np.uint8).reshape(-1, stop - start)
+    if mask is None:
+        matrix[:, start:stop] = block
+    else:
+        matrix[mask, start:stop] = block[mask]
+
+
+def format_cards(code: bytes, card_type: str, values: dict, count: int) -> np.ndarray:
+    # 按注册表中的列位置一次写入整列：文本左对齐、数值右对齐，空值（NaN / 空串）留空
+    spec = CARD_TYPES[card_type]
+    matrix = np.full((count, CARD_WIDTH), ord(' '), dtype=np.uint8)
+    matrix[:, :len(code)] = np.frombuffer(code, dtype=np.uint8)
+    for field, column in values.items():
+        if field in spec['text']:
+            start, stop = spec['text'][field]
+            _place(matrix, start, stop, format_column_bytes(list(column), stop - start))
+        elif field in spec['numeric']:
+            start, stop, decimals = spec['numeric'][field]
+            column = np.asarray(column, dtype=np.float64)
+            filled = ~np.isnan(column)
+            if filled.any():
+                formatted = format_number_column(np.where(filled, column, 0.0), stop - start, decimals)
+                _place(matrix, start, stop, formatted, filled)
+    return matrix
+
+
+def _overflow(matrix: np.ndarray) -> np.ndarray:
+    # format_number 放不下时整个字段填 *；按各行卡片类型只检查数值字段所在的列，母线名等文本字段中的 * 不算超宽
+    stars = matrix == ord('*')
+    codes = matrix[:, 0].astype(np.uint16) << 8 | matrix[:, 1]
+    overflow = np.zeros(len(matrix), dtype=bool)
+    for code in np.unique(codes).tolist():
+        rows = codes == code
+        spec = CARD_TYPES[card_type_of(code.to_bytes(2, 'big'))]
+        for start, stop, _ in spec['numeric'].values():
+            overflow[rows] |= stars[rows, start:stop].all(axis=1)
+    return overflow
+
+
+def _card_lines(matrix: np.ndarray, newline: bytes) -> bytes:
+    return b''.join(bytes(row).rstrip() + newline for row in matrix)
+
+
+def _build_l(values: dict, n: int) -> np.ndarray:
+    return format_cards(b'L ', 'L', values, n)
+
+
+def _build_t2(values: dict, n: int) -> np.ndarray:
+    # 未给出分接头时取两侧基准电压
+    values = dict(values)
+    for tap, kv in (('tap1', 'kv1'), ('tap2', 'kv2')):
+        values[tap] = np.where(np.isnan(values[tap]), values[kv], values[tap])
+    return format_cards(b'T ', 'T', values, n)
+
+
+def _build_t3(values: dict, n: int) -> np.ndarray:
+    # 每行生成 4 张卡：中性点 B 卡，以及高 / 中 / 低压侧到中性点的 T 卡，按行交错输出
+    mid_kv = values['mid_kv']
+    bus = format_cards(b'B ', 'B', {
+        'owner': values['owner'], 'bus_name': values['mid_bus'], 'dist': values['dist'], 'vol_rank': mid_kv,
+    }, n)
+    blocks = [bus]
+    for side in ('h', 'm', 'l'):
+        kv = values[f'kv_{side}']
+        tap = values[f'tap_{side}']
+        blocks.append(format_cards(b'T ', 'T', {
+            'owner': values['owner'],
+            'bus1': values[f'bus_{side}'], 'kv1': kv,
+            'bus2': values['mid_bus'], 'kv2': mid_kv,
+            'rating': values[f'rating_{side}'],
+            'r': values[f'r_{side}'], 'x': values[f'x_{side}'],
+            'tap1': np.where(np.isnan(tap), kv, tap), 'tap2': mid_kv,
+        }, n))
+    return np.stack(blocks, axis=1).reshape(n * len(blocks), CARD_WIDTH)
+
+
+_BUILDERS = {'L': (_build_l, 1), 'T2': (_build_t2, 1), 'T3': (_build_t3, 4)}
+
+
+def generate_cards(source, kind: str, chunksize: int = DEFAULT_CHUNK_SIZE, newline: bytes = b'\r\n',
+                   known_buses: set = None, name: str = None):
+    # 逐块读取、校验、格式化，每块产出 (卡片字节, 错误列表)；错误行不生成卡片
+    if kind not in _BUILDERS:
+        raise ValueError(f"不支持的卡片类型 {kind}，应为 {', '.join(CARD_KINDS)}")
+    build, cards_per_row = _BUILDERS[kind]
+    first_row = 2  # 表头占第 1 行
+    for chunk in iter_sheet_chunks(source, chunksize, name):
+        frame = _normalize_chunk(chunk, kind)
+        values = _chunk_values(frame, kind)
+        bad, errors = _validate(frame, values, kind, first_row, known_buses)
+        good = int((~bad).sum())
+        if good:
+            matrix = build({col: v[~bad] for col, v in values.items()}, good)
+            overflow = _overflow(matrix).reshape(-1, cards_per_row).any(axis=1)
+            if overflow.any():
+                rows = np.arange(first_row, first_row + len(frame))[~bad][overflow]
+                errors.extend((int(r), "数值超出字段宽度") for r in rows)
+                matrix = matrix.reshape(good, cards_per_row, CARD_WIDTH)[~overflow].reshape(-1, CARD_WIDTH)
+            data = _card_lines(matrix, newline)
+        else:
+            data = b''
+        first_row += len(frame)
+        yield data, errors
+
+
+def write_cards(source, kind: str, out, **kwargs) -> dict:
+    # 流式写入文件对象，返回 {'cards': 卡片数, 'errors': [(行号, 原因)]}
+    cards = 0
+    errors = []
+    for data, chunk_errors in generate_cards(source, kind, **kwargs):
+        out.write(data)
+        cards += data.count(b'\n')
+        errors.extend(chunk_errors)
+    return {'cards': cards, 'errors': errors}
+
+
+def known_bus_keys(case) -> set:
+    # 算例中全部母线（各类 B 卡）的 (母线名, 基准电压) 集合，用于校验支路两端
+    keys = set()
+    for name, table in case.cards.items():
+        spec = CARD_TYPES[name]
+        if 'bus_name' in spec['text'] and 'vol_rank' in spec['numeric'] and name not in ('+', 'X') and len(table):
+            keys.update(zip(table.bus_name.tolist(), np.round(table.vol_rank, 1).tolist()))
+    return keys
+
+
+def splice_cards(case, source, kind: str, out, check_buses: bool = True, **kwargs) -> dict:
+    # 把生成的卡片插入已解析算例（含未写回的修改）的 (END) 之前，逐块写出，不在内存中拼接整份文件
+    data = case.to_bytes()
+    end = _end_offset(data)
+    newline = b'\r\n' if b'\r\n' in data[:4096] or not data else b'\n'
+    out.write(data[:end])
+    if end and not data[:end].endswith((b'\n', b'\r')):
+        out.write(newline)
+    known = known_bus_keys(case) if check_buses else None
+    summary = write_cards(source, kind, out, newline=newline, known_buses=known, **kwargs)
+    out.write(data[end:])
+    return summary
+
+
+def _end_offset(data: bytes) -> int:
+    # 最后一个 (END) 行的起始字节位置，没有时插入到文件末尾
+    pos = data.rfind(b'(END')
+    while pos > 0 and data[pos - 1:pos] not in (b'\n', b'\r'):
+        pos = data.rfind(b'(END', 0, pos)
+    return pos if pos >= 0 else len(data)
+
+
+def sheet_template(kind: str) -> bytes:
+    return pd.DataFrame(columns=SHEET_COLUMNS[kind]).to_csv(index=False).encode('utf-8-sig')
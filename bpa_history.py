@@ -0,0 +1,143 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from bpa_pfo import ANOMALY_STATUSES, STATUS_ALERT, STATUS_EXCLUDED, STATUS_HIGH, STATUS_LOW, STATUS_NORMAL
+
+# 历次潮流结果的紧凑列存：母线名 / 分区 / 所有者 / 状态为分类型，电压为 float32，
+# 母线名在所有轮次间共用同一套类别，对比时按类别编码 + 基准电压做向量化连接
+HISTORY_COLUMNS = ['BusName', 'RatedVoltage', 'ActualVoltage', 'Dist', 'Owner', 'UnallocatedReactivePower', '电压等级', '状态']
+DEFAULT_MAX_RUNS = 20
+
+CHANGE_RESOLVED = '已消除'
+CHANGE_INTRODUCED = '新增异常'
+CHANGE_PERSISTING = '仍异常'
+CHANGE_NONE = ''
+CHANGE_ADDED = '新增母线'
+CHANGE_REMOVED = '母线缺失'
+
+_STATUS_DTYPE = pd.CategoricalDtype([STATUS_LOW, STATUS_HIGH, STATUS_ALERT, STATUS_NORMAL, STATUS_EXCLUDED])
+
+
+class PFOHistory:
+    def __init__(self, max_runs: int = DEFAULT_MAX_RUNS):
+        self.max_runs = max_runs
+        self.runs = []
+        self._names = pd.Index([], dtype=object)
+
+    def __len__(self):
+        return len(self.runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(run['frame'].memory_usage(deep=True).sum()) for run in self.runs)
+
+    def labels(self) -> list:
+        return [run['label'] for run in self.runs]
+
+    def _compact(self, all_nodes_df: pd.DataFrame) -> pd.DataFrame:
+        frame = all_nodes_df.reindex(columns=HISTORY_COLUMNS)
+        names = frame['BusName'].astype(str).to_numpy(dtype=object)
+        new_names = pd.Index(pd.unique(names)).difference(self._names)
+        if len(new_names):
+            # 追加新类别时保留已有编码，旧轮次无需重新编码
+            self._names = self._names.append(new_names)
+            for run in self.runs:
+                run['frame']['BusName'] = run['frame']['BusName'].cat.set_categories(self._names)
+        return pd.DataFrame({
+            'BusName': pd.Categorical(names, dtype=pd.CategoricalDtype(self._names)),
+            'RatedVoltage': frame['RatedVoltage'].to_numpy(dtype=np.float32),
+            'ActualVoltage': frame['ActualVoltage'].to_numpy(dtype=np.float32),
+            'Dist': frame['Dist'].astype('category'),
+            'Owner': frame['Owner'].astype('category'),
+            'UnallocatedReactivePower': frame['UnallocatedReactivePower'].to_numpy(dtype=np.float32),
+            '电压等级': frame['电压等级'].fillna('').astype('category'),
+            '状态': pd.Categorical(frame['状态'], dtype=_STATUS_DTYPE),
+        })
+
+    def add(self, label: str, all_nodes_df: pd.DataFrame, key: str = None) -> bool:
+        # 同一结果（相同文件与阈值）连续提交时不重复记录，返回是否新增了一轮
+        if key is not None and self.runs and self.runs[-1]['key'] == key:
+            return False
+        self.runs.append({
+            'label': label,
+            'key': key,
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'frame': self._compact(all_nodes_df),
+        })
+        if len(self.runs) > self.max_runs:
+            del self.runs[:len(self.runs) - self.max_runs]
+        return True
+
+    def clear(self):
+        self.runs.clear()
+        self._names = pd.Index([], dtype=object)
+
+    def summary(self) -> pd.DataFrame:
+        # 每轮一行：母线数、各类异常数、未安排无功合计，以及相对上一轮的变化
+        rows = []
+        for number, run in enumerate(self.runs, start=1):
+            frame = run['frame']
+            counts = frame['状态'].value_counts()
+            unallocated = frame['UnallocatedReactivePower']
+            rows.append({
+                '轮次': number,
+                '文件': run['label'],
+                '时间': run['time'],
+                '母线数': len(frame),
+                STATUS_LOW: int(counts.get(STATUS_LOW, 0)),
+                STATUS_HIGH: int(counts.get(STATUS_HIGH, 0)),
+                STATUS_ALERT: int(counts.get(STATUS_ALERT, 0)),
+                '异常合计': int(counts.reindex(ANOMALY_STATUSES).fillna(0).sum()),
+                '未安排无功节点': int(unallocated.notnull().sum()),
+                '未安排无功合计': round(float(np.nansum(unallocated.to_numpy(dtype=np.float64))), 2),
+            })
+        table = pd.DataFrame(rows)
+        if not table.empty:
+            table['异常变化'] = table['异常合计'].diff()
+            table['未安排无功变化'] = table['未安排无功合计'].diff().round(2)
+        return table
+
+    def diff(self, before: int = -2, after: int = -1) -> pd.DataFrame:
+        # 按 (母线名, 基准电压) 外连接两轮结果，给出电压变化与异常消除 / 新增情况；
+        # 同一轮内重复的母线只取首次出现，避免笛卡尔积。分区 / 所有者 / 电压等级取后一轮，只在前一轮中的母线取前一轮
+        keys = ['BusName', 'RatedVoltage']
+        info = ['Dist', 'Owner', '电压等级']
+        old = self.runs[before]['frame'].drop_duplicates(keys)
+        new = self.runs[after]['frame'].drop_duplicates(keys)
+        merged = pd.merge(
+            old[keys + ['ActualVoltage', '状态', 'UnallocatedReactivePower'] + info],
+            new[keys + ['ActualVoltage', '状态', 'UnallocatedReactivePower'] + info],
+            on=keys, how='outer', suffixes=('_前', '_后'), indicator=True, sort=False,
+        )
+        for col in info:
+            filled = merged.pop(f'{col}_后').astype(object).fillna(merged.pop(f'{col}_前').astype(object))
+            merged[col] = filled.astype('category')
+        was_bad = merged['状态_前'].isin(ANOMALY_STATUSES).to_numpy()
+        is_bad = merged['状态_后'].isin(ANOMALY_STATUSES).to_numpy()
+        side = merged.pop('_merge').to_numpy()
+        change = np.select(
+            [side == 'right_only', side == 'left_only', was_bad & ~is_bad, ~was_bad & is_bad, was_bad & is_bad],
+            [CHANGE_ADDED, CHANGE_REMOVED, CHANGE_RESOLVED, CHANGE_INTRODUCED, CHANGE_PERSISTING],
+            default=CHANGE_NONE,
+        )
+        merged['变化'] = change
+        merged['电压变化 (kV)'] = (merged['ActualVoltage_后'].astype(np.float64)
+                                   - merged['ActualVoltage_前'].astype(np.float64)).round(2)
+        merged['未安排无功变化'] = (merged['UnallocatedReactivePower_后'].astype(np.float64).fillna(0)
+                                 - merged['UnallocatedReactivePower_前'].astype(np.float64).fillna(0)).round(2)
+        merged['BusName'] = merged['BusName'].astype(str)
+        for col in ['RatedVoltage', 'ActualVoltage_前', 'ActualVoltage_后']:
+            merged[col] = merged[col].astype(np.float64).round(2)
+        return merged
+
+    def trend(self, bus_names: list) -> pd.DataFrame:
+        # 指定母线在各轮次的实际电压，行为轮次、列为 “母线名 基准电压”
+        series = {}
+        for number, run in enumerate(self.runs, start=1):
+            frame = run['frame']
+            picked = frame[frame['BusName'].isin(bus_names)].drop_duplicates(['BusName', 'RatedVoltage'])
+            labels = [f"{name} {rated:g}" for name, rated in zip(picked['BusName'], picked['RatedVoltage'])]
+            series[number] = pd.Series(picked['ActualVoltage'].astype(np.float64).round(2).to_numpy(), index=labels)
+        return pd.DataFrame(series).T.rename_axis('轮次')
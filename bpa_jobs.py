@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from bpa_profile import recording
+
+# 后台任务：解析 / 修改 / 写回 / 电压监测等耗时处理在线程池中执行，不阻塞界面脚本。
+# 同一会话的任务按提交顺序逐个执行（先后修改同一文件时结果确定），不同会话的任务共享线程池并行。
+# 任务函数以 job 为第一个参数，通过 job.progress(已完成, 总数) 报告进度；
+# 取消请求在下一次报告进度（或 job.check()）时以 JobCancelled 中止任务
+STATUS_QUEUED = '排队中'
+STATUS_RUNNING = '运行中'
+STATUS_DONE = '已完成'
+STATUS_FAILED = '失败'
+STATUS_CANCELLED = '已取消'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+DEFAULT_WORKERS = 2
+# 每个会话保留的已结束任务数（含结果），超出时丢弃最早结束的
+DEFAULT_MAX_FINISHED = 20
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, label: str, kind: str, func, args=(), kwargs=None, profiler=None):
+        self.id = uuid.uuid4().hex[:8]
+        self.label = label
+        self.kind = kind
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.profiler = profiler
+        self.status = STATUS_QUEUED
+        self.phase = ''
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished_ok(self) -> bool:
+        return self.status == STATUS_DONE
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def fraction(self):
+        # 0~1；总数未知时为 None
+        if self.status == STATUS_DONE:
+            return 1.0
+        if not self.total:
+            return None
+        return min(1.0, self.done / self.total)
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == STATUS_QUEUED:
+            self._finish(STATUS_CANCELLED)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+
+    def step(self, phase: str, total: int = 0):
+        # 进入新的处理阶段（如“解析”“写回”），进度清零
+        self.check()
+        self.phase = phase
+        self.done = 0
+        self.total = total
+
+    def progress(self, done: int, total: int = None):
+        # 传给解析器等的进度回调
+        self.done = done
+        if total is not None:
+            self.total = total
+        self.check()
+
+    def _finish(self, status: str):
+        self.status = status
+        self.finished = time.time()
+        # 结束后不再需要输入数据（文件内容等），及早释放
+        self.func = None
+        self.args = ()
+        self.kwargs = {}
+
+    def run(self):
+        if self.is_finished:
+            return
+        self.status = STATUS_RUNNING
+        self.started = time.time()
+        try:
+            if self.profiler is not None:
+                with recording(self.profiler):
+                    self.result = self.func(self, *self.args, **self.kwargs)
+            else:
+                self.result = self.func(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self._finish(STATUS_CANCELLED)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._finish(STATUS_FAILED)
+        else:
+            self._finish(STATUS_DONE)
+
+    def summary(self) -> dict:
+        return {'任务': self.label, '状态': self.status, '阶段': self.phase,
+                '进度': self.fraction, '耗时 (s)': round(self.seconds, 1), '错误': self.error or ''}
+
+
+class JobRunner:
+    # 进程级线程池，各会话的任务队列共用
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bpa-job')
+
+    @classmethod
+    def from_env(cls):
+        # BPA_JOB_WORKERS: 同时执行的后台任务数（所有会话合计）
+        return cls(int(os.environ.get('BPA_JOB_WORKERS') or DEFAULT_WORKERS))
+
+    def submit(self, func, *args):
+        return self._executor.submit(func, *args)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def default_runner() -> JobRunner:
+    # 进程内唯一的线程池（界面脚本每次运行都会重新执行，线程池放在模块中保持不变）
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner.from_env()
+        return _runner
+
+
+class JobQueue:
+    # 单个会话的任务列表：先进先出逐个提交到 JobRunner
+    def __init__(self, runner: JobRunner, max_finished: int = DEFAULT_MAX_FINISHED):
+        self.runner = runner
+        self.max_finished = max_finished
+        self.jobs = []
+        self._pending = deque()
+        self._running = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def submit(self, label: str, kind: str, func, *args, profiler=None, **kwargs) -> Job:
+        job = Job(label, kind, func, args, kwargs, profiler)
+        with self._lock:
+            self.jobs.append(job)
+            self._pending.append(job)
+            self._prune()
+        self._kick()
+        return job
+
+    def _kick(self):
+        with self._lock:
+            if self._running is not None:
+                return
+            while self._pending:
+                job = self._pending.popleft()
+                if not job.is_finished:
+                    self._running = job
+                    break
+            else:
+                return
+        self.runner.submit(self._run, job)
+
+    def _run(self, job: Job):
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self._running = None
+            self._kick()
+
+    def _prune(self):
+        finished = [job for job in self.jobs if job.is_finished]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            self.jobs.remove(job)
+
+    def get(self, job_id: str):
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        return None
+
+    def remove(self, job_id: str):
+        with self._lock:
+            job = self.get(job_id)
+            if job is not None and job.is_finished:
+                self.jobs.remove(job)
+
+    def clear_finished(self):
+        with self._lock:
+            self.jobs = [job for job in self.jobs if not job.is_finished]
+
+    def active(self, kind: str = None) -> list:
+        # 排队或运行中的任务
+        return [job for job in self.jobs if not job.is_finished and (kind is None or job.kind == kind)]
+
+    def cancel_all(self):
+        for job in self.active():
+            job.cancel()
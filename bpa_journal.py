@@ -0,0 +1,183 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 算例修改记录：每个版本只保存该次修改的差量（卡片类型、字段、表内位置 int32、原值 / 新值 float64），
+# 不保存文件副本。任一版本都由解析好的原始算例（缓存 / 快照中的只读数据）依次重放差量得到，
+# 撤销 / 重做只移动当前版本号；撤销后再做新的修改会丢弃其后的版本
+CHANGE_COLUMNS = ['card_type', 'position', 'field', 'old', 'new']
+
+
+def _same(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    return (old == new) | (np.isnan(old) & np.isnan(new))
+
+
+class EditJournal:
+    def __init__(self, base_key: str = None):
+        # base_key 为原始文件的内容哈希，只能在同一文件解析出的算例上重放
+        self.base_key = base_key
+        self.versions = []
+        self.version = 0
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.versions)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(change['positions'].nbytes + change['old'].nbytes + change['new'].nbytes
+                   for entry in self.versions for change in entry['changes'])
+
+    @property
+    def can_undo(self) -> bool:
+        return self.version > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.version < len(self.versions)
+
+    def token(self, version: int = None) -> tuple:
+        # 标识某一版本内容的键（原始文件 + 各版本编号），用作写回结果的缓存键
+        version = self.version if version is None else version
+        return (self.base_key,) + tuple(entry['id'] for entry in self.versions[:version])
+
+    @staticmethod
+    def _state(case) -> dict:
+        # 修改前各表已修改字段的取值与标记
+        return {name: ({field: column.copy() for field, column in table.columns.items()},
+                       {field: mask.copy() for field, mask in table.edited.items()})
+                for name, table in case.cards.items() if table.edited}
+
+    @staticmethod
+    def _diff(case, before: dict) -> list:
+        changes = []
+        for name, table in case.cards.items():
+            columns, masks = before.get(name, ({}, {}))
+            for field, mask in table.edited.items():
+                old_mask = masks.get(field)
+                old = columns.get(field)
+                if old is None:
+                    old = table.base_column(field)
+                new = table.columns[field]
+                # 新标记为修改的卡，以及此前已修改、本次取值又变化的卡
+                changed = mask & ~_same(old, new)
+                changed |= mask if old_mask is None else mask & ~old_mask
+                positions = np.flatnonzero(changed).astype(np.int32)
+                if len(positions):
+                    changes.append({'card_type': name, 'field': field, 'positions': positions,
+                                    'old': old[positions].astype(np.float64), 'new': new[positions].astype(np.float64)})
+        return changes
+
+    @contextmanager
+    def record(self, case, label: str):
+        # with journal.record(case, '...') as result: 修改 case；case 须处于当前版本。
+        # 修改成功且确有变化时新增一个版本，result['version'] 为新版本号（无变化时为 None）；
+        # with 块内抛出异常时不新增版本。提交后仍可用 rollback(result) 撤回
+        result = {'version': None, 'cards': 0, 'id': None, 'previous': self.version, 'dropped': []}
+        before = self._state(case)
+        yield result
+        changes = self._diff(case, before)
+        if not changes:
+            return
+        result['dropped'] = self.versions[self.version:]
+        del self.versions[self.version:]
+        self.versions.append({
+            'id': self._next_id,
+            'label': label,
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'changes': changes,
+        })
+        result['id'] = self._next_id
+        self._next_id += 1
+        self.version = len(self.versions)
+        result['version'] = self.version
+        result['cards'] = self._card_count(changes)
+
+    def rollback(self, result: dict) -> bool:
+        # 撤回 record 刚提交的版本（如随后的写回被取消），恢复提交时丢弃的可重做版本；
+        # 该版本已不是最新的当前版本（其后又有修改或撤销 / 重做）时不撤回，返回 False
+        if result['id'] is None or not self.versions:
+            return False
+        if self.versions[-1]['id'] != result['id'] or self.version != len(self.versions):
+            return False
+        self.versions.pop()
+        self.versions.extend(result['dropped'])
+        self.version = result['previous']
+        result['version'] = None
+        return True
+
+    @staticmethod
+    def _card_count(changes: list) -> int:
+        by_type = {}
+        for change in changes:
+            by_type.setdefault(change['card_type'], []).append(change['positions'])
+        return sum(len(np.unique(np.concatenate(parts))) for parts in by_type.values())
+
+    def apply(self, case, version: int = None):
+        # 在未修改的原始算例副本上依次重放前 version 个版本（默认当前版本）的差量
+        version = self.version if version is None else version
+        if not 0 <= version <= len(self.versions):
+            raise ValueError(f"版本 {version} 不存在（共 {len(self.versions)} 个版本）")
+        for entry in self.versions[:version]:
+            for change in entry['changes']:
+                case.cards[change['card_type']].put(change['positions'], change['field'], change['new'])
+        return case
+
+    def undo(self) -> bool:
+        if not self.can_undo:
+            return False
+        self.version -= 1
+        return True
+
+    def redo(self) -> bool:
+        if not self.can_redo:
+            return False
+        self.version += 1
+        return True
+
+    def goto(self, version: int):
+        if not 0 <= version <= len(self.versions):
+            raise ValueError(f"版本 {version} 不存在（共 {len(self.versions)} 个版本）")
+        self.version = version
+
+    def clear(self):
+        self.versions.clear()
+        self.version = 0
+
+    def summary(self) -> pd.DataFrame:
+        rows = [{'版本': 0, '说明': '原始文件', '时间': '', '修改卡数': 0, '字段': '', '当前': self.version == 0}]
+        for number, entry in enumerate(self.versions, start=1):
+            rows.append({
+                '版本': number,
+                '说明': entry['label'],
+                '时间': entry['time'],
+                '修改卡数': self._card_count(entry['changes']),
+                '字段': ', '.join(dict.fromkeys(f"{c['card_type']}.{c['field']}" for c in entry['changes'])),
+                '当前': number == self.version,
+            })
+        return pd.DataFrame(rows)
+
+    def changes(self, version: int, case=None) -> pd.DataFrame:
+        # 某一版本的逐卡修改明细；给出算例时附上行号与母线名
+        entry = self.versions[version - 1]
+        frames = []
+        for change in entry['changes']:
+            frame = pd.DataFrame({
+                'card_type': change['card_type'],
+                'position': change['positions'],
+                'field': change['field'],
+                'old': change['old'],
+                'new': change['new'],
+            })
+            if case is not None:
+                table = case.cards[change['card_type']]
+                frame.insert(1, 'line', table.rows[change['positions']] + 1)
+                for column, name in enumerate(['bus_name', 'vol_rank'], start=2):
+                    if name in table.fields:
+                        frame.insert(column, name, table.column(name)[change['positions']])
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=CHANGE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,86 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import threading
+
+from cryptography.fernet import Fernet, InvalidToken
+
+MODULE_NAME = 'BPA_models'
+DEFAULT_MODEL_PATH = 'BPA_models.encrypted'
+
+# 进程级缓存：Streamlit 每次交互都会重新执行脚本，但已导入的模块常驻进程，
+# 因此解密与 exec 在每个进程内只发生一次。
+# 文件状态 (路径, mtime, 大小, 密钥摘要) -> 内容摘要；内容摘要 -> 模块
+_stat_digests = {}
+_modules = {}
+_lock = threading.Lock()
+
+
+def _digest(encrypted: bytes, key: str) -> str:
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(key.encode('utf-8')).digest())
+    h.update(encrypted)
+    return h.hexdigest()
+
+
+def _bytecode_cache_path(cache_dir: str, digest: str) -> str:
+    tag = sys.implementation.cache_tag or 'python'
+    return os.path.join(cache_dir, f"{MODULE_NAME}.{digest[:32]}.{tag}.encrypted")
+
+
+def _load_code(cipher: Fernet, encrypted: bytes, digest: str, cache_dir: str = None):
+    # 可选的磁盘字节码缓存：marshal 后仍用同一密钥加密保存，明文源码与字节码均不落盘
+    cache_path = _bytecode_cache_path(cache_dir, digest) if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return marshal.loads(cipher.decrypt(f.read()))
+        except (OSError, InvalidToken, ValueError, EOFError, TypeError):
+            pass
+
+    source = cipher.decrypt(encrypted).decode('utf-8')
+    code = compile(source, f"<{MODULE_NAME}>", 'exec')
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(cipher.encrypt(marshal.dumps(code)))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return code
+
+
+def load_encrypted_module(path: str = DEFAULT_MODEL_PATH, key: str = None, cache_dir: str = None):
+    key = key or os.environ.get('BPA_MODEL_KEY')
+    if not key:
+        raise ValueError("环境变量 BPA_MODEL_KEY 未设置")
+    if cache_dir is None:
+        cache_dir = os.environ.get('BPA_MODEL_CACHE_DIR') or None
+
+    st_info = os.stat(path)
+    stat_key = (os.path.abspath(path), st_info.st_mtime_ns, st_info.st_size,
+                hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    with _lock:
+        digest = _stat_digests.get(stat_key)
+        module = _modules.get(digest) if digest else None
+        if module is None:
+            with open(path, 'rb') as f:
+                encrypted = f.read()
+            digest = _digest(encrypted, key)
+            _stat_digests[stat_key] = digest
+            module = _modules.get(digest)
+            if module is None:
+                code = _load_code(Fernet(key.encode('utf-8')), encrypted, digest, cache_dir)
+                spec = importlib.util.spec_from_loader(MODULE_NAME, loader=None)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[MODULE_NAME] = module
+                exec(code, module.__dict__)
+                _modules[digest] = module
+        sys.modules[MODULE_NAME] = module
+        return module
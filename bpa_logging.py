@@ -0,0 +1,110 @@
+import atexit
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'UPLOAD': 20, 'WARNING': 30, 'ERROR': 40}
+DEFAULT_LOG_LEVEL = os.environ.get('BPA_LOG_LEVEL', 'INFO').upper()
+DEFAULT_LOG_FILE = "operation_log.txt"
+# 每个会话保留的日志条数
+DEFAULT_BUFFER_SIZE = 1000
+
+
+def level_no(level: str) -> int:
+    return LOG_LEVELS.get(str(level).upper(), LOG_LEVELS['INFO'])
+
+
+def format_log(msg: str, level: str = "INFO") -> str:
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{timestamp}] [{level}] {msg}"
+
+
+class BatchFileWriter:
+    # 后台线程批量追加写日志文件：消息先入队，线程一次取出队列中积压的全部消息后统一写入
+    def __init__(self, path: str = DEFAULT_LOG_FILE, batch_size: int = 500, interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="bpa-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line: str):
+        self._queue.put(line)
+
+    def _drain(self, first: str) -> list:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                return
+            batch = self._drain(first)
+            stop = None in batch
+            lines = [line for line in batch if line is not None]
+            try:
+                with open(self.path, "a", encoding='utf-8') as log_file:
+                    log_file.write("\n".join(lines) + "\n")
+            except Exception as e:
+                print(f"无法写入日志文件: {e}")
+            if stop:
+                return
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_file_writer(path: str = DEFAULT_LOG_FILE) -> BatchFileWriter:
+    # 同一进程内所有会话共用一个写线程
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = BatchFileWriter(path)
+        return writer
+
+
+class LogBuffer:
+    # 会话内定长环形日志缓冲，低于阈值级别的消息直接丢弃
+    def __init__(self, maxlen: int = DEFAULT_BUFFER_SIZE, level: str = DEFAULT_LOG_LEVEL, writer: BatchFileWriter = None):
+        self.records = deque(maxlen=maxlen)
+        self.level = level
+        self.writer = writer
+
+    def is_enabled(self, level: str) -> bool:
+        return level_no(level) >= level_no(self.level)
+
+    def log(self, msg: str, level: str = "INFO"):
+        if not self.is_enabled(level):
+            return None
+        log_message = format_log(msg, level)
+        self.records.append((level_no(level), log_message))
+        if self.writer is not None:
+            self.writer.write(log_message)
+        return log_message
+
+    def text(self, level: str = None) -> str:
+        threshold = level_no(level or self.level)
+        # 后台任务可能同时写入，先取快照再遍历
+        return "\n".join(message for no, message in list(self.records) if no >= threshold)
+
+    def __len__(self) -> int:
+        return len(self.records)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from bpa_pfo import BRANCH_COLUMNS, BUS_COLUMNS, GENERATOR_COLUMNS
+
+# 基于 extract_pfo 三张表的向量化潮流监视：支路过载、发电机无功到限、分区无功平衡。
+# 支路 / 发电机明细行目前按 bpa_synth 生成的全输出样式识别，尚未用实际程序输出核对，因此潮流监视为试验功能，
+# 默认关闭：界面设置 BPA_FLOW_MONITORS=1、批处理加 --flow-monitors 时才提取明细行并运行。
+# 文件中没有识别到所需的行时，该项监视记为不可用（见 unavailable_monitors），不当作“未发现问题”
+DEFAULT_MONITOR_SETTINGS = {
+    'overload_percent': 100.0,  # 负载率不低于该值 (%) 的支路记为过载
+    'q_limit_tolerance': 0.5,   # 发电机无功距上 / 下限不超过该值 (MVar) 即记为到限
+}
+KIND_LINE = '线路'
+KIND_TRANSFORMER = '变压器'
+LIMIT_MAX = '上限'
+LIMIT_MIN = '下限'
+OVERLOAD_COLUMNS = BRANCH_COLUMNS + ['类型']
+Q_LIMIT_COLUMNS = GENERATOR_COLUMNS + ['到限', '裕度 (MVar)']
+Q_BALANCE_COLUMNS = ['Dist', '母线数', '发电无功', '负荷无功', '并联无功', '外送无功', '未安排无功', '差额']
+SHEET_OVERLOADS = '支路过载'
+SHEET_Q_LIMITS = '发电机无功到限'
+SHEET_Q_BALANCE = '分区无功平衡'
+MONITOR_SHEETS = [SHEET_OVERLOADS, SHEET_Q_LIMITS, SHEET_Q_BALANCE]
+
+
+def _frame(table, columns: list) -> pd.DataFrame:
+    if isinstance(table, pd.DataFrame):
+        return table
+    return pd.DataFrame(table, columns=columns)
+
+
+def _has_values(table, columns: list) -> bool:
+    # 表中至少一行在给定各列上都有数值
+    if not len(table[columns[0]]):
+        return False
+    present = np.ones(len(table[columns[0]]), dtype=bool)
+    for col in columns:
+        present &= ~np.isnan(np.asarray(table[col], dtype=np.float64))
+    return bool(present.any())
+
+
+def unavailable_monitors(tables: dict) -> dict:
+    # {表名: 原因}：PFO 中没有识别到相应明细行，无法判断的监视项
+    reasons = {}
+    if not _has_values(tables['branches'], ['Loading']):
+        reasons[SHEET_OVERLOADS] = "未识别到带负载率的支路潮流行"
+    if not _has_values(tables['generators'], ['Q', 'Qmin', 'Qmax']):
+        reasons[SHEET_Q_LIMITS] = "未识别到带 Qmin / Qmax 的发电机行"
+    if not len(tables['buses']['BusName']):
+        reasons[SHEET_Q_BALANCE] = "没有母线数据"
+    return reasons
+
+
+def overloaded_branches(branches, threshold: float = DEFAULT_MONITOR_SETTINGS['overload_percent']) -> pd.DataFrame:
+    # 负载率 ≥ threshold 的支路，两端电压不同的记为变压器；同一支路在两端母线下各列一次时只保留负载率较高的一行
+    branches = _frame(branches, BRANCH_COLUMNS)
+    over = branches[branches['Loading'].to_numpy() >= threshold]
+    if over.empty:
+        return pd.DataFrame(columns=OVERLOAD_COLUMNS)
+    ends = pd.DataFrame({
+        'a': over['FromBus'].astype(str) + '|' + over['FromVoltage'].astype(str),
+        'b': over['ToBus'].astype(str) + '|' + over['ToVoltage'].astype(str),
+    })
+    swap = ends['a'] > ends['b']
+    pair = pd.DataFrame({'lo': ends['a'].where(~swap, ends['b']), 'hi': ends['b'].where(~swap, ends['a'])})
+    order = np.argsort(-over['Loading'].to_numpy(), kind='stable')
+    keep = ~pair.iloc[order].duplicated().to_numpy()
+    result = over.iloc[order[keep]].reset_index(drop=True)
+    result['类型'] = np.where(result['FromVoltage'].to_numpy() == result['ToVoltage'].to_numpy(),
+                            KIND_LINE, KIND_TRANSFORMER)
+    return result[OVERLOAD_COLUMNS]
+
+
+def generators_at_q_limit(generators, tolerance: float = DEFAULT_MONITOR_SETTINGS['q_limit_tolerance']) -> pd.DataFrame:
+    # 无功出力距上限或下限不超过 tolerance（含越限）的发电机，未给出限值的不参与判断；按裕度从小到大排列
+    generators = _frame(generators, GENERATOR_COLUMNS)
+    q = generators['Q'].to_numpy(dtype=np.float64)
+    to_max = generators['Qmax'].to_numpy(dtype=np.float64) - q
+    to_min = q - generators['Qmin'].to_numpy(dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        at_max = to_max <= tolerance
+        at_min = ~at_max & (to_min <= tolerance)
+    hit = at_max | at_min
+    result = generators[hit].copy()
+    result['到限'] = np.where(at_max[hit], LIMIT_MAX, LIMIT_MIN)
+    result['裕度 (MVar)'] = np.round(np.where(at_max[hit], to_max[hit], to_min[hit]), 2)
+    return result.sort_values('裕度 (MVar)', kind='stable').reset_index(drop=True)[Q_LIMIT_COLUMNS]
+
+
+def q_balance_by_dist(tables: dict) -> pd.DataFrame:
+    # 按分区汇总无功 (MVar)：发电、负荷、并联无功（容性为正）、经联络支路流出本分区的无功、未安排无功；
+    # 差额 = 发电 + 并联 − 负荷 − 外送，即区内支路无功损耗与充电功率等未单列部分的净值。
+    # 支路对侧母线按 (母线名, 基准电压) 查找所属分区，对侧不在结果中的支路不计入外送。
+    # 没有识别到任何发电机 / 支路行时，发电无功 / 外送无功（及差额）留空，而不是记为 0
+    buses = _frame(tables['buses'], BUS_COLUMNS)
+    generators = _frame(tables['generators'], GENERATOR_COLUMNS)
+    branches = _frame(tables['branches'], BRANCH_COLUMNS)
+    if buses.empty:
+        return pd.DataFrame(columns=Q_BALANCE_COLUMNS)
+
+    by_bus = buses.groupby('Dist', sort=True, observed=True)
+    balance = pd.DataFrame({
+        '母线数': by_bus.size(),
+        '负荷无功': by_bus['LoadQ'].sum(),
+        '并联无功': by_bus['ShuntQ'].sum(),
+        '未安排无功': by_bus['UnallocatedReactivePower'].sum(),
+    })
+    balance['发电无功'] = generators.groupby('Dist', observed=True)['Q'].sum()
+
+    lookup = buses[['BusName', 'RatedVoltage', 'Dist']].drop_duplicates(['BusName', 'RatedVoltage'])
+    far = pd.merge(branches[['ToBus', 'ToVoltage', 'Dist', 'Q']], lookup,
+                   left_on=['ToBus', 'ToVoltage'], right_on=['BusName', 'RatedVoltage'],
+                   how='inner', suffixes=('', '_to'), sort=False)
+    ties = far[far['Dist'].astype(str).to_numpy() != far['Dist_to'].astype(str).to_numpy()]
+    balance['外送无功'] = ties.groupby('Dist', observed=True)['Q'].sum()
+
+    fill = {}
+    if len(generators):
+        fill['发电无功'] = 0.0
+    if len(branches):
+        fill['外送无功'] = 0.0
+    balance = balance.fillna(fill)
+    balance['差额'] = balance['发电无功'] + balance['并联无功'] - balance['负荷无功'] - balance['外送无功']
+    numeric = Q_BALANCE_COLUMNS[2:]
+    balance[numeric] = balance[numeric].round(2)
+    return balance.reset_index()[Q_BALANCE_COLUMNS]
+
+
+def run_monitors(tables: dict, settings: dict = None) -> dict:
+    # 返回 {表名: DataFrame}，可直接作为导出的工作表；不可用的监视项（unavailable_monitors）不在其中
+    settings = {**DEFAULT_MONITOR_SETTINGS, **(settings or {})}
+    monitors = {
+        SHEET_OVERLOADS: lambda: overloaded_branches(tables['branches'], settings['overload_percent']),
+        SHEET_Q_LIMITS: lambda: generators_at_q_limit(tables['generators'], settings['q_limit_tolerance']),
+        SHEET_Q_BALANCE: lambda: q_balance_by_dist(tables),
+    }
+    unavailable = unavailable_monitors(tables)
+    return {sheet: build() for sheet, build in monitors.items() if sheet not in unavailable}
@@ -0,0 +1,436 @@
+import io
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BUS_ENDINGS = ['B', 'BQ', 'BE', 'BD', 'BA', 'BS', 'BM', '-PQ']
+PFO_COLUMNS = ['BusName', 'RatedVoltage', 'ActualVoltage', 'Dist', 'Owner', 'UnallocatedReactivePower']
+# 完整提取（extract_pfo）时的三张表：母线表在 PFO_COLUMNS 之外附带母线类型、相角、负荷与并联无功；
+# 支路表每行为母线下列出的一条支路潮流（从该母线看），Dist / Owner 为该母线的分区与所有者；
+# 数值列缺失时为 NaN（如未输出负载率的支路）
+BUS_COLUMNS = PFO_COLUMNS + ['BusType', 'Angle', 'LoadP', 'LoadQ', 'ShuntQ']
+BRANCH_COLUMNS = ['FromBus', 'FromVoltage', 'ToBus', 'ToVoltage', 'Dist', 'Owner', 'P', 'Q', 'Loss', 'Loading']
+GENERATOR_COLUMNS = ['BusName', 'RatedVoltage', 'Dist', 'Owner', 'P', 'Q', 'Qmin', 'Qmax']
+PFO_TABLES = {'buses': BUS_COLUMNS, 'branches': BRANCH_COLUMNS, 'generators': GENERATOR_COLUMNS}
+
+STATUS_LOW = '低压'
+STATUS_HIGH = '高压'
+STATUS_ALERT = '预警高压'
+STATUS_NORMAL = '正常'
+STATUS_EXCLUDED = '排除'
+ANOMALY_STATUSES = [STATUS_LOW, STATUS_HIGH, STATUS_ALERT]
+_STATUS_LABELS = np.array([STATUS_LOW, STATUS_HIGH, STATUS_ALERT, STATUS_NORMAL, STATUS_EXCLUDED], dtype=object)
+
+# 电压等级阈值表：标称电压 ± 带宽内的节点按该行的上下限与预警下限分类，
+# alert_min 为空表示该等级不设预警；未落入任何等级的节点记为“排除”
+VOLTAGE_LEVEL_COLUMNS = ['label', 'nominal', 'band', 'min', 'max', 'alert_min']
+DEFAULT_VOLTAGE_LEVELS = pd.DataFrame([
+    {'label': '500 kV', 'nominal': 500.0, 'band': 30.0, 'min': 500.0, 'max': 500.0 * 1.10, 'alert_min': 500.0 * 1.052},
+    {'label': '220 kV', 'nominal': 230.0, 'band': 25.0, 'min': 220.0 * 0.95, 'max': 220.0 * 1.10, 'alert_min': np.nan},
+], columns=VOLTAGE_LEVEL_COLUMNS)
+# 预警判断的容差 (kV)
+_ALERT_TOLERANCE = 0.1
+
+# 与 str.splitlines 一致的换行字节（均小于 0x40，不会出现在 GBK 双字节字符内部）
+_LINE_BREAK = re.compile(rb'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e]')
+_SPECIAL_BREAK = re.compile(rb'[\x0b\x0c\x1c\x1d\x1e]')
+_UNALLOCATED_MARK = '未安排无功'.encode('gbk')
+_UNALLOCATED_RE = re.compile(r'([-]?\d+\.\d+|\d+\.\d+)\s*未安排无功')
+# 母线行后最多向下查找的行数（含母线行本身）
+_UNALLOCATED_WINDOW = 10
+# 并行解析时每块的最小字节数，块太小时进程间传输的开销大于解析本身
+MIN_CHUNK_BYTES = 4 * 1024 * 1024
+# 报告解析进度的间隔行数
+PROGRESS_LINES = 50000
+# 母线行之后的明细行：支路行以 8 个空格开头、第 9 列起为对侧母线名与基准电压；
+# 发电 / 并联无功行缩进更深，以标记文字开头；数值按单位识别（“MW loss” 为损耗，“%” 为负载率）
+_DETAIL_INDENT = b' ' * 8
+_GENERATOR_MARK = '发电'.encode('gbk')
+_SHUNT_MARK = '并联无功'.encode('gbk')
+_QUANTITY = re.compile(rb'(-?\d+\.\d+)\s*(MVAR|MW loss|MW|%)')
+# 支路行按固定顺序一次匹配：有功、无功，及可选的损耗与负载率
+_BRANCH_FLOW = re.compile(rb'(-?\d+\.\d+)\s*MW\s+(-?\d+\.\d+)\s*MVAR(?:\s+(-?\d+\.\d+)\s*MW loss)?(?:\s+(-?\d+\.\d+)\s*%)?')
+_Q_LIMIT = re.compile(rb'(Qmin|Qmax)\s*(-?\d+\.\d+)')
+_ANGLE = re.compile(rb'kV/\s*(-?\d+\.\d+)')
+
+
+def iter_lines(content: bytes):
+    # 只含 \r\n / \n 换行时直接用 BytesIO 逐行迭代，含分页符等特殊换行时按正则切分
+    if _SPECIAL_BREAK.search(content) is None and content.count(b'\r') == content.count(b'\r\n'):
+        for raw in io.BytesIO(content):
+            yield raw.rstrip(b'\r\n')
+        return
+    start = 0
+    for match in _LINE_BREAK.finditer(content):
+        yield content[start:match.start()]
+        start = match.end()
+    if start < len(content):
+        yield content[start:]
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode('gbk', errors='ignore')
+
+
+def is_bus_line(line: bytes) -> bool:
+    # 行尾 10 个字符内出现母线类型标记；尾部全为 ASCII 时直接在字节上判断
+    tail = line.strip()[-20:]
+    if b'B' not in tail and b'-PQ' not in tail:
+        return False
+    if tail.isascii():
+        tail = tail[-10:]
+        return b'B' in tail or b'-PQ' in tail
+    text = _decode(line).strip()[-10:]
+    return any(ending in text for ending in BUS_ENDINGS)
+
+
+def extract_actual_voltage(line: bytes) -> str:
+    kv_index = line.find(b'kV/')
+    if kv_index < 0:
+        return ''
+    field = line[kv_index - 7:kv_index]
+    if kv_index >= 7 and field.isascii():
+        return field.decode('ascii').strip()
+    text = _decode(line)
+    kv_index = text.index('kV/')
+    return text[kv_index - 7:kv_index].strip()
+
+
+def parse_unallocated_q(line: bytes):
+    match = _UNALLOCATED_RE.search(_decode(line).strip())
+    return float(match.group(1)) if match else None
+
+
+def parse_pfo_data(content: bytes, workers: int = 1, chunk_bytes: int = None, progress=None) -> dict:
+    # workers > 1 时按安全边界分块，在进程池中并行解析后按顺序拼接，结果与单进程解析完全一致；
+    # workers 为 0 / None 时取 CPU 核数。文件不足两块时仍在当前进程内解析。
+    # progress(已解析行数, 总行数) 用于报告进度（总行数按 \n 计，为近似值），其抛出的异常会中止解析
+    return _parse(content, workers, chunk_bytes, progress, full=False)['buses']
+
+
+def extract_pfo(content: bytes, workers: int = 1, chunk_bytes: int = None, progress=None) -> dict:
+    # 一遍扫描同时提取母线、支路与发电机，返回 {'buses': 列, 'branches': 列, 'generators': 列}（列见 PFO_TABLES）；
+    # 母线表包含 parse_pfo_data 的全部列且取值相同，可直接用于电压监测。分块并行与进度参数同 parse_pfo_data。
+    # 支路 / 发电 / 并联无功明细行按 bpa_synth 的全输出样式识别，尚未用实际程序输出核对，属试验功能：
+    # 界面与批处理只在显式开启潮流监视（BPA_FLOW_MONITORS / --flow-monitors）时调用，默认仅用 parse_pfo_data
+    return _parse(content, workers, chunk_bytes, progress, full=True)
+
+
+def _parse(content: bytes, workers: int, chunk_bytes: int, progress, full: bool) -> dict:
+    workers = workers or os.cpu_count() or 1
+    total = content.count(b'\n') + 1 if progress is not None else 0
+    if workers <= 1:
+        return _parse_chunk(content, progress, total, full)
+    if chunk_bytes is None:
+        # 每个进程分到约 4 块，各进程耗时不均时可以互相补位
+        chunk_bytes = max(MIN_CHUNK_BYTES, len(content) // (workers * 4) + 1)
+    bounds = split_chunks(content, chunk_bytes)
+    if len(bounds) <= 1:
+        return _parse_chunk(content, progress, total, full)
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(bounds)))
+    try:
+        futures = [pool.submit(_parse_chunk, content[start:stop], None, 0, full) for start, stop in bounds]
+        parts = []
+        done = 0
+        for future, (start, stop) in zip(futures, bounds):
+            parts.append(future.result())
+            if progress is not None:
+                done += content.count(b'\n', start, stop)
+                progress(done, total)
+    except BaseException:
+        # 出错或被取消时不再等待尚未开始的块
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return {table: {col: np.concatenate([part[table][col] for part in parts]) for col in parts[0][table]}
+            for table in parts[0]}
+
+
+def _is_boundary(line: bytes) -> bool:
+    # 不含“未安排无功”的母线行会清空解析状态（上一母线不再等待其未安排无功行），
+    # 从这样的行开始的块与整体扫描时的状态相同；行内含特殊换行符时不作为边界
+    return (_UNALLOCATED_MARK not in line and _SPECIAL_BREAK.search(line) is None
+            and b'\r' not in line and is_bus_line(line))
+
+
+def split_chunks(content: bytes, chunk_bytes: int) -> list:
+    # 在每个目标位置之后找到第一个可作为边界的行首，返回 [(start, stop)]；
+    # 只在 \n 之后切分，\r\n 不会被拆开
+    bounds = []
+    start = 0
+    size = len(content)
+    while start < size:
+        pos = start + chunk_bytes
+        cut = size
+        while pos < size:
+            line_start = content.find(b'\n', pos)
+            if line_start < 0:
+                break
+            line_start += 1
+            line_end = content.find(b'\n', line_start)
+            line_end = size if line_end < 0 else line_end
+            line = content[line_start:line_end]
+            if _is_boundary(line[:-1] if line.endswith(b'\r') else line):
+                cut = line_start
+                break
+            pos = line_end
+        bounds.append((start, cut))
+        start = cut
+    return bounds
+
+
+def columns_equal(a: dict, b: dict, columns: list = PFO_COLUMNS) -> bool:
+    # 两次解析结果逐列比较（浮点列 NaN 视为相等）
+    for col in columns:
+        x, y = np.asarray(a[col]), np.asarray(b[col])
+        if x.shape != y.shape:
+            return False
+        if x.dtype == object or y.dtype == object:
+            if not np.array_equal(x, y):
+                return False
+        elif not np.array_equal(x, y, equal_nan=True):
+            return False
+    return True
+
+
+def tables_equal(a: dict, b: dict) -> bool:
+    # 两次 extract_pfo 的结果逐表逐列比较
+    return all(columns_equal(a[table], b[table], columns) for table, columns in PFO_TABLES.items())
+
+
+def _quantities(line: bytes) -> dict:
+    # {单位: 数值}，同一单位取行内第一个
+    values = {}
+    for number, unit in _QUANTITY.findall(line):
+        values.setdefault(unit, float(number))
+    return values
+
+
+def _parse_chunk(content: bytes, progress=None, total: int = 0, full: bool = False) -> dict:
+    # 单遍状态机：逐行扫描，母线行直接按字节切片取定长字段，
+    # 其后窗口内的“未安排无功”行归属当前母线；full 时母线行之后的支路 / 发电 / 并联无功行同样归属当前母线
+    names, dists, owners = [], [], []
+    rated = array('d')
+    actual = array('d')
+    unallocated = array('d')
+    bus_line_no = None
+    awaiting_q = False
+    # 完整提取时的附加列；current 为当前母线在母线表中的下标，母线行无效时为 None，其后的明细行不提取
+    # 支路只记录所属母线的下标与对侧母线名原始字节，结束后统一取母线列、按不同取值解码
+    bus_types = []
+    bus_extra = {col: array('d') for col in ('Angle', 'LoadP', 'LoadQ', 'ShuntQ')}
+    branch_rows = array('q')
+    branch_to = []
+    branch_num = {col: array('d') for col in ('ToVoltage', 'P', 'Q', 'Loss', 'Loading')}
+    gen_rows = []
+    gen_num = {col: array('d') for col in ('P', 'Q', 'Qmin', 'Qmax')}
+    current = None
+
+    for line_no, line in enumerate(iter_lines(content)):
+        if progress is not None and not line_no % PROGRESS_LINES:
+            progress(line_no, total)
+        if awaiting_q:
+            if line_no - bus_line_no >= _UNALLOCATED_WINDOW:
+                awaiting_q = False
+            elif _UNALLOCATED_MARK in line:
+                q = parse_unallocated_q(line)
+                if q is not None:
+                    unallocated[-1] = q
+                awaiting_q = False
+
+        if not is_bus_line(line):
+            if full and current is not None and line.startswith(_DETAIL_INDENT):
+                if line[8:9] != b' ':
+                    match = _BRANCH_FLOW.search(line, 22)
+                    if match is None:
+                        continue
+                    try:
+                        to_voltage = float(line[16:22])
+                    except ValueError:
+                        continue
+                    p, q, loss, loading = match.groups()
+                    branch_rows.append(current)
+                    branch_to.append(line[8:16])
+                    branch_num['ToVoltage'].append(to_voltage)
+                    branch_num['P'].append(float(p))
+                    branch_num['Q'].append(float(q))
+                    branch_num['Loss'].append(float(loss) if loss else np.nan)
+                    branch_num['Loading'].append(float(loading) if loading else np.nan)
+                else:
+                    body = line.lstrip()
+                    if body.startswith(_GENERATOR_MARK):
+                        values = _quantities(line)
+                        limits = dict(_Q_LIMIT.findall(line))
+                        gen_rows.append(current)
+                        gen_num['P'].append(values.get(b'MW', np.nan))
+                        gen_num['Q'].append(values.get(b'MVAR', np.nan))
+                        gen_num['Qmin'].append(float(limits[b'Qmin']) if b'Qmin' in limits else np.nan)
+                        gen_num['Qmax'].append(float(limits[b'Qmax']) if b'Qmax' in limits else np.nan)
+                    elif body.startswith(_SHUNT_MARK):
+                        bus_extra['ShuntQ'][current] = _quantities(line).get(b'MVAR', np.nan)
+            continue
+
+        bus_line_no = line_no
+        awaiting_q = False
+        current = None
+        actual_voltage = extract_actual_voltage(line)
+        if not actual_voltage:
+            continue
+        try:
+            rated_voltage_float = float(_decode(line[8:14]).strip())
+            actual_voltage_float = float(actual_voltage)
+        except ValueError:
+            continue
+
+        names.append(_decode(line[0:8]).strip())
+        dists.append(_decode(line[36:38]).strip())
+        owners.append(_decode(line[38:40]).strip())
+        rated.append(rated_voltage_float)
+        actual.append(actual_voltage_float)
+        unallocated.append(np.nan)
+        awaiting_q = True
+        if _UNALLOCATED_MARK in line:
+            q = parse_unallocated_q(line)
+            if q is not None:
+                unallocated[-1] = q
+            awaiting_q = False
+        if full:
+            current = len(names) - 1
+            tail = line.split()
+            bus_types.append(_decode(tail[-1]) if tail else '')
+            match = _ANGLE.search(line)
+            bus_extra['Angle'].append(float(match.group(1)) if match else np.nan)
+            values = _quantities(line[line.find(b'kV/'):])
+            bus_extra['LoadP'].append(values.get(b'MW', np.nan))
+            bus_extra['LoadQ'].append(values.get(b'MVAR', np.nan))
+            bus_extra['ShuntQ'].append(np.nan)
+
+    buses = {
+        'BusName': np.array(names, dtype=object),
+        'RatedVoltage': np.frombuffer(rated, dtype=np.float64),
+        'ActualVoltage': np.frombuffer(actual, dtype=np.float64),
+        'Dist': np.array(dists, dtype=object),
+        'Owner': np.array(owners, dtype=object),
+        'UnallocatedReactivePower': np.frombuffer(unallocated, dtype=np.float64),
+    }
+    if not full:
+        return {'buses': buses}
+    buses['BusType'] = np.array(bus_types, dtype=object)
+    buses.update({col: np.frombuffer(values, dtype=np.float64) for col, values in bus_extra.items()})
+    rows = np.frombuffer(branch_rows, dtype=np.int64)
+    branches = {'FromBus': buses['BusName'][rows], 'FromVoltage': buses['RatedVoltage'][rows],
+                'Dist': buses['Dist'][rows], 'Owner': buses['Owner'][rows]}
+    uniques, codes = np.unique(np.array(branch_to, dtype=object), return_inverse=True)
+    branches['ToBus'] = np.array([_decode(name).strip() for name in uniques], dtype=object)[codes]
+    branches.update({col: np.frombuffer(values, dtype=np.float64) for col, values in branch_num.items()})
+    rows = np.array(gen_rows, dtype=np.int64)
+    generators = {col: buses[col][rows] for col in ('BusName', 'RatedVoltage', 'Dist', 'Owner')}
+    generators.update({col: np.frombuffer(values, dtype=np.float64) for col, values in gen_num.items()})
+    return {
+        'buses': {col: buses[col] for col in BUS_COLUMNS},
+        'branches': {col: branches[col] for col in BRANCH_COLUMNS},
+        'generators': {col: generators[col] for col in GENERATOR_COLUMNS},
+    }
+
+
+def normalize_voltage_levels(levels: pd.DataFrame) -> pd.DataFrame:
+    # 清洗用户编辑的阈值表：数值列转浮点，缺少必填项的行丢弃，空标签按标称电压补齐
+    levels = pd.DataFrame(levels).reindex(columns=VOLTAGE_LEVEL_COLUMNS)
+    for col in VOLTAGE_LEVEL_COLUMNS[1:]:
+        levels[col] = pd.to_numeric(levels[col], errors='coerce')
+    levels = levels.dropna(subset=['nominal', 'band', 'min', 'max']).reset_index(drop=True)
+    missing = levels['label'].isna() | (levels['label'].astype(str).str.strip() == '')
+    levels.loc[missing, 'label'] = levels.loc[missing, 'nominal'].map(lambda v: f"{v:g} kV")
+    levels['label'] = levels['label'].astype(str).str.strip()
+    return levels
+
+
+def classify_voltage(rated: np.ndarray, actual: np.ndarray, levels: pd.DataFrame = DEFAULT_VOLTAGE_LEVELS) -> tuple:
+    # 向量化分类：按阈值表逐行生成带宽掩码，np.select 取首个命中的等级，返回 (等级, 状态, 偏差%)
+    rated = np.asarray(rated, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    bands = [np.abs(rated - row.nominal) < row.band for row in levels.itertuples()]
+    level_idx = np.select(bands, np.arange(len(levels)), default=-1) if bands else np.full(len(rated), -1)
+    in_level = level_idx >= 0
+    take = np.where(in_level, level_idx, 0)
+
+    def per_bus(col):
+        values = levels[col].to_numpy(dtype=np.float64) if len(levels) else np.zeros(1)
+        return np.where(in_level, values[take], np.nan)
+
+    min_v, max_v, alert_v = per_bus('min'), per_bus('max'), per_bus('alert_min')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = in_level & (actual < min_v)
+        high = in_level & ~low & (actual > max_v)
+        alert = (in_level & ~low & ~high
+                 & (actual >= alert_v - _ALERT_TOLERANCE) & (actual <= max_v + _ALERT_TOLERANCE))
+        status_code = np.select([low, high, alert, in_level], [0, 1, 2, 3], default=4)
+        deviation = np.select([low, high, alert],
+                              [(min_v - actual) / min_v * 100,
+                               (actual - max_v) / max_v * 100,
+                               (actual - alert_v) / alert_v * 100], default=0.0)
+    labels = levels['label'].to_numpy(dtype=object) if len(levels) else np.array([''], dtype=object)
+    level = np.where(in_level, labels[take], '')
+    return level, _STATUS_LABELS[status_code], deviation
+
+
+def check_voltage_anomalies(columns: dict, levels: pd.DataFrame = DEFAULT_VOLTAGE_LEVELS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    all_nodes_df = pd.DataFrame(columns, columns=PFO_COLUMNS)
+    if all_nodes_df.empty:
+        return all_nodes_df, all_nodes_df
+
+    all_nodes_df['RatedVoltage'] = pd.to_numeric(all_nodes_df['RatedVoltage'], errors='coerce')
+    all_nodes_df['ActualVoltage'] = pd.to_numeric(all_nodes_df['ActualVoltage'], errors='coerce')
+    all_nodes_df['UnallocatedReactivePower'] = pd.to_numeric(all_nodes_df['UnallocatedReactivePower'], errors='coerce')
+    all_nodes_df = all_nodes_df.dropna(subset=['RatedVoltage', 'ActualVoltage']).copy()
+
+    level, status, deviation = classify_voltage(
+        all_nodes_df['RatedVoltage'].to_numpy(), all_nodes_df['ActualVoltage'].to_numpy(), levels
+    )
+    all_nodes_df['电压等级'] = level
+    all_nodes_df['状态'] = status
+    all_nodes_df['偏差 (%)'] = np.round(deviation, 2)
+    anomalies_df = all_nodes_df[all_nodes_df['状态'].isin(ANOMALY_STATUSES)].copy()
+    return all_nodes_df, anomalies_df
+
+
+# 会话中保留的节点表：文本列为分类型，浮点列为 float32；状态按固定顺序编码
+NODE_CATEGORY_COLUMNS = ['BusName', 'Dist', 'Owner', '电压等级', '状态']
+_NODE_STATUS_DTYPE = pd.CategoricalDtype(list(_STATUS_LABELS))
+
+
+def compact_nodes(df: pd.DataFrame) -> pd.DataFrame:
+    # 节点表压缩存储（母线名、分区等重复文本只存一份类别），行索引不变；导出与计算时用 widen_floats 还原浮点列
+    if df is None:
+        return None
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col == '状态':
+            series = series.astype(_NODE_STATUS_DTYPE)
+        elif col in NODE_CATEGORY_COLUMNS:
+            series = series.astype('category')
+        elif series.dtype == np.float64:
+            series = series.astype(np.float32)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def widen_floats(df: pd.DataFrame) -> pd.DataFrame:
+    # float32 列还原为 float64，取 float32 的最短十进制表示（248.8 而不是 248.8000030517578），
+    # 与压缩前解析得到的值一致；相同取值只转换一次
+    if df is None:
+        return None
+    columns = [col for col in df.columns if df[col].dtype == np.float32]
+    if not columns:
+        return df
+    df = df.copy()
+    for col in columns:
+        codes, uniques = pd.factorize(df[col].to_numpy())
+        values = np.append(np.asarray(uniques).astype(str).astype(np.float64), np.nan)
+        df[col] = values[codes]
+    return df
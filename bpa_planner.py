@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from bpa_pfo import STATUS_ALERT, STATUS_HIGH, STATUS_LOW, widen_floats
+
+# 调整方向（与“关于”页一致）：低压增加 shunt_var（容性），高压 / 预警高压减少 shunt_var（感性）；
+# 未安排无功按其符号补到 shunt_var，与电压方向一致时取二者中较大的调整量
+PLAN_COLUMNS = ['BusName', 'kV', 'Dist', 'Owner', '状态', '偏差 (%)', 'UnallocatedReactivePower',
+                'shunt_var_old', 'delta', 'shunt_var_new', 'position', 'row']
+DEFAULT_PLAN_SETTINGS = {
+    'min_step': 10.0,       # 电压异常节点的最小调整量 (MVar)
+    'per_percent': 10.0,    # 每 1% 电压偏差对应的调整量 (MVar)
+    'max_step': 100.0,      # 单张 B卡的最大调整量 (MVar)
+    'include_alert': True,
+    'include_unallocated': True,
+}
+# shunt_var 字段占 4 列，写回时必须能放下，调整量取整到 1 MVar
+SHUNT_VAR_RANGE = (-999.0, 9999.0)
+
+
+def _join_keys(names, kv) -> pd.DataFrame:
+    return pd.DataFrame({
+        'name': pd.Series(names, dtype=object).astype(str).str.strip().to_numpy(dtype=object),
+        'kv': np.round(np.asarray(kv, dtype=np.float64), 1),
+    })
+
+
+def plan_shunt_adjustments(case, all_nodes_df: pd.DataFrame, settings: dict = None) -> pd.DataFrame:
+    # 取电压异常或存在未安排无功的母线，按 (母线名, 基准电压) 与 DAT 中的 B卡做哈希连接，
+    # 一次性向量化计算每张命中 B卡的 shunt_var 调整量
+    settings = {**DEFAULT_PLAN_SETTINGS, **(settings or {})}
+    if all_nodes_df is None or all_nodes_df.empty or not len(case.table):
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+
+    statuses = [STATUS_LOW, STATUS_HIGH] + ([STATUS_ALERT] if settings['include_alert'] else [])
+    wanted = all_nodes_df['状态'].isin(statuses)
+    if settings['include_unallocated']:
+        wanted |= all_nodes_df['UnallocatedReactivePower'].notnull()
+    # 会话中的节点表为 float32 存储，还原后再计算调整量
+    buses = widen_floats(all_nodes_df[wanted].drop_duplicates(['BusName', 'RatedVoltage']))
+    if buses.empty:
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+
+    bus_keys = _join_keys(buses['BusName'], buses['RatedVoltage'])
+    bus_keys['bus'] = np.arange(len(buses))
+    table = case.table
+    card_keys = _join_keys(table.bus_name, table.vol_rank)
+    card_keys['position'] = np.arange(len(table))
+    joined = pd.merge(bus_keys, card_keys, on=['name', 'kv'], how='inner', sort=False)
+    if joined.empty:
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+
+    bus_idx = joined['bus'].to_numpy()
+    positions = joined['position'].to_numpy()
+    status = buses['状态'].to_numpy(dtype=object)[bus_idx]
+    deviation = buses['偏差 (%)'].to_numpy(dtype=np.float64)[bus_idx]
+    unallocated = buses['UnallocatedReactivePower'].to_numpy(dtype=np.float64)[bus_idx]
+    if not settings['include_unallocated']:
+        unallocated = np.full(len(bus_idx), np.nan)
+    old = table.shunt_var[positions]
+
+    sign = np.select([status == STATUS_LOW, np.isin(status, [STATUS_HIGH, STATUS_ALERT])], [1.0, -1.0], default=0.0)
+    if not settings['include_alert']:
+        sign = np.where(status == STATUS_ALERT, 0.0, sign)
+    magnitude = np.clip(settings['per_percent'] * np.nan_to_num(deviation), settings['min_step'], None)
+    q = np.nan_to_num(unallocated)
+    delta = np.where(
+        sign == 0, q,
+        np.where(np.sign(q) == sign, sign * np.maximum(magnitude, np.abs(q)), sign * magnitude),
+    )
+    delta = np.round(np.clip(delta, -settings['max_step'], settings['max_step']))
+    new = np.clip(old + delta, *SHUNT_VAR_RANGE)
+
+    plan = pd.DataFrame({
+        'BusName': table.bus_name[positions],
+        'kV': table.vol_rank[positions],
+        'Dist': table.dist[positions],
+        'Owner': table.owner[positions],
+        '状态': status,
+        '偏差 (%)': deviation,
+        'UnallocatedReactivePower': unallocated,
+        'shunt_var_old': old,
+        'delta': np.round(new - old, 2),
+        'shunt_var_new': new,
+        'position': positions,
+        'row': table.rows[positions],
+    }, columns=PLAN_COLUMNS)
+    # 原值无法解析或调整量为 0 的卡片不进入方案
+    plan = plan[~np.isnan(old) & (plan['delta'].to_numpy() != 0)]
+    return plan.sort_values('row', kind='stable').reset_index(drop=True)
+
+
+def apply_shunt_plan(case, plan: pd.DataFrame, log=None) -> int:
+    # 将方案中的新值写入 B卡表，返回修改的卡片数
+    if plan is None or plan.empty:
+        if log:
+            log("调整方案为空，未修改任何 B卡")
+        return 0
+    changed = case.table.assign(plan['position'].to_numpy(), 'shunt_var', plan['shunt_var_new'].to_numpy())
+    if log:
+        up = int((plan['delta'] > 0).sum())
+        log(f"按调整方案修改 B卡 shunt_var: 共 {changed} 张（增加 {up} 张，减少 {changed - up} 张），"
+            f"合计 {plan['delta'].sum():.2f} MVar")
+        sample = ", ".join(plan['BusName'].head(20))
+        log(f"调整方案涉及母线（前 20 个）: {sample}", level="DEBUG")
+    return changed
@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 分阶段性能记录：每个阶段记录耗时 (s)、Python 堆内存峰值 (MB，tracemalloc 统计，含 NumPy 数组)、
+# 进程最大常驻内存 (MB) 以及阶段自报的数量（卡片数、母线数、修改数等）。
+# 库代码调用模块级 stage()，只有在 recording() 范围内才会写入当前 Profiler，否则不做任何记录；
+# tracemalloc 为进程级开关且会拖慢纯 Python 代码，只在 trace_memory=True 时开启
+DEFAULT_MAX_RECORDS = 500
+RECORD_FIELDS = ['stage', 'seconds', 'peak_mb', 'max_rss_mb', 'time']
+
+_current = ContextVar('bpa_profiler', default=None)
+_hooks = []
+_trace_lock = threading.Lock()
+_trace_users = 0
+
+
+def _max_rss_mb():
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节；Windows 无 resource 模块
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024 * 1024 if rss > 1 << 32 else 1024
+    return round(rss / scale, 1)
+
+
+def _start_tracing():
+    global _trace_users
+    with _trace_lock:
+        if not _trace_users and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _trace_users += 1
+
+
+def _stop_tracing():
+    global _trace_users
+    with _trace_lock:
+        _trace_users -= 1
+        if not _trace_users and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def add_hook(func):
+    # 每条阶段记录生成后调用 func(record)，用于把线上运行的数据汇总到外部（如 JSON Lines 文件）
+    if func not in _hooks:
+        _hooks.append(func)
+    return func
+
+
+def remove_hook(func):
+    if func in _hooks:
+        _hooks.remove(func)
+
+
+def jsonl_hook(path: str):
+    lock = threading.Lock()
+
+    def write(record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    return write
+
+
+class Profiler:
+    def __init__(self, trace_memory: bool = False, max_records: int = DEFAULT_MAX_RECORDS, labels: dict = None):
+        self.trace_memory = trace_memory
+        self.max_records = max_records
+        # 附加到每条记录上的固定字段（如文件名、规模）
+        self.labels = dict(labels or {})
+        self.records = []
+        # 嵌套阶段栈按线程区分：后台任务与界面脚本可能同时写入同一 Profiler
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name: str, **counts):
+        # with profiler.stage('parse_dat') as record: ...; record['cards'] = n
+        # 嵌套阶段的内存峰值会计入外层阶段
+        record = dict(counts)
+        tracing = self.trace_memory
+        frame = {'child_peak': 0, 'start': 0}
+        if tracing:
+            _start_tracing()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent['child_peak'] = max(parent['child_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start'] = current
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            peak_mb = None
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                if self._stack:
+                    parent = self._stack[-1]
+                    parent['child_peak'] = max(parent['child_peak'], peak)
+                peak_mb = round((peak - frame['start']) / 1024 / 1024, 2)
+                _stop_tracing()
+            self._add({
+                **self.labels,
+                'stage': name,
+                'seconds': round(seconds, 4),
+                'peak_mb': peak_mb,
+                'max_rss_mb': _max_rss_mb(),
+                'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                **record,
+            })
+
+    def run(self, name: str, func, *args, counts=None, **kwargs):
+        with recording(self):
+            return run(name, func, *args, counts=counts, **kwargs)
+
+    def _add(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if len(self.records) > self.max_records:
+                del self.records[:len(self.records) - self.max_records]
+        for hook in list(_hooks):
+            hook(record)
+
+    def clear(self):
+        self.records.clear()
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame(self.records)
+        if frame.empty:
+            return pd.DataFrame(columns=RECORD_FIELDS)
+        first = [c for c in list(self.labels) + RECORD_FIELDS if c in frame.columns]
+        return frame[first + [c for c in frame.columns if c not in first]]
+
+    def summary(self) -> pd.DataFrame:
+        return summarize(self.records)
+
+    def to_json(self) -> str:
+        return json.dumps(self.records, ensure_ascii=False, indent=2, default=str)
+
+
+def summarize(records: list) -> pd.DataFrame:
+    # 按阶段汇总：次数、总耗时、平均 / 最大耗时、最大内存峰值
+    frame = pd.DataFrame(records)
+    if frame.empty:
+        return pd.DataFrame(columns=['stage', 'runs', 'total_s', 'mean_s', 'max_s', 'peak_mb'])
+    grouped = frame.groupby('stage', sort=False)
+    summary = pd.DataFrame({
+        'runs': grouped.size(),
+        'total_s': grouped['seconds'].sum().round(4),
+        'mean_s': grouped['seconds'].mean().round(4),
+        'max_s': grouped['seconds'].max().round(4),
+        'peak_mb': grouped['peak_mb'].max() if 'peak_mb' in frame else None,
+    }).reset_index()
+    return summary.sort_values('total_s', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def load_records(path: str) -> list:
+    # 读取 to_json() 输出的 JSON 数组或 jsonl_hook 写出的 JSON Lines
+    with open(path, encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def compare(baseline: list, current: list, by: list = None) -> pd.DataFrame:
+    # 两组记录按阶段（及 by 中的字段，如 size）对比平均耗时与内存峰值，ratio > 1 表示变慢
+    keys = ['stage'] + list(by or [])
+
+    def mean(records):
+        frame = pd.DataFrame(records)
+        if frame.empty:
+            return pd.DataFrame(columns=keys + ['seconds', 'peak_mb'])
+        if 'peak_mb' not in frame:
+            frame['peak_mb'] = None
+        frame['peak_mb'] = pd.to_numeric(frame['peak_mb'], errors='coerce')
+        return frame.groupby(keys, sort=False)[['seconds', 'peak_mb']].mean().reset_index()
+
+    merged = pd.merge(mean(baseline), mean(current), on=keys, how='outer', suffixes=('_base', '_new'), sort=False)
+    merged['ratio'] = (merged['seconds_new'] / merged['seconds_base']).round(3)
+    return merged
+
+
+@contextmanager
+def recording(profiler: Profiler):
+    # 在该范围内（当前线程 / 上下文）调用的 stage() 写入 profiler
+    token = _current.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current.reset(token)
+
+
+def current_profiler():
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str, **counts):
+    profiler = _current.get()
+    if profiler is None:
+        yield dict(counts)
+        return
+    with profiler.stage(name, **counts) as record:
+        yield record
+
+
+def run(name: str, func, *args, counts=None, **kwargs):
+    # 计时执行 func；counts 为 {字段: 数量或 callable(返回值)}
+    with stage(name) as record:
+        value = func(*args, **kwargs)
+        for key, count in (counts or {}).items():
+            record[key] = count(value) if callable(count) else count
+    return value
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from bpa_dat import B_EDITABLE_FIELDS, split_filter
+
+# 多规则批量修改：每条规则为 “筛选 (dist / owner / vol_rank) → 修改 (param, set/mul, value)”，
+# 按 order 给出的优先顺序编译后一次作用在 B卡表上：相同筛选条件只查询一次，同一字段的全部规则
+# 在同一份可写列上依次折算，最后统一写回，整个规则表只需解析和写回文件各一次
+RULE_COLUMNS = ['order', 'enabled', 'dist', 'owner', 'vol_rank', 'param', 'method', 'value']
+REQUIRED_RULE_COLUMNS = {'method', 'value'}
+REPORT_COLUMNS = ['rule', 'order', 'dist', 'owner', 'vol_rank', 'param', 'method', 'value',
+                  'matched', 'changed', 'invalid', 'error']
+METHOD_ALIASES = {'set': 'set', '设值': 'set', 'mul': 'mul', '乘系数': 'mul'}
+DEFAULT_PARAM = 'shunt_var'
+
+# 叠加：所有命中的规则按顺序依次作用（后面的设值覆盖前面的结果，乘系数在前面的结果上继续相乘）；
+# 首条命中：每张卡的每个字段只由顺序最靠前的命中规则修改
+MODE_SEQUENTIAL = 'sequential'
+MODE_FIRST_MATCH = 'first'
+RULE_MODES = {MODE_SEQUENTIAL: '依次叠加', MODE_FIRST_MATCH: '首条命中'}
+
+_DISABLED = {'0', 'false', 'no', 'n', 'off', '否', '禁用'}
+
+
+def _enabled(value) -> bool:
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return True
+    return str(value).strip().lower() not in _DISABLED
+
+
+def editable_rules(table: pd.DataFrame) -> pd.DataFrame:
+    # 导入的规则表整理为界面编辑用的列与类型
+    table = table.copy()
+    table.columns = [str(c).strip().lower() for c in table.columns]
+    table = table.reindex(columns=RULE_COLUMNS)
+    table['order'] = pd.to_numeric(table['order'], errors='coerce')
+    table['enabled'] = [_enabled(v) for v in table['enabled'].tolist()]
+    return table
+
+
+def normalize_rules(table: pd.DataFrame) -> list:
+    # 规则表每行一条：dist / owner / vol_rank 筛选（可留空），param（默认 shunt_var），method（set/mul），value；
+    # 可选 enabled（留空视为启用）与 order（优先顺序，数值小的先执行，留空排在最后，同序保持原行序）
+    table = table.copy()
+    table.columns = [str(c).strip().lower() for c in table.columns]
+    missing = REQUIRED_RULE_COLUMNS - set(table.columns)
+    if missing:
+        raise ValueError(f"规则表缺少列: {', '.join(sorted(missing))}")
+    table = table.reindex(columns=RULE_COLUMNS)
+    table['row'] = np.arange(1, len(table) + 1)
+    table = table[[_enabled(v) for v in table['enabled'].tolist()]]
+    table = table.assign(order=pd.to_numeric(table['order'], errors='coerce'))
+    table = table.sort_values('order', kind='stable', na_position='last')
+
+    rules = []
+    for row in table.drop(columns=['enabled']).fillna('').itertuples(index=False):
+        if not str(row.method).strip() and not str(row.value).strip():
+            continue
+        method = METHOD_ALIASES.get(str(row.method).strip().lower())
+        if method is None:
+            raise ValueError(f"规则第 {row.row} 行: 修改方式 '{row.method}' 非法，应为 set 或 mul")
+        rules.append({
+            'rule': int(row.row),
+            'order': '' if row.order == '' else f"{row.order:g}",
+            'dist': str(row.dist).strip(),
+            'owner': str(row.owner).strip(),
+            'vol_rank': str(row.vol_rank).strip(),
+            'param': str(row.param).strip() or DEFAULT_PARAM,
+            'method': method,
+            'value': str(row.value).strip(),
+        })
+    return rules
+
+
+def compile_rules(case, rules: list) -> list:
+    # 解析筛选与取值，按筛选条件去重后查询 B卡表位置；规则自身的错误记在 error 中，不影响其余规则
+    memo = {}
+    compiled = []
+    for rule in rules:
+        item = {**rule, 'positions': None, 'number': None, 'matched': 0, 'changed': 0, 'invalid': 0, 'error': ''}
+        compiled.append(item)
+        if rule['param'] not in B_EDITABLE_FIELDS:
+            item['error'] = f"B卡字段 {rule['param']} 不支持按规则修改（可修改: {', '.join(B_EDITABLE_FIELDS)}）"
+            continue
+        try:
+            item['number'] = float(rule['value'])
+        except ValueError:
+            item['error'] = f"修改值 '{rule['value']}' 无法转为浮点数"
+            continue
+        vol = None
+        if rule['vol_rank']:
+            try:
+                vol = float(rule['vol_rank'])
+            except ValueError:
+                item['error'] = f"电压 '{rule['vol_rank']}' 非法"
+                continue
+        dist_list = tuple(split_filter(rule['dist'])) if rule['dist'] else None
+        owner_list = tuple(split_filter(rule['owner'])) if rule['owner'] else None
+        key = (dist_list, owner_list, vol)
+        positions = memo.get(key)
+        if positions is None:
+            positions = memo[key] = case.index.query(dist_list, owner_list, vol)
+        item['positions'] = positions
+        item['matched'] = len(positions)
+    return compiled
+
+
+def apply_rules(case, rules: list, mode: str = MODE_SEQUENTIAL, log=None) -> pd.DataFrame:
+    # 返回逐条规则的命中数 / 修改数 / 原值无效数 / 错误，列见 REPORT_COLUMNS
+    if mode not in RULE_MODES:
+        raise ValueError(f"未知的规则模式: {mode}")
+    compiled = compile_rules(case, rules)
+    by_field = {}
+    for item in compiled:
+        if not item['error']:
+            by_field.setdefault(item['param'], []).append(item)
+    for field, items in by_field.items():
+        ops = [(item['positions'], item['method'], item['number']) for item in items]
+        results = case.table.update_many(field, ops, first_match=(mode == MODE_FIRST_MATCH))
+        for item, (changed, invalid) in zip(items, results):
+            item['changed'] = changed
+            item['invalid'] = invalid
+
+    report = pd.DataFrame([{col: item[col] for col in REPORT_COLUMNS} for item in compiled], columns=REPORT_COLUMNS)
+    if log:
+        errors = report['error'] != ''
+        log(f"规则表执行完成（{RULE_MODES[mode]}）：规则 {len(report)} 条，其中出错 {int(errors.sum())} 条，"
+            f"修改 B卡 {len(case.table.dirty_positions())} 张")
+        for item in compiled:
+            if item['error']:
+                log(f"错误: 规则第 {item['rule']} 行: {item['error']}", level="ERROR")
+            else:
+                log(f"规则第 {item['rule']} 行 {item['param']} {item['method']} {item['value']}: "
+                    f"命中 {item['matched']} 张，修改 {item['changed']} 张", level="DEBUG")
+    return report
+
+
+def rules_template() -> pd.DataFrame:
+    return pd.DataFrame([
+        {'order': 1, 'enabled': True, 'dist': 'C1,D1', 'owner': '苏,锡', 'vol_rank': '37',
+         'param': DEFAULT_PARAM, 'method': 'mul', 'value': '1.2'},
+    ], columns=RULE_COLUMNS)
@@ -0,0 +1,246 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+
+from bpa_cache import estimate_size
+
+# 会话数据的内存预算：每个会话较大的状态（节点表、迭代记录、修改记录、导出文件等）登记在 SessionData 中，
+# 按最近使用时间排序；一次运行结束后超出会话预算（或全部会话合计超出进程预算）时，
+# 把最久未使用的条目 pickle 到磁盘并释放内存，下次访问时再透明加载。
+# 进程内所有会话登记在弱引用表中，会话结束被回收时删除其落盘文件
+DEFAULT_SESSION_MAX_MB = 256
+# 小于该大小的条目不落盘，读写文件的开销不值得
+MIN_SPILL_BYTES = 64 * 1024
+SUMMARY_COLUMNS = ['session', 'entries', 'memory_mb', 'spilled_mb', 'spills', 'loads', 'idle_s', 'active']
+
+_sessions = weakref.WeakValueDictionary()
+_sessions_lock = threading.Lock()
+
+
+def _remove_dir(path: str):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _env_mb(name: str, default: float) -> int:
+    value = os.environ.get(name)
+    return int(float(value if value else default) * 1024 * 1024)
+
+
+class SessionData:
+    def __init__(self, max_bytes: int = DEFAULT_SESSION_MAX_MB * 1024 * 1024, spill_dir: str = None):
+        # max_bytes 为 0 时不限制
+        self.id = uuid.uuid4().hex[:8]
+        self.max_bytes = max_bytes
+        self.spill_dir = os.path.join(spill_dir or os.path.join(tempfile.gettempdir(), 'bpa_spill'), self.id)
+        self.last_active = time.time()
+        self.spills = 0
+        self.loads = 0
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._active = 0
+        weakref.finalize(self, _remove_dir, self.spill_dir)
+        with _sessions_lock:
+            _sessions[self.id] = self
+
+    @classmethod
+    def from_env(cls):
+        # BPA_SESSION_MAX_MB: 单个会话的内存预算（默认 256，0 为不限）；BPA_SPILL_DIR: 落盘目录（默认系统临时目录）
+        return cls(_env_mb('BPA_SESSION_MAX_MB', DEFAULT_SESSION_MAX_MB), os.environ.get('BPA_SPILL_DIR'))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def get(self, name: str, default=None):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return default
+            if entry['path'] is not None:
+                self._load(entry)
+            entry['access'] = time.monotonic()
+            return entry['value']
+
+    def set(self, name: str, value):
+        # value 为 None 时删除条目；同一对象重新登记时只更新大小与使用时间
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry['path'] is None and entry['value'] is value:
+                entry['nbytes'] = estimate_size(value)
+                entry['access'] = time.monotonic()
+                return
+            self.pop(name)
+            if value is not None:
+                self._entries[name] = {'value': value, 'path': None, 'nbytes': estimate_size(value),
+                                       'spilled': 0, 'access': time.monotonic()}
+
+    def setdefault(self, name: str, factory):
+        with self._lock:
+            if name not in self._entries:
+                self.set(name, factory())
+            return self.get(name)
+
+    def pop(self, name: str):
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is not None and entry['path'] is not None:
+                try:
+                    os.remove(entry['path'])
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            for name in list(self._entries):
+                self.pop(name)
+
+    @contextmanager
+    def active(self):
+        # 标记一次脚本运行：其他会话的进程级淘汰会跳过正在运行的会话，运行中取出的对象不会被落盘后再修改；
+        # 运行结束时按会话预算淘汰。运行期间不持有会话锁，后台任务修改会话状态时不必等待界面脚本运行结束
+        with self._lock:
+            self._active += 1
+            self.last_active = time.time()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.last_active = time.time()
+                self.enforce()
+
+    @contextmanager
+    def locked(self):
+        # 读改写会话中的可变对象（如修改记录）时持有会话锁：界面脚本与后台任务互斥，期间条目不会被落盘
+        with self._lock:
+            yield self
+
+    def measure(self):
+        # 可变条目（迭代记录、修改记录等）在使用中会增长，淘汰前重新估算
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['path'] is None:
+                    entry['nbytes'] = estimate_size(entry['value'])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry['nbytes'] for entry in self._entries.values() if entry['path'] is None)
+
+    @property
+    def spilled_bytes(self) -> int:
+        return sum(entry['spilled'] for entry in self._entries.values() if entry['path'] is not None)
+
+    def enforce(self, max_bytes: int = None) -> int:
+        # 按最久未使用的顺序落盘，直到内存占用不超过 max_bytes（默认为会话预算），返回释放的字节数
+        if max_bytes is None:
+            if not self.max_bytes:
+                return 0
+            max_bytes = self.max_bytes
+        with self._lock:
+            self.measure()
+            total = self.nbytes
+            freed = 0
+            candidates = sorted((entry['access'], name) for name, entry in self._entries.items()
+                                if entry['path'] is None and entry['nbytes'] >= MIN_SPILL_BYTES)
+            for _, name in candidates:
+                if total - freed <= max_bytes:
+                    break
+                freed += self.spill(name)
+            return freed
+
+    def spill(self, name: str) -> int:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry['path'] is not None:
+                return 0
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"{name}.pkl")
+            try:
+                with open(path, 'wb') as f:
+                    pickle.dump(entry['value'], f, protocol=pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError):
+                # 无法落盘（磁盘不可写或对象不可序列化）时保留在内存中
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                return 0
+            entry['spilled'] = os.path.getsize(path)
+            entry['path'] = path
+            entry['value'] = None
+            self.spills += 1
+            return entry['nbytes']
+
+    def _load(self, entry: dict):
+        with open(entry['path'], 'rb') as f:
+            entry['value'] = pickle.load(f)
+        try:
+            os.remove(entry['path'])
+        except OSError:
+            pass
+        entry['path'] = None
+        entry['spilled'] = 0
+        self.loads += 1
+
+    def entries(self) -> pd.DataFrame:
+        now = time.monotonic()
+        rows = [{'name': name, 'memory_mb': round(entry['nbytes'] / 1024 / 1024, 2) if entry['path'] is None else 0.0,
+                 'spilled_mb': round(entry['spilled'] / 1024 / 1024, 2), 'on_disk': entry['path'] is not None,
+                 'idle_s': round(now - entry['access'], 1)}
+                for name, entry in self._entries.items()]
+        return pd.DataFrame(rows, columns=['name', 'memory_mb', 'spilled_mb', 'on_disk', 'idle_s'])
+
+    def summary(self) -> dict:
+        return {
+            'session': self.id,
+            'entries': len(self._entries),
+            'memory_mb': round(self.nbytes / 1024 / 1024, 2),
+            'spilled_mb': round(self.spilled_bytes / 1024 / 1024, 2),
+            'spills': self.spills,
+            'loads': self.loads,
+            'idle_s': round(time.time() - self.last_active, 1),
+            'active': self._active > 0,
+        }
+
+
+def sessions() -> list:
+    with _sessions_lock:
+        return list(_sessions.values())
+
+
+def process_summary() -> pd.DataFrame:
+    # 进程内全部会话的内存占用，占用多的在前
+    rows = [session.summary() for session in sessions()]
+    frame = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    return frame.sort_values('memory_mb', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def enforce_process_budget(max_bytes: int = None) -> int:
+    # 全部会话合计超出进程预算（BPA_SESSIONS_MAX_MB，默认不限）时，从最久未活动的会话开始整体落盘；
+    # 正在运行的会话拿不到锁，直接跳过。返回释放的字节数
+    if max_bytes is None:
+        max_bytes = _env_mb('BPA_SESSIONS_MAX_MB', 0)
+    if not max_bytes:
+        return 0
+    active = sessions()
+    total = sum(session.nbytes for session in active)
+    freed = 0
+    for session in sorted(active, key=lambda s: s.last_active):
+        if total - freed <= max_bytes:
+            break
+        if not session._lock.acquire(blocking=False):
+            continue
+        try:
+            if session._active:
+                continue
+            freed += session.enforce(0)
+        finally:
+            session._lock.release()
+    return freed
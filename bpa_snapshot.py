@@ -0,0 +1,209 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from bpa_dat import CARD_TYPES, BCardTable, CardTable, DATCase, LineStore, join_lines, line_offsets
+from bpa_profile import stage
+
+# 已解析算例的二进制快照：原始字节、行偏移、各类型卡片的行号与定长字节矩阵，以及已解码的字段列
+# （B卡全部字段在保存前解码），按内容哈希存为单个文件。重新打开时整个文件内存映射，
+# 数组直接指向映射区（只读，修改时由 CardTable 复制），不再逐行拆分、归类和解码。
+# 文件结构：MAGIC | 头部长度 (uint64) | JSON 头部 | 按 64 字节对齐的数组区
+MAGIC = b'BPASNAP1'
+FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = '.bpasnap'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+_ALIGN = 64
+_HEADER = struct.Struct('<8sQ')
+
+
+def layout_hash() -> str:
+    # 卡片字段定义变化后旧快照的列含义不再可靠，以字段布局的哈希区分
+    text = json.dumps({name: {key: spec[key] for key in ('prefixes', 'text', 'numeric', 'width')}
+                       for name, spec in sorted(CARD_TYPES.items())}, sort_keys=True, default=list)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _decode_all(table: CardTable):
+    for field in table.fields:
+        table.column(field)
+
+
+def write_snapshot(path: str, case: DATCase, key: str = None):
+    # 先写临时文件再原子替换，读者不会看到写了一半的快照
+    arrays = {}
+    tables = {}
+    content = join_lines(case.lines)
+    arrays['content'] = np.frombuffer(content, dtype=np.uint8)
+    arrays['offsets'] = line_offsets(case.lines)
+    for name, table in case.cards.items():
+        if name == 'B':
+            _decode_all(table)
+        prefix = f't{len(tables)}'
+        entry = {'rows': f'{prefix}.rows', 'matrix': None, 'decoded': {}}
+        arrays[entry['rows']] = table.rows
+        if len(table):
+            entry['matrix'] = f'{prefix}.matrix'
+            arrays[entry['matrix']] = table.matrix
+        for field, column in table._shared['decoded'].items():
+            entry['decoded'][field] = f'{prefix}.{field}'
+            arrays[entry['decoded'][field]] = column
+        tables[name] = entry
+
+    specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        specs[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({
+        'version': FORMAT_VERSION, 'layout': layout_hash(), 'key': key, 'lines': len(case.lines),
+        'arrays': specs, 'tables': tables,
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = -(-(_HEADER.size + len(header)) // _ALIGN) * _ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + specs[name][2])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_snapshot(path: str, card_cls) -> DATCase:
+    # 格式、版本或字段布局不符时抛出 ValueError
+    with open(path, 'rb') as f:
+        magic, header_len = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"不是有效的快照文件: {path}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        if header['version'] != FORMAT_VERSION or header['layout'] != layout_hash():
+            raise ValueError(f"快照格式已过期: {path}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = -(-(_HEADER.size + header_len) // _ALIGN) * _ALIGN
+
+    def array(name):
+        dtype, shape, offset = header['arrays'][name]
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if not count:
+            return np.zeros(shape, dtype=dtype)
+        return np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + offset).reshape(shape)
+
+    lines = LineStore(array('content'), array('offsets'))
+    cards = {}
+    for name, entry in header['tables'].items():
+        rows = array(entry['rows'])
+        table = BCardTable(lines, rows) if name == 'B' else CardTable(name, lines, rows)
+        if entry['matrix'] is not None:
+            table._shared['matrix'] = array(entry['matrix'])
+        for field, array_name in entry['decoded'].items():
+            table._shared['decoded'][field] = array(array_name)
+        cards[name] = table
+    return DATCase(lines, cards, card_cls)
+
+
+class SnapshotStore:
+    # 快照目录：文件名为内容哈希，超过 max_bytes 时按最近使用时间淘汰
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls):
+        # 设置 BPA_SNAPSHOT_DIR 时启用（会把上传的算例保存在服务器磁盘上，仅用于本地 / 自建部署）
+        directory = os.environ.get('BPA_SNAPSHOT_DIR')
+        if not directory:
+            return None
+        max_mb = os.environ.get('BPA_SNAPSHOT_MAX_MB')
+        return cls(directory, int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SNAPSHOT_SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def load(self, key: str, card_cls):
+        # 未命中或快照损坏 / 过期时返回 None，过期文件顺带删除
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with stage('snapshot_load', bytes=os.path.getsize(path)) as record:
+                case = read_snapshot(path, card_cls)
+                record['lines'] = len(case.lines)
+        except (OSError, ValueError, KeyError, struct.error):
+            self.discard(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return case
+
+    def save(self, key: str, case: DATCase) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        with stage('snapshot_save', lines=len(case.lines)) as record:
+            write_snapshot(path, case, key)
+            record['bytes'] = os.path.getsize(path)
+        self.prune()
+        return path
+
+    def discard(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def entries(self) -> list:
+        # [(路径, 大小, 最近使用时间)]，最近使用的在前
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SNAPSHOT_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, info.st_size, info.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self):
+        total = 0
+        for path, size, _ in self.entries():
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Windows 上仍被映射的文件无法删除，留待下次清理
+                    pass
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
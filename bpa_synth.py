@@ -0,0 +1,173 @@
+import random
+
+from bpa_format import format_bytes, format_number as _num
+
+# 合成算例生成器：按 PSD-BPA 定长列格式生成 DAT 与全输出 PFO 文件（GBK 编码），用于性能测试
+CITIES = ['苏州', '无锡', '常州', '南京', '南通', '扬州', '镇江', '泰州', '徐州', '淮安',
+          '盐城', '宿迁', '连云', '杭州', '宁波', '温州', '嘉兴', '湖州', '绍兴', '金华',
+          '衢州', '舟山', '台州', '丽水', '合肥', '芜湖', '蚌埠', '淮南', '安庆', '黄山',
+          '滁州', '阜阳', '宿州', '六安', '亳州', '池州', '宣城', '上海', '浦东', '闵行',
+          '福州', '厦门', '莆田', '三明', '泉州', '漳州', '南平', '龙岩', '宁德', '赣州']
+OWNERS = ['苏', '锡', '常', '宁', '通', '扬', '浙', '皖', '沪', '闽']
+DISTS = ['C1', 'C2', 'D1', 'D2', 'E1', 'E2', 'F1', 'F2']
+# 标称电压 (kV) 及占比
+VOLTAGES = [(525.0, 0.04), (230.0, 0.16), (115.0, 0.20), (37.0, 0.45), (10.5, 0.15)]
+BUS_TYPES = ['B ', 'BQ', 'BE', 'BS']
+
+
+def _text(value: str, width: int) -> bytes:
+    return format_bytes(value, width)
+
+
+def _card(width: int, fields: list) -> bytes:
+    line = bytearray(b' ' * width)
+    for start, raw in fields:
+        line[start:start + len(raw)] = raw
+    return bytes(line).rstrip()
+
+
+def bus_name(i: int) -> str:
+    return f"{CITIES[i % len(CITIES)]}{i // len(CITIES)}"
+
+
+def _pick_kv(rng: random.Random) -> float:
+    x = rng.random()
+    for kv, share in VOLTAGES:
+        if x < share:
+            return kv
+        x -= share
+    return VOLTAGES[-1][0]
+
+
+def synth_buses(n_buses: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    buses = []
+    for i in range(n_buses):
+        kv = _pick_kv(rng)
+        buses.append({
+            'name': bus_name(i),
+            'kv': kv,
+            'owner': rng.choice(OWNERS),
+            'dist': rng.choice(DISTS),
+            'type': 'B ' if kv < 100 else rng.choice(BUS_TYPES),
+            'load_p': round(rng.uniform(0, 80), 1) if kv < 240 else 0.0,
+            'load_q': round(rng.uniform(0, 30), 1) if kv < 240 else 0.0,
+            'shunt_var': float(rng.choice([0, 0, 0, 10, 20, 30, 60, -20, -40])) if kv < 240 else 0.0,
+        })
+    return buses
+
+
+def b_card(bus: dict) -> bytes:
+    return _card(80, [
+        (0, _text(bus['type'], 2)),
+        (3, _text(bus['owner'], 3)),
+        (6, _text(bus['name'], 8)),
+        (14, _num(bus['kv'], 4)),
+        (18, _text(bus['dist'], 2)),
+        (20, _num(bus['load_p'], 5)),
+        (25, _num(bus['load_q'], 5)),
+        (34, _num(bus['shunt_var'], 4)),
+        (57, b'1050'),
+        (61, b' 950'),
+    ])
+
+
+def branch_card(kind: str, owner: str, bus1: dict, bus2: dict, rng: random.Random) -> bytes:
+    fields = [
+        (0, _text(kind, 2)),
+        (3, _text(owner, 3)),
+        (6, _text(bus1['name'], 8)),
+        (14, _num(bus1['kv'], 4)),
+        (19, _text(bus2['name'], 8)),
+        (27, _num(bus2['kv'], 4)),
+        (33, _num(rng.choice([600, 1000, 2000, 3000]), 4)),
+        (38, _num(rng.uniform(0.0001, 0.01), 6)),
+        (44, _num(rng.uniform(0.001, 0.1), 6)),
+    ]
+    if kind == 'T ':
+        fields += [(62, _num(bus1['kv'], 5)), (67, _num(bus2['kv'], 5))]
+    else:
+        fields += [(56, _num(rng.uniform(0.001, 0.5), 6))]
+    return _card(80, fields)
+
+
+def synth_dat(n_buses: int, seed: int = 0, branches_per_bus: float = 1.4) -> bytes:
+    # 生成包含控制语句、注释、各类 B 卡、L 线路卡和 T 变压器卡的 DAT 文件
+    rng = random.Random(seed)
+    buses = synth_buses(n_buses, seed)
+    by_kv = {}
+    for bus in buses:
+        by_kv.setdefault(bus['kv'], []).append(bus)
+
+    lines = [
+        b"(POWERFLOW,CASEID=SYNTH,PROJECT=BENCHMARK)",
+        b"/P_OUTPUT_LIST,FULL\\",
+        b"/NEW_BASE,FILE=SYNTH.BSE\\",
+        ". synthetic case for benchmarking".encode('gbk'),
+    ]
+    for i, bus in enumerate(buses):
+        if i % 500 == 0:
+            lines.append(f". 区域 {bus['dist']} 母线数据".encode('gbk'))
+        lines.append(b_card(bus))
+
+    n_branches = int(n_buses * branches_per_bus)
+    for _ in range(n_branches):
+        bus1 = buses[rng.randrange(n_buses)]
+        if rng.random() < 0.7:
+            bus2 = rng.choice(by_kv[bus1['kv']])
+            if bus2 is bus1:
+                continue
+            lines.append(branch_card('L ', bus1['owner'], bus1, bus2, rng))
+        else:
+            kv2 = rng.choice([kv for kv in by_kv if kv != bus1['kv']])
+            bus2 = rng.choice(by_kv[kv2])
+            lines.append(branch_card('T ', bus1['owner'], bus1, bus2, rng))
+    lines.append(b"(END)")
+    return b"\r\n".join(lines) + b"\r\n"
+
+
+def _pfo_bus_line(bus: dict, actual: float, rng: random.Random) -> bytes:
+    ending = {'B ': 'B', 'BQ': 'BQ', 'BE': 'BE', 'BS': 'BS'}[bus['type']]
+    return (
+        _text(bus['name'], 8) + f"{bus['kv']:6.1f}".encode('ascii')
+        + b' ' * 22 + _text(bus['dist'], 2) + _text(bus['owner'], 2)
+        + f"  {actual:7.1f}kV/{rng.uniform(-30, 30):6.1f}  {bus['load_p']:8.1f}MW {bus['load_q']:8.1f}MVAR    {ending:>3}".encode('ascii')
+    )
+
+
+def _pfo_generator_line(rng: random.Random) -> bytes:
+    # 约五分之一的发电机无功停在上限或下限
+    q_min = -round(rng.uniform(20, 150), 1)
+    q_max = round(rng.uniform(50, 400), 1)
+    q = rng.choice([q_min, q_max] + [round(rng.uniform(q_min, q_max), 1)] * 8)
+    return (b' ' * 12 + '发电'.encode('gbk')
+            + f" {rng.uniform(50, 900):9.1f}MW {q:9.1f}MVAR   Qmin {q_min:7.1f} Qmax {q_max:7.1f}".encode('ascii'))
+
+
+def synth_pfo(n_buses: int, seed: int = 0, unallocated_share: float = 0.05) -> bytes:
+    # 生成 /P_OUTPUT_LIST,FULL 风格的潮流结果：分页表头、母线行、发电 / 并联无功行、支路潮流行（含负载率）及“未安排无功”行。
+    # 发电、并联无功与负载率另用独立的随机序列，同一 seed 下母线与支路潮流的取值与只含母线 / 支路行时相同
+    rng = random.Random(seed)
+    extra = random.Random(seed + 1)
+    buses = synth_buses(n_buses, seed)
+    lines = []
+    for i, bus in enumerate(buses):
+        if i % 50 == 0:
+            lines.append(f"\x0c BPA 潮流程序   第 {i // 50 + 1} 页".encode('gbk'))
+            lines.append("  母线名称  基准电压             区域 所有者  电压/相角  负荷  ".encode('gbk'))
+        actual = bus['kv'] * rng.gauss(1.03, 0.04)
+        lines.append(_pfo_bus_line(bus, actual, rng))
+        if bus['type'] != 'B ':
+            lines.append(_pfo_generator_line(extra))
+        if bus['shunt_var']:
+            lines.append(b' ' * 12 + '并联无功'.encode('gbk') + f" {bus['shunt_var']:9.1f}MVAR".encode('ascii'))
+        for _ in range(rng.randint(1, 5)):
+            other = buses[rng.randrange(n_buses)]
+            lines.append(
+                b'        ' + _text(other['name'], 8) + f"{other['kv']:6.1f}".encode('ascii')
+                + f"  {rng.uniform(-500, 500):9.1f}MW {rng.uniform(-200, 200):9.1f}MVAR  {rng.uniform(0, 5):7.2f}MW loss"
+                  f"  {extra.uniform(5, 115):6.1f}%".encode('ascii')
+            )
+        if rng.random() < unallocated_share:
+            lines.append(f"            {rng.uniform(-150, 150):.2f} 未安排无功".encode('gbk'))
+    return b"\r\n".join(lines) + b"\r\n"
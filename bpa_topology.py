@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+# 网络拓扑：母线按 (母线名, 基准电压) 编号，支路卡（L / T / E / R 等）两端连边，
+# 邻接关系以 CSR 数组存储（indptr / indices），邻域与电气岛查询全部为数组运算
+BRANCH_CARD_TYPES = ['L', 'LD', 'LM', 'T', 'TP', 'E', 'R']
+_NON_BUS_TYPES = {'+', 'X'}
+
+
+def _bus_tables(case) -> list:
+    return [table for name, table in case.cards.items()
+            if name not in _NON_BUS_TYPES and 'bus_name' in table.spec['text'] and 'vol_rank' in table.spec['numeric']
+            and len(table)]
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    # 一次取出一组节点的全部邻居
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=indices.dtype)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return indices[offsets + np.arange(total)]
+
+
+class Topology:
+    def __init__(self, names: np.ndarray, kv: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 card_bus: dict = None):
+        self.names = names
+        self.kv = kv
+        self.indptr = indptr
+        self.indices = indices
+        # 各类母线卡表内位置 -> 母线编号
+        self.card_bus = card_bus or {}
+        self._lookup = None
+        self._islands = None
+
+    @classmethod
+    def from_case(cls, case) -> 'Topology':
+        bus_tables = [(table.card_type, table.bus_name, table.vol_rank) for table in _bus_tables(case)]
+        branches = [case.cards[name] for name in BRANCH_CARD_TYPES if name in case.cards and len(case.cards[name])]
+        name_parts = [names for _, names, _ in bus_tables]
+        kv_parts = [kv for _, _, kv in bus_tables]
+        for table in branches:
+            name_parts += [table.bus1, table.bus2]
+            kv_parts += [table.kv1, table.kv2]
+        if not name_parts:
+            return cls(np.zeros(0, dtype=object), np.zeros(0), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+
+        # 名称与电压分别编码后组合成整数键再求唯一值，电压无法解析的端点编号为 -1
+        name_codes, name_uniques = pd.factorize(np.concatenate(name_parts))
+        kv_codes, kv_uniques = pd.factorize(np.round(np.concatenate(kv_parts), 1))
+        valid = kv_codes >= 0
+        keys = name_codes.astype(np.int64) * len(kv_uniques) + kv_codes
+        unique_keys, inverse = np.unique(keys[valid], return_inverse=True)
+        codes = np.full(len(keys), -1, dtype=np.int64)
+        codes[valid] = inverse
+        n = len(unique_keys)
+        names = np.asarray(name_uniques, dtype=object)[unique_keys // len(kv_uniques)]
+        kv = np.asarray(kv_uniques, dtype=np.float64)[unique_keys % len(kv_uniques)]
+
+        card_bus = {}
+        offset = 0
+        for card_type, bus_names, _ in bus_tables:
+            card_bus[card_type] = codes[offset:offset + len(bus_names)].astype(np.int32)
+            offset += len(bus_names)
+        src_parts, dst_parts = [], []
+        for table in branches:
+            size = len(table)
+            src_parts.append(codes[offset:offset + size])
+            dst_parts.append(codes[offset + size:offset + 2 * size])
+            offset += 2 * size
+        return cls(names, kv, *cls._csr(src_parts, dst_parts, n), card_bus=card_bus)
+
+    @staticmethod
+    def _csr(src_parts: list, dst_parts: list, n: int) -> tuple:
+        # 无向图：正反两个方向各存一条边，去掉自环与并联支路造成的重复边
+        if src_parts:
+            src = np.concatenate(src_parts).astype(np.int64)
+            dst = np.concatenate(dst_parts).astype(np.int64)
+        else:
+            src = dst = np.zeros(0, dtype=np.int64)
+        keep = (src != dst) & (src >= 0) & (dst >= 0)
+        src, dst = src[keep], dst[keep]
+        pairs = np.unique(np.concatenate([src * n + dst, dst * n + src]))
+        src, dst = pairs // n, pairs % n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return indptr, dst.astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices) // 2
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.kv.nbytes + sum(a.nbytes for a in self.card_bus.values())
+
+    def degree(self, buses=None) -> np.ndarray:
+        degree = np.diff(self.indptr)
+        return degree if buses is None else degree[np.asarray(buses)]
+
+    def bus_ids(self, names, kv=None, tol: float = 0.1) -> np.ndarray:
+        # 母线名（可多个）-> 编号；不给电压时匹配该名称下所有电压等级的母线
+        if self._lookup is None:
+            self._lookup = pd.Index(self.names)
+        if isinstance(names, str):
+            names = [names]
+        ids = self._lookup.get_indexer_for(list(names)) if len(self.names) else np.zeros(0, dtype=np.int64)
+        ids = ids[ids >= 0]
+        if kv is not None and len(ids):
+            ids = ids[np.abs(self.kv[ids] - float(kv)) < tol]
+        return ids
+
+    def neighbors(self, bus: int) -> np.ndarray:
+        return self.indices[self.indptr[bus]:self.indptr[bus + 1]]
+
+    def within_hops(self, sources, hops: int) -> tuple:
+        # 逐层扩展的广度优先搜索，返回 (母线编号, 跳数)，源母线跳数为 0
+        sources = np.unique(np.asarray(sources, dtype=np.int64))
+        dist = np.full(len(self.names), -1, dtype=np.int32)
+        dist[sources] = 0
+        frontier = sources
+        for hop in range(1, hops + 1):
+            if not len(frontier):
+                break
+            reached = np.unique(_gather(self.indptr, self.indices, frontier))
+            frontier = reached[dist[reached] < 0]
+            dist[frontier] = hop
+        ids = np.flatnonzero(dist >= 0)
+        return ids, dist[ids]
+
+    @property
+    def islands(self) -> np.ndarray:
+        # 电气岛编号（连通分量），首次访问时计算；孤立母线各自成岛
+        if self._islands is None:
+            self._islands = self._label_islands()
+        return self._islands
+
+    def _label_islands(self) -> np.ndarray:
+        n = len(self.names)
+        labels = np.full(n, -1, dtype=np.int32)
+        isolated = np.flatnonzero(np.diff(self.indptr) == 0)
+        labels[isolated] = np.arange(len(isolated), dtype=np.int32)
+        next_label = len(isolated)
+        for seed in np.flatnonzero(labels < 0):
+            if labels[seed] >= 0:
+                continue
+            frontier = np.array([seed])
+            labels[seed] = next_label
+            while len(frontier):
+                reached = np.unique(_gather(self.indptr, self.indices, frontier))
+                frontier = reached[labels[reached] < 0]
+                labels[frontier] = next_label
+            next_label += 1
+        return labels
+
+    def island_count(self) -> int:
+        return int(self.islands.max()) + 1 if len(self.names) else 0
+
+    def same_island(self, a, b) -> np.ndarray:
+        return self.islands[np.asarray(a)] == self.islands[np.asarray(b)]
+
+    def island_of(self, bus: int) -> np.ndarray:
+        return np.flatnonzero(self.islands == self.islands[bus])
+
+    def card_positions(self, buses, card_type: str = 'B') -> np.ndarray:
+        # 母线编号 -> 该类母线卡在表内的位置（如 B卡表位置，供 shunt_var 修改使用）
+        card_bus = self.card_bus.get(card_type)
+        if card_bus is None:
+            return np.zeros(0, dtype=np.int64)
+        mask = np.zeros(len(self.names) + 1, dtype=bool)
+        mask[np.asarray(buses, dtype=np.int64)] = True
+        # 电压无法解析的母线卡编号为 -1，落在末尾恒为 False 的位置上
+        return np.flatnonzero(mask[card_bus])
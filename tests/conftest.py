@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# 模块均位于仓库根目录（平铺的 bpa_*.py），测试直接导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bpa_dat import B_CARD_WIDTH, B_NUMERIC_FIELDS  # noqa: E402
+from bpa_format import format_number  # noqa: E402
+
+
+class FakeBCard:
+    # 代替加密模型中的 BCard：构造参数与 gen() 接口相同，被赋值的数值字段按定长列写回原始行，其余字节不变
+    def __init__(self, line: str, idx: int):
+        self._line = line
+        self._idx = idx
+
+    def gen(self) -> str:
+        buf = bytearray(self._line.encode('gbk').ljust(B_CARD_WIDTH))
+        for field, value in vars(self).items():
+            if field in B_NUMERIC_FIELDS:
+                start, stop, decimals = B_NUMERIC_FIELDS[field]
+                buf[start:stop] = format_number(float(value), stop - start, decimals)
+        return bytes(buf).rstrip().decode('gbk')
+
+
+@pytest.fixture
+def card_cls():
+    return FakeBCard
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from bpa_dat import apply_b_modifications, parse_dat
+from bpa_synth import synth_dat
+
+_MUL = {'shunt_var': {'apply': True, 'method': 'mul', 'value': '1.5'}}
+
+
+@pytest.fixture(scope='module')
+def dat():
+    return synth_dat(800, 4)
+
+
+def _changed_lines(a: bytes, b: bytes) -> np.ndarray:
+    la, lb = a.splitlines(keepends=True), b.splitlines(keepends=True)
+    assert len(la) == len(lb)
+    return np.array([i for i, (x, y) in enumerate(zip(la, lb)) if x != y], dtype=np.int64)
+
+
+@pytest.mark.parametrize('content', [
+    None,
+    # 混合换行、无结尾换行、GBK 注释与不足 80 列的卡片
+    '. 注释行\nB  苏 苏州0   37 C1   10.   5.   20.\r\n/P_OUTPUT_LIST,FULL\\\rL  苏 苏州0   37  无锡0   37'.encode('gbk'),
+    b'',
+])
+def test_unedited_output_is_identical(dat, card_cls, content):
+    content = dat if content is None else content
+    assert parse_dat(content, card_cls).to_bytes() == content
+
+
+def test_edited_output_differs_only_on_dirty_lines(dat, card_cls):
+    case = parse_dat(dat, card_cls)
+    summary = apply_b_modifications(case, 'C1,D1', '', '37', _MUL)
+    assert summary['changed']['shunt_var'] > 0
+    output = case.to_bytes()
+    # 被标记修改但取值未变的卡（如 0 乘系数）重新生成后可能与原行相同，其余修改卡必须改变
+    changed = _changed_lines(dat, output)
+    assert np.isin(changed, case.dirty).all()
+    table = case.table
+    dirty = table.dirty_positions()
+    moved = dirty[table.shunt_var[dirty] != table.base_column('shunt_var')[dirty]]
+    assert len(moved) and np.isin(table.rows[moved], changed).all()
+
+    # 重新解析写回结果：修改后的值被写回，其余字段不变
+    reparsed = parse_dat(output, card_cls)
+    assert np.array_equal(reparsed.table.shunt_var, case.table.shunt_var, equal_nan=True)
+    for field in ('vol_rank', 'load_p', 'v_max'):
+        assert np.array_equal(reparsed.table.column(field), case.table.base_column(field), equal_nan=True)
+
+
+def test_patched_branch_cards_differ_only_on_dirty_lines(dat, card_cls):
+    case = parse_dat(dat, card_cls)
+    lines = case.cards['L']
+    positions = np.arange(0, len(lines), 7)
+    changed, _ = lines.update(positions, 'r', 'mul', 2.0)
+    assert changed == len(positions)
+    output = case.to_bytes()
+    changed = _changed_lines(dat, output)
+    assert np.isin(changed, lines.rows[positions]).all()
+    moved = positions[lines.r[positions] != lines.base_column('r')[positions]]
+    assert len(moved) and np.isin(lines.rows[moved], changed).all()
+    reparsed = parse_dat(output, card_cls)
+    assert np.allclose(reparsed.cards['L'].r[positions], lines.r[positions], atol=1e-5)
+
+
+def test_copies_do_not_share_edits(dat, card_cls):
+    case = parse_dat(dat, card_cls)
+    edited = case.copy()
+    apply_b_modifications(edited, '', '', '37', _MUL)
+    assert len(edited.dirty) and not len(case.dirty)
+    assert case.to_bytes() == dat
+
+
+def test_debug_sample_lists_only_changed_cards(dat, card_cls):
+    # 0 乘系数后取值不变的卡片不应出现在 DEBUG 日志的母线样本中
+    case = parse_dat(dat, card_cls)
+    messages = []
+    apply_b_modifications(case, 'C1,D1', '', '37', _MUL, log=lambda msg, level="INFO": messages.append((level, msg)))
+    sample = [msg for level, msg in messages if level == "DEBUG"][0].split(': ', 1)[1].split(', ')
+    table = case.table
+    positions = case.index.query(['C1', 'D1'], None, 37.0)
+    moved = positions[table.shunt_var[positions] != table.base_column('shunt_var')[positions]]
+    assert len(moved) < len(positions)
+    assert sample == table.bus_name[moved[:20]].tolist()
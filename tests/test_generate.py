@@ -0,0 +1,34 @@
+import io
+
+from bpa_generate import write_cards
+
+_L_SHEET = (
+    "bus1,kv1,bus2,kv2,r,x\n"
+    "A*1,230,B1,230,0.001,0.01\n"
+    "A2,230,B*2,230,0.001,0.01\n"
+    "A3,230,B3,230,0.001,123456789\n"
+)
+_T3_SHEET = (
+    "mid_bus,mid_kv,bus_h,kv_h,bus_m,kv_m,bus_l,kv_l,x_h,x_m,x_l\n"
+    "M*1,1,H1,525,K1,230,L1,35,0.01,0.02,0.03\n"
+)
+
+
+def _write(sheet: str, kind: str):
+    out = io.BytesIO()
+    summary = write_cards(sheet.encode('utf-8'), kind, out, name='sheet.csv')
+    return out.getvalue().decode('gbk').splitlines(), summary
+
+
+def test_star_in_name_is_not_overflow():
+    # 母线名中的 * 属于文本字段，不应按“数值超出字段宽度”拒绝；只有数值字段写成 **** 的行才拒绝
+    lines, summary = _write(_L_SHEET, 'L')
+    assert summary['errors'] == [(4, "数值超出字段宽度")]
+    assert [line[6:14].rstrip() for line in lines] == ['A*1', 'A2']
+    assert lines[1][19:27].rstrip() == 'B*2'
+
+
+def test_star_in_t3_mid_bus_is_not_overflow():
+    lines, summary = _write(_T3_SHEET, 'T3')
+    assert summary['errors'] == [] and summary['cards'] == 4
+    assert lines[0].startswith('B ') and lines[0][6:14].rstrip() == 'M*1'
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from bpa_history import CHANGE_ADDED, CHANGE_REMOVED, PFOHistory
+from bpa_pfo import STATUS_NORMAL
+
+
+def _nodes(names: list, voltages: list, dists: list) -> pd.DataFrame:
+    n = len(names)
+    return pd.DataFrame({
+        'BusName': names, 'RatedVoltage': [230.0] * n, 'ActualVoltage': voltages, 'Dist': dists,
+        'Owner': [f"{d}所" for d in dists], 'UnallocatedReactivePower': [np.nan] * n,
+        '电压等级': ['220 kV'] * n, '状态': [STATUS_NORMAL] * n,
+    })
+
+
+def _history() -> PFOHistory:
+    history = PFOHistory()
+    history.add('1.pfo', _nodes(['A', 'B'], [230.0, 231.0], ['C1', 'C2']), key='1')
+    history.add('2.pfo', _nodes(['A', 'C'], [229.0, 232.0], ['C1', 'C3']), key='2')
+    history.add('3.pfo', _nodes(['A', 'C'], [228.5, 231.0], ['C1', 'C3']), key='3')
+    return history
+
+
+def test_diff_keeps_dist_and_owner_of_removed_buses():
+    diff = _history().diff(0, 1).set_index('BusName')
+    assert diff.loc['B', '变化'] == CHANGE_REMOVED and diff.loc['C', '变化'] == CHANGE_ADDED
+    assert diff['Dist'].astype(str).to_dict() == {'A': 'C1', 'B': 'C2', 'C': 'C3'}
+    assert diff.loc['B', 'Owner'] == 'C2所' and diff.loc['B', '电压等级'] == '220 kV'
+    assert diff.loc['A', '电压变化 (kV)'] == -1.0
+
+
+def test_trend_spans_all_runs():
+    trend = _history().trend(['A', 'B'])
+    assert list(trend.index) == [1, 2, 3]
+    assert trend['A 230'].tolist() == [230.0, 229.0, 228.5]
+    assert trend['B 230'].iloc[0] == 231.0 and trend['B 230'].iloc[1:].isna().all()
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from bpa_dat import apply_b_modifications, parse_dat
+from bpa_journal import EditJournal
+from bpa_synth import synth_dat
+
+
+def _mod(method: str, value: str) -> dict:
+    return {'shunt_var': {'apply': True, 'method': method, 'value': value}}
+
+
+@pytest.fixture(scope='module')
+def dat():
+    return synth_dat(600, 9)
+
+
+@pytest.fixture
+def base(dat, card_cls):
+    return parse_dat(dat, card_cls)
+
+
+def _edit(journal, case, label, *filters_and_mod):
+    with journal.record(case, label) as result:
+        apply_b_modifications(case, *filters_and_mod)
+    return result
+
+
+def test_replay_matches_sequential_edits(base, dat):
+    # 第二个版本与第一个版本修改的卡有重叠：重放结果与依次修改同一算例相同
+    journal = EditJournal('k')
+    case = base.copy()
+    v1 = _edit(journal, case, 'mul', 'C1,D1', '', '37', _mod('mul', '1.5'))
+    after_v1 = case.to_bytes()
+    v2 = _edit(journal, case, 'set', 'C1', '', '', _mod('set', '12'))
+    after_v2 = case.to_bytes()
+    assert (v1['version'], v2['version']) == (1, 2)
+    assert v1['cards'] > 0 and v2['cards'] > 0
+
+    assert journal.apply(base.copy()).to_bytes() == after_v2
+    assert journal.apply(base.copy(), 1).to_bytes() == after_v1
+    assert journal.apply(base.copy(), 0).to_bytes() == dat
+    # 重放不改动原始算例
+    assert base.to_bytes() == dat
+
+
+def test_undo_redo_and_truncation(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    _edit(journal, case, 'v1', 'C1', '', '', _mod('mul', '2'))
+    _edit(journal, case, 'v2', 'D1', '', '', _mod('set', '5'))
+    tokens = [journal.token(v) for v in range(3)]
+    assert len(set(tokens)) == 3
+
+    assert journal.undo() and journal.version == 1 and journal.token() == tokens[1]
+    assert journal.redo() and journal.version == 2 and not journal.redo()
+    journal.goto(0)
+    assert not journal.undo() and journal.token() == ('k',)
+
+    # 撤销后再修改：丢弃其后的版本，新版本编号不与被丢弃的版本重复
+    journal.goto(1)
+    case = journal.apply(base.copy())
+    _edit(journal, case, 'v2b', 'E1', '', '', _mod('set', '7'))
+    assert len(journal) == 2 and journal.version == 2
+    assert journal.token() not in tokens
+    assert list(journal.summary()['说明']) == ['原始文件', 'v1', 'v2b']
+    with pytest.raises(ValueError):
+        journal.goto(3)
+
+
+def test_no_change_records_no_version(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    result = _edit(journal, case, 'nothing', 'NO_SUCH_DIST', '', '', _mod('mul', '2'))
+    assert result['version'] is None and len(journal) == 0
+
+
+def test_changes_list_old_and_new_values(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    _edit(journal, case, 'set', 'C1', '', '', _mod('set', '9'))
+    changes = journal.changes(1, case)
+    assert len(changes) == journal.summary()['修改卡数'].iloc[1]
+    assert (changes['new'] == 9.0).all() and not (changes['old'] == 9.0).all()
+    assert np.array_equal(changes['line'].to_numpy() - 1, case.table.rows[changes['position'].to_numpy()])
+
+
+def test_failed_edit_records_nothing(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    with pytest.raises(RuntimeError):
+        with journal.record(case, 'cancelled'):
+            apply_b_modifications(case, 'C1', '', '', _mod('mul', '2'))
+            raise RuntimeError('cancel')
+    assert len(journal) == 0 and journal.version == 0
+
+
+def test_rollback_restores_redo_tail(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    _edit(journal, case, 'v1', 'C1', '', '', _mod('mul', '2'))
+    _edit(journal, case, 'v2', 'D1', '', '', _mod('set', '5'))
+    journal.undo()
+    tokens = journal.token(2)
+    case = journal.apply(base.copy())
+    result = _edit(journal, case, 'v2b', 'E1', '', '', _mod('set', '7'))
+    assert [e['label'] for e in journal.versions] == ['v1', 'v2b']
+    # 写回被取消：撤回 v2b，被它丢弃的 v2 恢复为可重做
+    assert journal.rollback(result)
+    assert journal.version == 1 and journal.can_redo and journal.token(2) == tokens
+    assert not journal.rollback(result)
+
+
+def test_rollback_skipped_after_later_changes(base):
+    journal = EditJournal('k')
+    case = base.copy()
+    result = _edit(journal, case, 'v1', 'C1', '', '', _mod('mul', '2'))
+    journal.undo()
+    assert not journal.rollback(result)
+    assert len(journal) == 1
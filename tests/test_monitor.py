@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from bpa_cli import build_parser
+
+from bpa_monitor import (
+    MONITOR_SHEETS, SHEET_OVERLOADS, SHEET_Q_BALANCE, SHEET_Q_LIMITS, run_monitors, unavailable_monitors,
+)
+from bpa_pfo import extract_pfo
+from bpa_synth import synth_pfo
+
+_DETAIL = b'        '
+_UNALLOCATED = '未安排无功'.encode('gbk')
+
+
+@pytest.fixture(scope='module')
+def pfo():
+    return synth_pfo(400, 5)
+
+
+def _buses_only(pfo: bytes) -> bytes:
+    # 去掉支路 / 发电 / 并联无功明细行，相当于明细行格式与解析规则不符的文件
+    lines = pfo.split(b'\r\n')
+    return b'\r\n'.join(line for line in lines if not line.startswith(_DETAIL) or _UNALLOCATED in line)
+
+
+def test_all_monitors_available(pfo):
+    tables = extract_pfo(pfo)
+    assert unavailable_monitors(tables) == {}
+    sheets = run_monitors(tables)
+    assert list(sheets) == MONITOR_SHEETS
+    assert not sheets[SHEET_Q_BALANCE]['发电无功'].isna().any()
+
+
+def test_missing_details_are_unavailable_not_zero(pfo):
+    tables = extract_pfo(_buses_only(pfo))
+    assert len(tables['buses']['BusName']) == 400
+    assert not len(tables['branches']['FromBus']) and not len(tables['generators']['BusName'])
+    unavailable = unavailable_monitors(tables)
+    assert set(unavailable) == {SHEET_OVERLOADS, SHEET_Q_LIMITS}
+    sheets = run_monitors(tables)
+    assert list(sheets) == [SHEET_Q_BALANCE]
+    balance = sheets[SHEET_Q_BALANCE]
+    # 没有发电机 / 支路数据时发电无功、外送无功与差额留空，负荷与并联无功照常汇总
+    assert balance['发电无功'].isna().all() and balance['外送无功'].isna().all() and balance['差额'].isna().all()
+    assert np.isfinite(balance['负荷无功'].to_numpy(dtype=float)).all()
+
+
+def test_loading_column_required_for_overloads(pfo):
+    tables = extract_pfo(pfo)
+    tables['branches'] = {**tables['branches'], 'Loading': np.full(len(tables['branches']['Loading']), np.nan)}
+    assert SHEET_OVERLOADS in unavailable_monitors(tables)
+    assert SHEET_OVERLOADS not in run_monitors(tables)
+
+
+def test_cli_flow_monitors_are_opt_in(pfo, tmp_path):
+    path = tmp_path / 'case.pfo'
+    path.write_bytes(pfo)
+    report = tmp_path / 'out' / 'pfo_batch_report.csv'
+    args = build_parser().parse_args(['pfo', str(path), '-o', str(tmp_path / 'out'), '-j', '1'])
+    assert args.func(args) == 0
+    header = report.read_text(encoding='utf-8-sig').splitlines()[0].split(',')
+    assert '过载支路' not in header and 'Branches' not in header
+    args = build_parser().parse_args(['pfo', str(path), '-o', str(tmp_path / 'out'), '-j', '1', '--flow-monitors'])
+    assert args.func(args) == 0
+    header = report.read_text(encoding='utf-8-sig').splitlines()[0].split(',')
+    assert '过载支路' in header and '无功到限发电机' in header
+    assert (tmp_path / 'out' / 'case_monitors.zip').exists()
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from bpa_pfo import (
+    _UNALLOCATED_MARK, _UNALLOCATED_WINDOW, PFO_COLUMNS, columns_equal, extract_pfo, parse_pfo_data,
+    split_chunks, tables_equal,
+)
+from bpa_synth import synth_pfo
+
+# 分块并行解析必须与单进程逐行解析逐列一致。默认块大小（MIN_CHUNK_BYTES）远大于这里的算例，
+# 因此显式传入小块，并让切分目标分别落在分页符（\x0c）表头上和“未安排无功”的向下查找窗口内
+
+
+@pytest.fixture(scope='module')
+def pfo():
+    return synth_pfo(300, 3)
+
+
+@pytest.fixture(scope='module')
+def serial(pfo):
+    return parse_pfo_data(pfo)
+
+
+@pytest.fixture(scope='module')
+def serial_tables(pfo):
+    return extract_pfo(pfo)
+
+
+def _page_offsets(pfo: bytes) -> list:
+    # 第二个分页表头前后的若干字节：切分目标落在上一行行尾、分页符本身及表头行内
+    page = pfo.index(b'\x0c', 1)
+    return [page + delta for delta in (-2, -1, 0, 1, 5)]
+
+
+def _window_offsets(pfo: bytes) -> list:
+    # 母线行与其后“未安排无功”行之间（查找窗口内）的位置：切分目标落在支路 / 发电行上
+    offsets = []
+    mark = pfo.find(_UNALLOCATED_MARK)
+    while mark >= 0 and len(offsets) < 6:
+        line_start = pfo.rfind(b'\n', 0, mark) + 1
+        previous = pfo.rfind(b'\n', 0, line_start - 1) + 1
+        offsets += [previous, line_start - 1, line_start + 3]
+        mark = pfo.find(_UNALLOCATED_MARK, mark + 1)
+    return offsets
+
+
+def test_synthetic_case_exercises_boundaries(pfo, serial):
+    # 算例中确实有分页表头和非空的未安排无功，否则下面的比较没有意义
+    assert pfo.count(b'\x0c') > 1
+    assert np.isfinite(serial['UnallocatedReactivePower']).sum() > 5
+    assert len(serial['BusName']) == 300
+
+
+@pytest.mark.parametrize('target', ['page', 'window'])
+def test_chunk_targets_do_not_split_state(pfo, serial, target):
+    offsets = _page_offsets(pfo) if target == 'page' else _window_offsets(pfo)
+    for chunk_bytes in offsets:
+        bounds = split_chunks(pfo, chunk_bytes)
+        assert len(bounds) > 1
+        # 第一个切分点必须是母线行行首，且之前最近的“未安排无功”已在查找窗口内归属完毕
+        cut = bounds[0][1]
+        assert pfo[cut - 1:cut] == b'\n'
+        assert _UNALLOCATED_MARK not in pfo[cut:pfo.index(b'\n', cut)]
+        parallel = parse_pfo_data(pfo, workers=2, chunk_bytes=chunk_bytes)
+        assert columns_equal(serial, parallel), chunk_bytes
+
+
+@pytest.mark.parametrize('chunk_bytes', [1000, 1777, 4096, 30000])
+def test_parallel_parse_matches_serial(pfo, serial, chunk_bytes):
+    assert len(split_chunks(pfo, chunk_bytes)) > 1
+    parallel = parse_pfo_data(pfo, workers=2, chunk_bytes=chunk_bytes)
+    assert columns_equal(serial, parallel, PFO_COLUMNS)
+
+
+@pytest.mark.parametrize('chunk_bytes', [1000, 4096])
+def test_parallel_extract_matches_serial(pfo, serial, serial_tables, chunk_bytes):
+    parallel = extract_pfo(pfo, workers=2, chunk_bytes=chunk_bytes)
+    assert tables_equal(serial_tables, parallel)
+    assert len(parallel['branches']['FromBus']) > len(parallel['buses']['BusName'])
+    # 完整提取的母线表与只解析母线时相同
+    assert columns_equal(serial, parallel['buses'])
+
+
+def test_chunks_cover_content(pfo):
+    bounds = split_chunks(pfo, 777)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(pfo)
+    assert all(stop == start for (_, stop), (start, _) in zip(bounds, bounds[1:]))
+
+
+def test_unallocated_window_limit():
+    # 超出查找窗口的“未安排无功”行不归属上一母线
+    bus = '苏州0    525.0                      C1苏    540.0kV/  1.0       0.0MW      0.0MVAR      B'.encode('gbk')
+    filler = [b'        '] * _UNALLOCATED_WINDOW
+    q = '            12.50 未安排无功'.encode('gbk')
+    near = parse_pfo_data(b'\r\n'.join([bus, q]) + b'\r\n')
+    far = parse_pfo_data(b'\r\n'.join([bus] + filler + [q]) + b'\r\n')
+    assert near['UnallocatedReactivePower'][0] == 12.5
+    assert np.isnan(far['UnallocatedReactivePower'][0])
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bpa_dat import apply_b_modifications, parse_dat
+from bpa_rules import apply_rules, normalize_rules
+from bpa_synth import synth_dat
+
+
+@pytest.fixture
+def case(card_cls):
+    return parse_dat(synth_dat(500, 2), card_cls)
+
+
+def _rules(*rows):
+    return normalize_rules(pd.DataFrame(rows))
+
+
+def test_key_fields_are_not_editable(case):
+    # vol_rank 是索引键，v_max / v_min 带隐含小数位，规则中指定时记为错误且不改动任何卡片
+    before = case.index.query(None, None, 37.0)
+    rules = _rules({'param': 'vol_rank', 'method': 'set', 'value': '115'},
+                   {'param': 'v_max', 'method': 'mul', 'value': '1.1'})
+    report = apply_rules(case, rules)
+    assert (report['error'] != '').all()
+    assert len(case.dirty) == 0
+    assert np.array_equal(case.index.query(None, None, 37.0), before)
+    with pytest.raises(KeyError):
+        apply_b_modifications(case, '', '', '', {'vol_rank': {'apply': True, 'method': 'set', 'value': '115'}})
+
+
+def test_shunt_var_rules_apply_in_order(case):
+    rules = _rules({'order': 2, 'vol_rank': '37', 'param': 'shunt_var', 'method': 'mul', 'value': '2'},
+                   {'order': 1, 'vol_rank': '37', 'param': 'shunt_var', 'method': 'set', 'value': '10'})
+    report = apply_rules(case, rules)
+    assert (report['error'] == '').all()
+    positions = case.index.query(None, None, 37.0)
+    assert len(positions) and np.all(case.table.shunt_var[positions] == 20.0)
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from bpa_session import SessionData, enforce_process_budget
+
+
+def test_active_run_does_not_hold_lock():
+    # 界面脚本运行期间（active）后台线程仍可立即取得会话锁修改状态
+    data = SessionData(max_bytes=0)
+    entered = threading.Event()
+
+    def job():
+        with data.locked():
+            data.set('journal', [1])
+        entered.set()
+
+    with data.active():
+        thread = threading.Thread(target=job)
+        thread.start()
+        assert entered.wait(2.0)
+        thread.join()
+    assert data.get('journal') == [1]
+
+
+def test_process_budget_skips_active_and_locked_sessions(tmp_path):
+    busy = SessionData(max_bytes=0, spill_dir=str(tmp_path))
+    idle = SessionData(max_bytes=0, spill_dir=str(tmp_path))
+    locked = SessionData(max_bytes=0, spill_dir=str(tmp_path))
+    for session in (busy, idle, locked):
+        session.set('table', bytes(1024 * 1024))
+    time.sleep(0.01)
+    release = threading.Event()
+    held = threading.Event()
+
+    def hold():
+        with locked.locked():
+            held.set()
+            release.wait(2.0)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(2.0)
+    try:
+        with busy.active():
+            enforce_process_budget(1)
+    finally:
+        release.set()
+        thread.join()
+    assert idle.entries()['on_disk'].all()
+    assert not busy.entries()['on_disk'].any()
+    assert not locked.entries()['on_disk'].any()
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from bpa_dat import apply_b_modifications, parse_dat
+from bpa_snapshot import SnapshotStore, read_snapshot, write_snapshot
+from bpa_synth import synth_dat
+
+_MUL = {'shunt_var': {'apply': True, 'method': 'mul', 'value': '1.2'}}
+
+
+@pytest.fixture(scope='module')
+def dat():
+    return synth_dat(600, 7)
+
+
+def _columns_equal(a, b) -> bool:
+    if a.dtype.kind == 'f':
+        return np.array_equal(a, b, equal_nan=True)
+    return np.array_equal(a, b)
+
+
+def test_round_trip_is_lossless(dat, card_cls, tmp_path):
+    case = parse_dat(dat, card_cls)
+    store = SnapshotStore(str(tmp_path))
+    store.save('k', case)
+    loaded = store.load('k', card_cls)
+    assert loaded is not None
+    assert loaded.to_bytes() == dat
+    assert list(loaded.lines) == list(case.lines)
+    assert loaded.type_counts() == case.type_counts()
+    for name, table in case.cards.items():
+        other = loaded.cards[name]
+        assert np.array_equal(other.rows, table.rows)
+        for field in table.fields:
+            assert _columns_equal(other.column(field), table.column(field)), (name, field)
+
+
+def test_edits_on_loaded_case_match_fresh_parse(dat, card_cls, tmp_path):
+    # 映射区只读：修改时各表复制可写列，结果与直接解析后修改相同，且不改动快照文件
+    path = str(tmp_path / 'case.bpasnap')
+    write_snapshot(path, parse_dat(dat, card_cls), 'k')
+    fresh = parse_dat(dat, card_cls)
+    apply_b_modifications(fresh, 'C1,D1', '', '37', _MUL)
+    edited = read_snapshot(path, card_cls).copy()
+    apply_b_modifications(edited, 'C1,D1', '', '37', _MUL)
+    assert edited.to_bytes() == fresh.to_bytes() != dat
+    assert read_snapshot(path, card_cls).to_bytes() == dat
+
+
+def test_corrupt_or_missing_snapshot_is_discarded(dat, card_cls, tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    assert store.load('missing', card_cls) is None
+    store.save('k', parse_dat(dat, card_cls))
+    with open(store.path('k'), 'r+b') as f:
+        f.write(b'NOTASNAP')
+    assert store.load('k', card_cls) is None
+    assert 'k' not in store
+
+
+def test_prune_keeps_most_recent(dat, card_cls, tmp_path):
+    case = parse_dat(dat, card_cls)
+    size = os.path.getsize(SnapshotStore(str(tmp_path / 'probe')).save('a', case))
+    store = SnapshotStore(str(tmp_path / 'store'), max_bytes=int(size * 1.5))
+    store.save('a', case)
+    os.utime(store.path('a'), (1, 1))
+    store.save('b', case)
+    assert 'b' in store and 'a' not in store